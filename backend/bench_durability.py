@@ -0,0 +1,136 @@
+import glob
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+import mqtt_sub
+from segment_log import SyncPolicy, read_log, log_files
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+WORK_DIR = None            # None = System-Temp; für realistische Werte auf den Datenträger der Aufnahme legen
+NUM_ROWS = 100_000         # IMU-Zeilen je Messung, eine Zeile pro Nachricht wie von der Firmware
+PER_RECORD_ROWS = 2_000    # Weniger Zeilen für 'fsync je Datensatz'
+# (Name, flush_rows, FSYNC_EVERY_ROWS, FSYNC_INTERVAL_S)
+LEVELS = [
+    ('kein fsync', mqtt_sub.FLUSH_ROWS, None, None),
+    ('fsync alle 1 s', mqtt_sub.FLUSH_ROWS, None, 1.0),
+    ('fsync alle 5000 Zeilen', mqtt_sub.FLUSH_ROWS, 5000, None),
+    (f'fsync je Flush ({mqtt_sub.FLUSH_ROWS} Zeilen)', mqtt_sub.FLUSH_ROWS, 0, None),
+    ('fsync je Datensatz', 1, 0, None),
+]
+# (Name, Writer, Argumente)
+WRITERS = [
+    ('Einzel-CSV', mqtt_sub.BufferedCsvWriter, {}),
+    ('Segmente', mqtt_sub.SegmentedCsvWriter, {'compression': None}),
+    ('Segmente gzip', mqtt_sub.SegmentedCsvWriter, {'compression': 'gzip'}),
+]
+KILL_RUNS = 5              # Abstürze (SIGKILL) je Writer im Absturztest
+
+# Kindprozess für den Absturztest: schreibt ohne Ende, bis er abgeschossen wird
+CHILD = """
+import sys, pandas as pd, mqtt_sub
+path, kind = sys.argv[1], sys.argv[2]
+rows = pd.read_csv(sys.argv[3], dtype=str).values.tolist()
+writer_cls = mqtt_sub.SegmentedCsvWriter if kind != 'csv' else mqtt_sub.BufferedCsvWriter
+extra = {'compression': 'gzip' if kind == 'gzip' else None} if kind != 'csv' else {}
+writer = writer_cls(path, mqtt_sub.IMU_HEADERS, flush_rows=50, **extra)
+print('bereit', flush=True)
+while True:
+    for row in rows:
+        writer.write_rows([row])
+"""
+
+
+def recorded_rows():
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, 'exp*', 'imu_data_1.csv')))
+    return pd.concat([pd.read_csv(f, dtype=str) for f in files], ignore_index=True).values.tolist()
+
+def measure(work_dir, writer_cls, kwargs, rows, flush_rows, every_rows, interval_s):
+    """Zeilen/s beim Schreiben einzelner Nachrichten inkl. Schließen, und Anzahl fsync."""
+    path = os.path.join(work_dir, 'imu_data_1')
+    shutil.rmtree(path, ignore_errors=True)
+    if os.path.exists(path + '.csv'):
+        os.remove(path + '.csv')
+    if writer_cls is mqtt_sub.BufferedCsvWriter:
+        path += '.csv'
+    sync = SyncPolicy(every_rows, interval_s)
+    t_start = time.perf_counter()
+    writer = writer_cls(path, mqtt_sub.IMU_HEADERS, flush_rows=flush_rows, sync=sync, **kwargs)
+    for row in rows:
+        writer.write_rows([row])
+        writer.flush_if_due()
+    writer.close()
+    return len(rows) / (time.perf_counter() - t_start), sync.syncs
+
+def tear_tail(path, kind):
+    """Simuliert einen abgebrochenen write(): halber Datensatz am Ende von Datei bzw. Segment und Index."""
+    if kind == 'csv':
+        files = [path]
+    else:
+        files = [log_files(path)[-1], os.path.join(path, 'index.csv')]
+    for name in files:
+        with open(name, 'rb') as f:
+            data = f.read()
+        with open(name, 'ab') as f:
+            f.write(data[-random.randint(2, 60):-1])
+
+def crash_test(work_dir, source, kind):
+    """KILL_RUNS-mal Schreiben, SIGKILL, ggf. halber Datensatz am Ende, Neustart mit Wiederherstellung."""
+    path = os.path.join(work_dir, 'crash_imu_data_1' + ('.csv' if kind == 'csv' else ''))
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    recovered = 0
+    for run in range(KILL_RUNS):
+        child = subprocess.Popen([sys.executable, '-c', CHILD, path, kind, source], stdout=subprocess.PIPE, env=env)
+        child.stdout.readline()
+        time.sleep(random.uniform(0.05, 0.5))
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+        if run % 2:
+            tear_tail(path, kind)
+        if kind == 'csv':
+            writer = mqtt_sub.BufferedCsvWriter(path, mqtt_sub.IMU_HEADERS)
+        else:
+            writer = mqtt_sub.SegmentedCsvWriter(path, mqtt_sub.IMU_HEADERS,
+                                                 compression='gzip' if kind == 'gzip' else None)
+        recovered += writer.recovered_bytes
+        writer.close()
+    # Alle Leser müssen danach funktionieren und dieselben, vollständigen Zeilen sehen
+    # (leere Segmente vom Neustart ohne Zeilen haben nur Object-Spalten und bleiben außen vor)
+    direct = pd.concat([df for df in map(pd.read_csv, log_files(path)) if len(df)], ignore_index=True)
+    df = read_log(path)
+    ok = df.equals(direct) and not df.isna().any().any() and len(df) > 0
+    return ok, len(df), recovered
+
+
+if __name__ == "__main__":
+    rows = recorded_rows()
+    rows = (rows * (NUM_ROWS // len(rows) + 1))[:NUM_ROWS]
+    work_dir = tempfile.mkdtemp(prefix='bench_durability_', dir=WORK_DIR)
+    try:
+        print(f"{NUM_ROWS:,} IMU-Zeilen ({PER_RECORD_ROWS:,} bei fsync je Datensatz), je Nachricht eine Zeile, "
+              f"in {work_dir}\n")
+        print(f"{'Stufe':<28} | " + " | ".join(f"{name + ' Zeilen/s':>22} | {'fsync':>6}" for name, _, _ in WRITERS))
+        print("-" * 130)
+        for level_name, flush_rows, every_rows, interval_s in LEVELS:
+            level_rows = rows[:PER_RECORD_ROWS] if flush_rows == 1 else rows
+            cells = []
+            for _, writer_cls, kwargs in WRITERS:
+                rate, syncs = measure(work_dir, writer_cls, kwargs, level_rows, flush_rows, every_rows, interval_s)
+                cells.append(f"{rate:>22,.0f} | {syncs:>6}")
+            print(f"{level_name:<28} | " + " | ".join(cells))
+
+        source = os.path.join(work_dir, 'source.csv')
+        pd.DataFrame(rows[:20_000], columns=mqtt_sub.IMU_HEADERS).to_csv(source, index=False)
+        print(f"\nAbsturztest: {KILL_RUNS}x SIGKILL während des Schreibens, jedes zweite Mal zusätzlich "
+              f"ein halber Datensatz am Ende")
+        for kind in ('csv', 'segments', 'gzip'):
+            ok, n, recovered = crash_test(work_dir, source, kind)
+            print(f"  {kind:<10} lesbar und vollständig: {ok}, {n:,} Zeilen, {recovered:,} Bytes abgeschnitten")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
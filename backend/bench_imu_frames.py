@@ -0,0 +1,83 @@
+import glob
+import os
+import time
+from collections import deque
+import pandas as pd
+import mqtt_sub
+from payload_codec import decode_imu_frame, decode_imu_text, encode_imu_block, IMU_COLUMNS
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+SAMPLES_PER_FRAME = [1, 10, 50]
+MAX_DATA_POINTS = 500       # Live-Puffer wie in timestream.py
+REPEATS = 3                 # Bester von REPEATS Durchläufen
+
+
+def recorded_lines():
+    """IMU-Textzeilen wie von der Firmware gesendet, rekonstruiert aus den aufgezeichneten CSV-Dateien."""
+    lines = []
+    for imu_file in sorted(glob.glob(os.path.join(RESULTS_DIR, 'exp*', 'imu_data_1.csv'))):
+        df = pd.read_csv(imu_file, dtype=str)
+        lines += [f"{r.timestamp_ns};{r.ax},{r.ay},{r.az};{r.qw},{r.qx},{r.qy},{r.qz}".encode() for r in df.itertuples()]
+    return lines
+
+def frames(lines, n):
+    text = [b'\n'.join(lines[i:i + n]) for i in range(0, len(lines), n)]
+    binary = [encode_imu_block(*decode_imu_frame(frame)) for frame in text]
+    return text, binary
+
+def new_buffers():
+    return deque(maxlen=MAX_DATA_POINTS), [deque(maxlen=MAX_DATA_POINTS) for _ in IMU_COLUMNS]
+
+def per_line_to_buffers(payload, buffers):
+    """Bisheriger Weg (timestream.py): jede Zeile einzeln parsen und Wert für Wert anhängen."""
+    timestamps, values = buffers
+    for line in payload.split(b'\n'):
+        sample = decode_imu_text(line)
+        timestamps.append(sample[0])
+        for buffer, value in zip(values, sample[1:]):
+            buffer.append(value)
+
+def frame_to_buffers(payload, buffers):
+    """Neuer Weg (timestream.py): ganzer Frame vektorisiert, Puffer blockweise verlängert."""
+    frame_timestamps, frame_values = decode_imu_frame(payload)
+    timestamps, values = buffers
+    timestamps.extend(frame_timestamps.tolist())
+    for buffer, column in zip(values, frame_values.T):
+        buffer.extend(column.tolist())
+
+def samples_per_second(func, payloads, num_samples):
+    best = float('inf')
+    for _ in range(REPEATS):
+        t_start = time.perf_counter()
+        func(payloads)
+        best = min(best, time.perf_counter() - t_start)
+    return num_samples / best
+
+
+if __name__ == "__main__":
+    lines = recorded_lines()
+    print(f"{len(lines)} IMU-Samples aus {RESULTS_DIR}; Angaben in Samples/s (Tausend)\n")
+    variants = [
+        ("Text zeilenw.", 'text', lambda ps: [per_line_to_buffers(p, buffers) for p in ps]),
+        ("Text->Arrays", 'text', lambda ps: [decode_imu_frame(p) for p in ps]),
+        ("Binär->Arrays", 'binary', lambda ps: [decode_imu_frame(p) for p in ps]),
+        ("Text->Puffer", 'text', lambda ps: [frame_to_buffers(p, buffers) for p in ps]),
+        ("Binär->Puffer", 'binary', lambda ps: [frame_to_buffers(p, buffers) for p in ps]),
+        ("Text->CSV", 'text', lambda ps: [mqtt_sub.parse_imu_payload(p) for p in ps]),
+        ("Binär->CSV", 'binary', lambda ps: [mqtt_sub.parse_imu_payload(p) for p in ps]),
+    ]
+    print(f"{'Samples/Frame':>13} | {'Bytes/Sample':>12} | " + " | ".join(f"{name:>13}" for name, _, _ in variants))
+    print("-" * (32 + 16 * len(variants)))
+    for n in SAMPLES_PER_FRAME:
+        payloads = dict(zip(('text', 'binary'), frames(lines, n)))
+        # Gleiche Werte aus Text- und Binär-Frame (float32 reicht für die 6 Nachkommastellen der Firmware)
+        assert all(mqtt_sub.parse_imu_payload(t) == mqtt_sub.parse_imu_payload(b)
+                   for t, b in zip(payloads['text'], payloads['binary']))
+        sizes = f"{sum(map(len, payloads['text'])) / len(lines):.1f} / {sum(map(len, payloads['binary'])) / len(lines):.1f}"
+        rates = []
+        for name, fmt, func in variants:
+            buffers = new_buffers()
+            rates.append(samples_per_second(func, payloads[fmt], len(lines)))
+        print(f"{n:>13} | {sizes:>12} | " + " | ".join(f"{rate / 1e3:>13,.0f}" for rate in rates))
+    print("\nBytes/Sample: Text / Binär. Puffer: deques wie in timestream.py, CSV: Zeilen für mqtt_sub.py.")
@@ -0,0 +1,110 @@
+import glob
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from merge_engine import IncrementalMerge, merge_sensors, stream_merge
+from segment_log import SegmentedLog
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+NUM_RUNS = 20              # Inkrementelle Läufe über die Aufnahme verteilt
+LATE_ANCHOR_FRACTION = 0.6  # Der letzte Anker sendet erst ab diesem Anteil der Aufnahme
+RESTART_EVERY = 7          # Segment-Logs: Neustart des Loggers alle N Läufe
+SEGMENT_MAX_BYTES = 64 * 1024
+
+
+def recorded_logs():
+    """IMU- und UWB-Log des größten Experiments als Strings (wie vom Logger geschrieben)."""
+    pairs = [(os.path.join(d, 'imu_data_1.csv'), os.path.join(d, 'uwb_data_1.csv'))
+             for d in sorted(glob.glob(os.path.join(RESULTS_DIR, 'exp*')))]
+    imu_file, uwb_file = max((p for p in pairs if all(map(os.path.exists, p))), key=lambda p: os.path.getsize(p[0]))
+    return pd.read_csv(imu_file, dtype=str), pd.read_csv(uwb_file, dtype=str)
+
+def with_late_anchor(df_imu, df_uwb):
+    """Entfernt die Messungen des zuletzt erstmals gesehenen Ankers vor LATE_ANCHOR_FRACTION der Aufnahme."""
+    ts = df_uwb['timestamp_ns'].astype(np.int64)
+    late_mac = df_uwb['mac_address'].unique()[-1]
+    t_late = ts.min() + LATE_ANCHOR_FRACTION * (ts.max() - ts.min())
+    return df_imu, df_uwb[(df_uwb['mac_address'] != late_mac) | (ts >= t_late)].reset_index(drop=True), late_mac
+
+def pieces(df_imu, df_uwb):
+    """Zerlegt beide Logs in NUM_RUNS zeitlich aufeinanderfolgende Teile (Zeilenlisten)."""
+    imu_ts = df_imu['timestamp_ns'].astype(np.int64).to_numpy()
+    uwb_ts = df_uwb['timestamp_ns'].astype(np.int64).to_numpy()
+    bounds = np.linspace(imu_ts[0], imu_ts[-1] + 1, NUM_RUNS + 1)[1:]
+    imu_ends = np.searchsorted(imu_ts, bounds)
+    uwb_ends = np.searchsorted(uwb_ts, bounds)
+    uwb_ends[-1] = len(uwb_ts)
+    imu_rows, uwb_rows = df_imu.values.tolist(), df_uwb.values.tolist()
+    return [(imu_rows[i0:i1], uwb_rows[u0:u1]) for i0, i1, u0, u1 in
+            zip(np.r_[0, imu_ends[:-1]], imu_ends, np.r_[0, uwb_ends[:-1]], uwb_ends)]
+
+def run_incremental(work_dir, kind, df_imu, df_uwb):
+    """Schreibt die Logs stückweise ('csv' oder Segmente 'gzip') und merged nach jedem Stück inkrementell."""
+    imu_file, uwb_file = (os.path.join(work_dir, name) for name in ('imu_data_1.csv', 'uwb_data_1.csv'))
+    output_file = os.path.join(work_dir, f'merged_{kind}.csv')
+    logs = None
+    t_merge = 0.0
+    for run, (imu_rows, uwb_rows) in enumerate(pieces(df_imu, df_uwb)):
+        if kind == 'csv':
+            for path, df, rows in ((imu_file, df_imu, imu_rows), (uwb_file, df_uwb, uwb_rows)):
+                pd.DataFrame(rows, columns=df.columns).to_csv(path, mode='a', index=False,
+                                                              header=not os.path.exists(path))
+        else:
+            if logs is None or run % RESTART_EVERY == 0:
+                for log in logs or ():
+                    log.close()
+                logs = [SegmentedLog(path[:-4], list(df.columns), SEGMENT_MAX_BYTES, compression='gzip')
+                        for path, df in ((imu_file, df_imu), (uwb_file, df_uwb))]
+            for log, rows in zip(logs, (imu_rows, uwb_rows)):
+                log.append(rows)
+        t_start = time.perf_counter()
+        IncrementalMerge(imu_file, uwb_file, output_file).run(finalize=run == NUM_RUNS - 1)
+        t_merge += time.perf_counter() - t_start
+    for log in logs or ():
+        log.close()
+    return pd.read_csv(output_file), t_merge
+
+def full_merge(df_imu, df_uwb):
+    df_imu = df_imu.apply(pd.to_numeric)
+    df_uwb = df_uwb.assign(timestamp_ns=df_uwb['timestamp_ns'].astype(np.int64),
+                           distance=df_uwb['distance'].astype(float))
+    t0 = min(df_imu['timestamp_ns'].iloc[0], df_uwb['timestamp_ns'].min())
+    df_imu['t_sec'] = (df_imu['timestamp_ns'] - t0) / 1e9
+    return merge_sensors(df_imu, df_uwb)[0].reset_index(drop=True)
+
+def same_frame(a, b):
+    return list(a.columns) == list(b.columns) and len(a) == len(b) and \
+        np.allclose(a.to_numpy(float), b.to_numpy(float), equal_nan=True)
+
+
+if __name__ == "__main__":
+    df_imu, df_uwb, late_mac = with_late_anchor(*recorded_logs())
+    reference = full_merge(df_imu, df_uwb)
+    print(f"{len(df_imu)} IMU-Zeilen, {len(df_uwb)} UWB-Messungen, Anker {late_mac} erst ab "
+          f"{LATE_ANCHOR_FRACTION:.0%} der Aufnahme, {NUM_RUNS} inkrementelle Läufe\n")
+    work_dir = tempfile.mkdtemp(prefix='bench_incremental_merge_')
+    try:
+        for kind in ('csv', 'gzip'):
+            merged, t_merge = run_incremental(work_dir, kind, df_imu, df_uwb)
+            print(f"{kind:<5} identisch mit vollem Merge: {same_frame(merged, reference)}, "
+                  f"{len(merged)} Zeilen, {t_merge / NUM_RUNS * 1e3:.1f} ms pro Lauf")
+
+        # Streaming-Merge direkt nach dem Start des Loggers (nur Header) und mit leerer erster Datei
+        empty_imu, empty_uwb, output_file = (os.path.join(work_dir, name) for name in
+                                             ('empty_imu.csv', 'empty_uwb.csv', 'merged_stream.csv'))
+        df_imu.iloc[:0].to_csv(empty_imu, index=False)
+        df_uwb.iloc[:0].to_csv(empty_uwb, index=False)
+        stats = stream_merge([empty_imu], [os.path.join(work_dir, 'uwb_data_1.csv')], output_file)
+        dropped = sum(s['dropped'] for s in stats.values())
+        print(f"Streaming-Merge ohne IMU-Zeilen: {len(pd.read_csv(output_file))} Zeilen, "
+              f"{dropped} von {len(df_uwb)} Messungen verworfen")
+        stream_merge([empty_imu, os.path.join(work_dir, 'imu_data_1.csv')],
+                     [empty_uwb, os.path.join(work_dir, 'uwb_data_1.csv')], output_file)
+        print(f"Streaming-Merge mit leerer erster Datei identisch mit vollem Merge: "
+              f"{same_frame(pd.read_csv(output_file), reference)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
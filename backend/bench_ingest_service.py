@@ -0,0 +1,229 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import struct
+import tempfile
+import time
+import ingest_service
+
+# --- Konfiguration ---
+BROKER_HOST = '127.0.0.1'
+NUM_TAGS = 200
+RATES = [1000, 2000, 5000, 10000, 20000, 40000]    # Angebotene Nachrichten/s über alle Tags
+RUN_S = 5.0
+TICK_S = 0.01               # Takt des Lastgenerators
+IMU_PER_UWB = 10            # Wie auf dem Tag: IMU 50 Hz, UWB 5 Hz
+NUM_ANCHORS = 4
+MAX_P99_S = 0.5             # Dauerhaft verkraftet: nichts verloren und p99 der Ingest-Latenz darunter
+
+
+def varint(n):
+    out = bytearray()
+    while True:
+        n, byte = n >> 7, n & 0x7F
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+def publish_packet(topic, payload):
+    body = struct.pack('>H', len(topic)) + topic + payload
+    return b'\x30' + varint(len(body)) + body
+
+def topic_matches(topic_filter, topic):
+    f, t = topic_filter.split('/'), topic.split('/')
+    for i, part in enumerate(f):
+        if part == '#':
+            return True
+        if i >= len(t) or (part != '+' and part != t[i]):
+            return False
+    return len(f) == len(t)
+
+
+class BrokerStandIn:
+    """
+    Minimaler MQTT-3.1.1-Broker (Ersatz für Mosquitto) für den Lasttest: CONNECT, SUBSCRIBE mit
+    Wildcards, PUBLISH QoS 0, PINGREQ, DISCONNECT. Nachrichten werden ohne Kopie an die Abonnenten
+    weitergereicht; gepuffert wird im Sende-Puffer des Transports wie bei einem langsamen Abonnenten.
+    """
+
+    def __init__(self):
+        self.subscriptions = []       # (Filter, writer)
+        self.routes = {}              # Topic -> [writer], Cache
+        self.subscribed = asyncio.Event()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, BROKER_HOST, 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    def backlog(self):
+        return sum(w.transport.get_write_buffer_size() for _, w in self.subscriptions if not w.is_closing())
+
+    async def handle(self, reader, writer):
+        buf = b''
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                buf += data
+                pos, out = 0, {}
+                while True:
+                    if len(buf) - pos < 2:
+                        break
+                    length, shift, i = 0, 0, pos + 1
+                    while i < len(buf):
+                        length |= (buf[i] & 0x7F) << shift
+                        shift += 7
+                        i += 1
+                        if not buf[i - 1] & 0x80:
+                            break
+                    else:
+                        break
+                    if len(buf) - i < length:
+                        break
+                    packet_type, body = buf[pos] & 0xF0, buf[i:i + length]
+                    if packet_type == 0x30:
+                        topic = body[2:2 + struct.unpack_from('>H', body)[0]].decode()
+                        for subscriber in self.route(topic):
+                            out.setdefault(subscriber, []).append(buf[pos:i + length])
+                    elif packet_type == 0x10:
+                        writer.write(b'\x20\x02\x00\x00')
+                    elif packet_type == 0x80:
+                        self.subscribe(body, writer)
+                    elif packet_type == 0xC0:
+                        writer.write(b'\xd0\x00')
+                    elif packet_type == 0xE0:
+                        return
+                    pos = i + length
+                buf = buf[pos:]
+                for subscriber, packets in out.items():
+                    if not subscriber.is_closing():
+                        subscriber.write(b''.join(packets))
+        finally:
+            self.subscriptions = [(f, w) for f, w in self.subscriptions if w is not writer]
+            self.routes.clear()
+            writer.close()
+
+    def subscribe(self, body, writer):
+        packet_id, pos, granted = body[:2], 2, b''
+        while pos < len(body):
+            n = struct.unpack_from('>H', body, pos)[0]
+            self.subscriptions.append((body[pos + 2:pos + 2 + n].decode(), writer))
+            pos += 2 + n + 1
+            granted += b'\x00'
+        self.routes.clear()
+        writer.write(b'\x90' + varint(2 + len(granted)) + packet_id + granted)
+        self.subscribed.set()
+
+    def route(self, topic):
+        if topic not in self.routes:
+            self.routes[topic] = [w for f, w in self.subscriptions if topic_matches(f, topic)]
+        return self.routes[topic]
+
+
+class LoadTestService(ingest_service.IngestService):
+    """Latenzen ab dem Versand: der Lastgenerator schreibt time.time_ns() als Zeitstempel in die Payload."""
+
+    def on_message(self, client, userdata, msg):
+        self.received += 1
+        try:
+            self.queue.put_nowait((msg.topic, msg.payload, int(msg.payload.split(b';', 1)[0]) / 1e9))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+def service_process(port, out_dir, results):
+    service = asyncio.run(ingest_service.run_service(BROKER_HOST, port, [ingest_service.CsvOutput(out_dir)],
+                                                     LoadTestService, stats_interval_s=3600))
+    results.put(service.stats())
+
+
+async def tag_connection(port, tag):
+    reader, writer = await asyncio.open_connection(BROKER_HOST, port)
+    client_id = f'tag-{tag}'.encode()
+    body = b'\x00\x04MQTT\x04\x02\x00\x3c' + struct.pack('>H', len(client_id)) + client_id
+    writer.write(b'\x10' + varint(len(body)) + body)
+    await reader.readexactly(4)
+    return writer
+
+async def generate_load(port, rate):
+    """Verteilt rate Nachrichten/s reihum auf NUM_TAGS Verbindungen (IMU:UWB = IMU_PER_UWB:1)."""
+    writers = [await tag_connection(port, tag) for tag in range(NUM_TAGS)]
+    imu_topics = [f'{ingest_service.TAG_PREFIX}/t{tag:03d}/imu/data'.encode() for tag in range(NUM_TAGS)]
+    uwb_topics = [f'{ingest_service.TAG_PREFIX}/t{tag:03d}/uwb/data'.encode() for tag in range(NUM_TAGS)]
+    uwb_tail = ';'.join(f'{a:05x}0000000,{1.5 + a:.2f}' for a in range(NUM_ANCHORS)).encode()
+    sent = {'imu': 0, 'uwb': 0}
+    t_start = time.perf_counter()
+    tick, n_sent = 0, 0
+    while time.perf_counter() - t_start < RUN_S:
+        tick += 1
+        due = int(rate * tick * TICK_S) - n_sent
+        packets = [[] for _ in writers]
+        for k in range(n_sent, n_sent + due):
+            tag = k % NUM_TAGS
+            ts = str(time.time_ns()).encode()
+            if (k // NUM_TAGS) % (IMU_PER_UWB + 1) == IMU_PER_UWB:
+                packets[tag].append(publish_packet(uwb_topics[tag], ts + b';' + uwb_tail))
+                sent['uwb'] += 1
+            else:
+                packets[tag].append(publish_packet(imu_topics[tag], ts + b';0.0123,-0.0456,9.8100;0.7071,0.0000,0.0000,0.7071'))
+                sent['imu'] += 1
+        for writer, tag_packets in zip(writers, packets):
+            if tag_packets:
+                writer.write(b''.join(tag_packets))
+        n_sent += due
+        await asyncio.gather(*(w.drain() for w in writers))
+        await asyncio.sleep(max(0.0, t_start + tick * TICK_S - time.perf_counter()))
+    elapsed = time.perf_counter() - t_start
+    for writer in writers:
+        writer.write(b'\xe0\x00')
+        writer.close()
+    return sent, elapsed
+
+async def load_step(rate, out_dir):
+    broker = BrokerStandIn()
+    port = await broker.start()
+    results = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=service_process, args=(port, out_dir, results))
+    proc.start()
+    await asyncio.wait_for(broker.subscribed.wait(), 30)
+    sent, elapsed = await generate_load(port, rate)
+    # Warten, bis der Broker alles an den Service übergeben hat, dann noch ein Schreibintervall
+    while broker.backlog() > 0:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(2 * ingest_service.FLUSH_INTERVAL_S)
+    os.kill(proc.pid, signal.SIGTERM)
+    stats = await asyncio.to_thread(results.get)
+    proc.join()
+    broker.server.close()
+    expected_rows = sent['imu'] + sent['uwb'] * NUM_ANCHORS
+    return sum(sent.values()), elapsed, expected_rows, stats
+
+
+if __name__ == "__main__":
+    print(f"Lasttest: {NUM_TAGS} Tags, je Stufe {RUN_S:.0f} s, IMU:UWB = {IMU_PER_UWB}:1, "
+          f"Broker-Ersatz und Lastgenerator im selben Prozess, Service in eigenem Prozess ({os.cpu_count()} CPU)\n")
+    print(f"{'Angebot/s':>9} | {'gesendet/s':>10} | {'empfangen':>9} | {'Zeilen ok':>9} | {'Warteschl.':>10} | "
+          f"{'Median ms':>9} | {'p99 ms':>8} | {'Datei p99':>9} | dauerhaft")
+    print("-" * 108)
+    max_sustained = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rate in RATES:
+            n_sent, elapsed, expected_rows, stats = asyncio.run(load_step(rate, os.path.join(tmp_dir, str(rate))))
+            complete = stats['received'] == n_sent and stats['dropped'] == 0 and stats['write_dropped_rows'] == 0 \
+                and stats['rows_written'] == expected_rows
+            sustained = complete and stats['latency_p99_ms'] <= MAX_P99_S * 1e3
+            if sustained:
+                max_sustained = n_sent / elapsed
+            print(f"{rate:>9} | {n_sent / elapsed:>10.0f} | {stats['received']:>9} | {str(complete):>9} | "
+                  f"{stats['max_depth']:>10} | {stats['latency_p50_ms']:>9.1f} | {stats['latency_p99_ms']:>8.1f} | "
+                  f"{stats['write_latency_p99_ms']:>9.1f} | "
+                  f"{'ja' if sustained else 'nein'}")
+            if not sustained:
+                break
+    if max_sustained is not None:
+        print(f"\nHöchste dauerhaft verkraftete Rate: {max_sustained:.0f} Nachrichten/s "
+              f"({max_sustained / NUM_TAGS:.0f} je Tag)")
+    print("Ingest-Latenz: Versand durch den Lastgenerator (inkl. Broker) bis die Zeilen bei den Ausgaben sind; "
+          f"Datei: bis zum Schreiben in die CSV (Blöcke spätestens alle {ingest_service.FLUSH_INTERVAL_S:.0f} s).")
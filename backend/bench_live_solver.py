@@ -0,0 +1,92 @@
+import time
+import numpy as np
+from trilateration import project_to_2d, solve_least_squares, solve_analytic
+
+# --- Konfiguration ---
+ANCHOR_POSITIONS_3D = np.array([
+    [2.8, 0, 1.31],
+    [0.1, 0, 2.0],
+    [1.86, 4.1, 2.10]
+])
+ROOM_X_DIM = 2.9
+ROOM_Y_DIM = 4.1
+TAG_HEIGHT = 0.015
+
+NUM_SOLVES = 2000
+ANCHOR_COUNTS = [3, 8, 16]
+RANGE_NOISE_M = 0.05
+STEP_NOISE_M = 0.05      # Bewegung zwischen zwei Timer-Ticks (Warmstart-Abstand)
+FRAME_BUDGET_MS = 50.0   # QTimer-Intervall in position_plotter.py
+AGREEMENT_TOL_MM = 1.0   # Max. Abweichung analytisch vs. least_squares, sonst schlägt der Benchmark fehl
+SEED = 0
+
+
+def make_anchors(num_anchors, rng):
+    """Reale Anker plus zusätzliche, zufällig am Raumrand verteilte Anker."""
+    anchors = [a for a in ANCHOR_POSITIONS_3D[:num_anchors]]
+    while len(anchors) < num_anchors:
+        edge = rng.integers(4)
+        t = rng.uniform()
+        x, y = [(t * ROOM_X_DIM, 0), (ROOM_X_DIM, t * ROOM_Y_DIM),
+                (t * ROOM_X_DIM, ROOM_Y_DIM), (0, t * ROOM_Y_DIM)][edge]
+        anchors.append(np.array([x, y, rng.uniform(1.0, 2.5)]))
+    return np.array(anchors)
+
+def make_epochs(anchors, rng):
+    """Erzeugt eine Zufallsbewegung durch den Raum mit verrauschten 2D-Distanzen."""
+    pos = np.array([2.07, 0.70])
+    epochs = []
+    for _ in range(NUM_SOLVES):
+        pos = np.clip(pos + rng.normal(0, STEP_NOISE_M, 2), [0, 0], [ROOM_X_DIM, ROOM_Y_DIM])
+        slant = np.sqrt(((anchors[:, :2] - pos)**2).sum(axis=1) + (anchors[:, 2] - TAG_HEIGHT)**2)
+        slant = np.round(slant + rng.normal(0, RANGE_NOISE_M, len(anchors)), 2)
+        dists_2d = np.array([project_to_2d(d, a[2], TAG_HEIGHT) for d, a in zip(slant, anchors)])
+        epochs.append(dists_2d)
+    return epochs
+
+def time_solver(solver, anchors_2d, epochs):
+    """Misst die Latenz pro Lösung (µs) mit Warmstart von der letzten Position."""
+    last_pos = np.array([2.07, 0.70])
+    latencies = np.empty(len(epochs))
+    positions = np.empty((len(epochs), 2))
+    for i, dists_2d in enumerate(epochs):
+        t_start = time.perf_counter()
+        pos = solver(anchors_2d, dists_2d, last_pos)
+        latencies[i] = (time.perf_counter() - t_start) * 1e6
+        if pos is not None:
+            last_pos = pos
+        positions[i] = last_pos
+    return latencies, positions
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(SEED)
+    budget_us = FRAME_BUDGET_MS * 1000
+
+    print(f"Latenz pro Lösung über {NUM_SOLVES} Epochen (Frame-Budget {FRAME_BUDGET_MS:.0f} ms)")
+    print(f"{'Anker':<6} | {'Solver':<14} | {'p50 (µs)':>9} | {'p99 (µs)':>9} | {'max (µs)':>9} | {'Budget p99':>10}")
+    print("-" * 70)
+
+    failed = []
+    for num_anchors in ANCHOR_COUNTS:
+        anchors = make_anchors(num_anchors, rng)
+        anchors_2d = anchors[:, :2]
+        epochs = make_epochs(anchors, rng)
+
+        results = {}
+        for name, solver in [('least_squares', solve_least_squares), ('analytisch', solve_analytic)]:
+            latencies, positions = time_solver(solver, anchors_2d, epochs)
+            results[name] = positions
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"{num_anchors:<6} | {name:<14} | {p50:>9.1f} | {p99:>9.1f} | "
+                  f"{latencies.max():>9.1f} | {p99 / budget_us * 100:>9.2f}%")
+
+        deviation = np.linalg.norm(results['least_squares'] - results['analytisch'], axis=1)
+        ok = deviation.max() * 1000 <= AGREEMENT_TOL_MM
+        print(f"{'':<6}   Abweichung analytisch vs. least_squares: "
+              f"median {np.median(deviation) * 1000:.3f} mm, max {deviation.max() * 1000:.3f} mm"
+              f" -> {'OK' if ok else 'ABWEICHUNG'}")
+        if not ok:
+            failed.append(num_anchors)
+
+    assert not failed, f"analytisch weicht bei {failed} Ankern um mehr als {AGREEMENT_TOL_MM} mm ab"
@@ -0,0 +1,110 @@
+import glob
+import os
+import time
+import numpy as np
+import pandas as pd
+from merge_engine import merge_sensors, nearest_index
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+IMU_FILE = 'imu_data_1.csv'
+UWB_FILE = 'uwb_data_1.csv'
+TIME_TOLERANCE_NS = 1e8
+SYNTHETIC_IMU_ROWS = 10_000_000
+IMU_RATE_HZ = 50
+UWB_RATE_HZ = 5
+SYNTHETIC_MACS = ['48e72903b3fc', '83a8d3e15c4', 'e05a1b1fafc4']
+SEED = 0
+
+
+def legacy_merge(df_imu, df_uwb, tolerance_ns=TIME_TOLERANCE_NS):
+    """Bisheriger Merge aus merged_imu_uwb_data.py (Schleife pro MAC, nächste statt nächstgelegene Zeile)."""
+    df_merged = df_imu.copy()
+    for mac in df_uwb['mac_address'].unique():
+        col_name = f"dist_{mac.replace(':', '')[:5]}"
+        df_merged[col_name] = np.nan
+        uwb_subset = df_uwb[df_uwb['mac_address'] == mac]
+        idx_closest_imu = df_merged['timestamp_ns'].searchsorted(uwb_subset['timestamp_ns'])
+        idx_closest_imu = np.clip(idx_closest_imu, 0, len(df_merged) - 1)
+        imu_timestamps = df_merged['timestamp_ns'].values[idx_closest_imu]
+        time_diffs = np.abs(imu_timestamps - uwb_subset['timestamp_ns'].values)
+        valid_mask = time_diffs < tolerance_ns
+        df_merged.loc[df_merged.index[idx_closest_imu[valid_mask]], col_name] = \
+            uwb_subset['distance'].values[valid_mask]
+    return df_merged
+
+def mean_offsets_ms(df_imu, df_uwb):
+    """Mittlerer Zeitabstand zwischen zugeordneter IMU-Zeile und UWB-Messung (alt, neu)."""
+    imu_ts = df_imu['timestamp_ns'].to_numpy(dtype=np.int64)
+    uwb_ts = df_uwb['timestamp_ns'].to_numpy(dtype=np.int64)
+    next_idx = np.clip(np.searchsorted(imu_ts, uwb_ts), 0, len(imu_ts) - 1)
+    _, dt = nearest_index(imu_ts, uwb_ts)
+    return np.abs(imu_ts[next_idx] - uwb_ts).mean() / 1e6, dt.mean() / 1e6
+
+def largest_experiment():
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, 'exp*', IMU_FILE)))
+    if not paths:
+        return None
+    sizes = [(sum(1 for _ in open(p)), p) for p in paths]
+    imu_path = max(sizes)[1]
+    exp_dir = os.path.dirname(imu_path)
+    df_imu = pd.read_csv(imu_path)
+    df_uwb = pd.read_csv(os.path.join(exp_dir, UWB_FILE))
+    df_imu['timestamp_ns'] = df_imu['timestamp_ns'].astype(np.int64)
+    df_uwb['timestamp_ns'] = df_uwb['timestamp_ns'].astype(np.int64)
+    return os.path.basename(exp_dir), df_imu, df_uwb
+
+def synthetic_log(num_imu_rows, rng):
+    """IMU mit IMU_RATE_HZ und UWB mit UWB_RATE_HZ je Anker, beide mit Zeitstempel-Jitter."""
+    imu_period = int(1e9 / IMU_RATE_HZ)
+    imu_ts = np.arange(num_imu_rows, dtype=np.int64) * imu_period
+    imu_ts += rng.integers(0, imu_period // 4, num_imu_rows)
+    df_imu = pd.DataFrame({'timestamp_ns': imu_ts})
+    for col in ['qw', 'qx', 'qy', 'qz', 'ax', 'ay', 'az']:
+        df_imu[col] = rng.standard_normal(num_imu_rows)
+
+    num_uwb = num_imu_rows * UWB_RATE_HZ // IMU_RATE_HZ
+    uwb_period = int(1e9 / UWB_RATE_HZ)
+    base = np.arange(num_uwb, dtype=np.int64) * uwb_period
+    parts = []
+    for mac in SYNTHETIC_MACS:
+        ts = base + rng.integers(0, uwb_period, num_uwb)
+        parts.append(pd.DataFrame({'timestamp_ns': ts, 'mac_address': mac,
+                                   'distance': np.round(rng.uniform(0.5, 5.0, num_uwb), 2)}))
+    df_uwb = pd.concat(parts, ignore_index=True).sort_values('timestamp_ns', kind='stable', ignore_index=True)
+    return df_imu, df_uwb
+
+def compare(name, df_imu, df_uwb):
+    print(f"\n== {name}: {len(df_imu)} IMU-Zeilen, {len(df_uwb)} UWB-Messungen ==")
+
+    t_start = time.perf_counter()
+    df_legacy = legacy_merge(df_imu, df_uwb)
+    t_legacy = time.perf_counter() - t_start
+    dist_cols = [c for c in df_legacy.columns if c.startswith('dist_')]
+    legacy_filled = int(df_legacy[dist_cols].notna().to_numpy().sum())
+    del df_legacy
+
+    t_start = time.perf_counter()
+    df_new, stats = merge_sensors(df_imu, df_uwb, TIME_TOLERANCE_NS)
+    t_new = time.perf_counter() - t_start
+    new_filled = int(df_new[dist_cols].notna().to_numpy().sum())
+    collisions = sum(s['collisions'] for s in stats.values())
+    del df_new
+
+    print(f"{'Variante':<20} | {'Zeit (s)':>9} | {'Zeilen/s':>12} | {'belegte Zellen':>14}")
+    print(f"{'alt (pro MAC)':<20} | {t_legacy:>9.3f} | {len(df_imu) / t_legacy:>12.0f} | {legacy_filled:>14}")
+    print(f"{'neu (ein Durchgang)':<20} | {t_new:>9.3f} | {len(df_imu) / t_new:>12.0f} | {new_filled:>14}")
+    print(f"Speedup: {t_legacy / t_new:.2f}x, Kollisionen (alt still überschrieben): {collisions}")
+    offset_legacy, offset_new = mean_offsets_ms(df_imu, df_uwb)
+    print(f"Mittlerer Zeitabstand zur IMU-Zeile: alt {offset_legacy:.2f} ms, neu {offset_new:.2f} ms")
+
+
+if __name__ == "__main__":
+    exp = largest_experiment()
+    if exp is None:
+        print(f"FEHLER: Keine Experimente gefunden unter {RESULTS_DIR}")
+    else:
+        compare(f"größtes Experiment ({exp[0]})", exp[1], exp[2])
+
+    df_imu, df_uwb = synthetic_log(SYNTHETIC_IMU_ROWS, np.random.default_rng(SEED))
+    compare("synthetisches Log", df_imu, df_uwb)
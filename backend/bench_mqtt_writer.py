@@ -0,0 +1,164 @@
+import csv
+import filecmp
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+import numpy as np
+import mqtt_sub
+from bench_payload_codec import legacy_parse_uwb_data, legacy_parse_imu_data
+
+# --- Konfiguration ---
+DURATION_S = 600            # Synthetische Aufnahme: 10 min
+IMU_RATE_HZ = 50
+UWB_RATE_HZ = 5
+NUM_ANCHORS = 4
+SEED = 0
+# Hänger des Dateisystems: Nachrichten werden im festen Takt zugestellt, ein Flush blockiert einmal
+PACED_RATE = 2000           # Nachrichten/s
+PACED_MESSAGES = 6000
+STALL_AFTER_S = 1.0
+STALL_S = 0.5
+SMALL_QUEUE_SIZE = 500      # Für 'drop_oldest', damit der Hänger die Warteschlange überlaufen lässt
+
+
+def synthetic_messages(rng):
+    """MQTT-Nachrichten wie vom Tag gesendet (Topic + Payload-Bytes), zeitlich verschränkt."""
+    messages = []
+    imu_period = int(1e9 / IMU_RATE_HZ)
+    for i in range(DURATION_S * IMU_RATE_HZ):
+        a = rng.standard_normal(3)
+        q = rng.standard_normal(4)
+        payload = f"{i * imu_period};{a[0]:.4f},{a[1]:.4f},{a[2]:.4f};{q[0]:.4f},{q[1]:.4f},{q[2]:.4f},{q[3]:.4f}"
+        messages.append((i * imu_period, mqtt_sub.IMU_TOPIC, payload))
+    uwb_period = int(1e9 / UWB_RATE_HZ)
+    for i in range(DURATION_S * UWB_RATE_HZ):
+        dists = rng.uniform(0.5, 8.0, NUM_ANCHORS)
+        payload = f"{i * uwb_period + 1};" + ";".join(f"{a:05x}0000000,{d:.2f}" for a, d in enumerate(dists))
+        messages.append((i * uwb_period + 1, mqtt_sub.UWB_TOPIC, payload))
+    messages.sort(key=lambda m: m[0])
+    return [SimpleNamespace(topic=topic, payload=payload.encode()) for _, topic, payload in messages]
+
+def legacy_on_message(client, userdata, msg):
+    """Ursprünglicher Handler: Datei pro Nachricht öffnen, anhängen, schließen."""
+    payload_str = msg.payload.decode('utf-8')
+    if msg.topic == mqtt_sub.UWB_TOPIC:
+        csv_rows = legacy_parse_uwb_data(payload_str)
+        if csv_rows:
+            with open(mqtt_sub.UWB_CSV_FILE, 'a', newline='') as f:
+                csv.writer(f).writerows(csv_rows)
+    elif msg.topic == mqtt_sub.IMU_TOPIC:
+        csv_row = legacy_parse_imu_data(payload_str)
+        if csv_row:
+            with open(mqtt_sub.IMU_CSV_FILE, 'a', newline='') as f:
+                csv.writer(f).writerow(csv_row)
+
+def inline_on_message(client, userdata, msg):
+    """Gepufferter Handler, der im Netzwerk-Thread selbst schreibt (ohne Schreib-Thread)."""
+    payload_str = msg.payload.decode('utf-8')
+    if msg.topic == mqtt_sub.UWB_TOPIC:
+        csv_rows = legacy_parse_uwb_data(payload_str)
+        if csv_rows:
+            mqtt_sub.uwb_writer.write_rows(csv_rows)
+    elif msg.topic == mqtt_sub.IMU_TOPIC:
+        csv_row = legacy_parse_imu_data(payload_str)
+        if csv_row:
+            mqtt_sub.imu_writer.write_rows([csv_row])
+
+def legacy_open():
+    for path, headers in ((mqtt_sub.UWB_CSV_FILE, mqtt_sub.UWB_HEADERS), (mqtt_sub.IMU_CSV_FILE, mqtt_sub.IMU_HEADERS)):
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerow(headers)
+
+def threaded_open(queue_size=mqtt_sub.QUEUE_SIZE, policy='block'):
+    def open_files():
+        mqtt_sub.open_writers()
+        mqtt_sub.start_writer_thread(queue_size, policy)
+    return open_files
+
+
+class StallingCsvWriter(mqtt_sub.BufferedCsvWriter):
+    """BufferedCsvWriter, dessen erster Flush nach stall_at (monotonic) einmal STALL_S hängt."""
+    stall_at = None
+
+    def _flush(self):
+        if StallingCsvWriter.stall_at is not None and time.monotonic() >= StallingCsvWriter.stall_at:
+            StallingCsvWriter.stall_at = None
+            time.sleep(STALL_S)
+        super()._flush()
+
+
+def deliver(out_dir, messages, open_files, handler, rate=None):
+    """
+    Broker-Ersatz: stellt die Nachrichten nacheinander über den Callback zu (wie paho im Netzwerk-Thread),
+    mit rate im festen Takt, sonst so schnell wie möglich. Liefert Gesamtzeit und Callback-Dauern.
+    """
+    os.makedirs(out_dir)
+    mqtt_sub.UWB_CSV_FILE = os.path.join(out_dir, 'uwb_data_1.csv')
+    mqtt_sub.IMU_CSV_FILE = os.path.join(out_dir, 'imu_data_1.csv')
+    mqtt_sub.SEGMENTED_LOGS = False     # Verglichen werden die Einzeldateien
+    mqtt_sub.writer_thread = None
+    open_files()
+    callback_s = np.empty(len(messages))
+    t_start = time.perf_counter()
+    if rate is not None:
+        StallingCsvWriter.stall_at = time.monotonic() + STALL_AFTER_S
+    for i, msg in enumerate(messages):
+        if rate is not None:
+            wait = t_start + i / rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        t_callback = time.perf_counter()
+        handler(None, None, msg)
+        callback_s[i] = time.perf_counter() - t_callback
+    mqtt_sub.close_writers()
+    stats = mqtt_sub.writer_thread.stats() if mqtt_sub.writer_thread is not None else None
+    return time.perf_counter() - t_start, callback_s, stats
+
+def same_files(dir_a, dir_b):
+    return all(filecmp.cmp(os.path.join(dir_a, f), os.path.join(dir_b, f), shallow=False)
+               for f in ('uwb_data_1.csv', 'imu_data_1.csv'))
+
+
+if __name__ == "__main__":
+    messages = synthetic_messages(np.random.default_rng(SEED))
+    print(f"{len(messages)} Nachrichten ({DURATION_S} s, IMU {IMU_RATE_HZ} Hz, UWB {UWB_RATE_HZ} Hz x {NUM_ANCHORS} Anker)")
+    variants = [
+        ("Datei pro Nachricht", legacy_open, legacy_on_message),
+        ("Puffer im Callback", mqtt_sub.open_writers, inline_on_message),
+        ("Schreib-Thread (block)", threaded_open(), mqtt_sub.on_message),
+    ]
+    print("\n--- Durchsatz (Zustellung so schnell wie möglich) ---")
+    print(f"{'Variante':<28} | {'Zeit s':>7} | {'Nachr./s':>10} | {'identisch':>9}")
+    print("-" * 64)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reference = None
+        for name, open_files, handler in variants:
+            out_dir = os.path.join(tmp_dir, name.replace(' ', '_'))
+            elapsed, _, _ = deliver(out_dir, messages, open_files, handler)
+            reference = reference or out_dir
+            print(f"{name:<28} | {elapsed:>7.2f} | {len(messages) / elapsed:>10.0f} | {str(same_files(reference, out_dir)):>9}")
+
+    mqtt_sub.BufferedCsvWriter = StallingCsvWriter
+    paced = messages[:PACED_MESSAGES]
+    print(f"\n--- Hänger des Dateisystems ({STALL_S * 1e3:.0f} ms nach {STALL_AFTER_S:.0f} s, "
+          f"{len(paced)} Nachrichten mit {PACED_RATE} Nachr./s) ---")
+    print(f"{'Variante':<28} | {'Callback p99 ms':>15} | {'max. ms':>8} | {'Warteschl. max':>14} | "
+          f"{'verworfen':>9} | {'Latenz max ms':>13}")
+    print("-" * 104)
+    stall_variants = [
+        ("Puffer im Callback", mqtt_sub.open_writers, inline_on_message),
+        ("Schreib-Thread (block)", threaded_open(), mqtt_sub.on_message),
+        ("Schreib-Thread (drop_oldest)", threaded_open(SMALL_QUEUE_SIZE, 'drop_oldest'), mqtt_sub.on_message),
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, open_files, handler in stall_variants:
+            out_dir = os.path.join(tmp_dir, name.replace(' ', '_'))
+            _, callback_s, stats = deliver(out_dir, paced, open_files, handler, rate=PACED_RATE)
+            queue_info = f"{stats['max_depth']}" if stats else "-"
+            dropped = f"{stats['dropped_records']}" if stats else "0"
+            latency = f"{stats['latency_max_ms']:.1f}" if stats else "-"
+            print(f"{name:<28} | {np.percentile(callback_s, 99) * 1e3:>15.3f} | {callback_s.max() * 1e3:>8.1f} | "
+                  f"{queue_info:>14} | {dropped:>9} | {latency:>13}")
+    print("Callback: Zeit, die die Netzwerk-Schleife pro Nachricht blockiert ist; "
+          "Latenz: vom Empfang bis zum Schreiben.")
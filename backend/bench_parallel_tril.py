@@ -0,0 +1,58 @@
+import glob
+import os
+import time
+import numpy as np
+import pandas as pd
+from trilateration import trilaterate_epochs, trilaterate_epochs_parallel
+
+# --- Konfiguration ---
+ANCHOR_POSITIONS_3D = {
+    "dist_e05a1": np.array([2.8, 0, 1.31]),
+    "dist_48e72": np.array([0.1, 0, 2.0]),
+    "dist_83a8d": np.array([1.86, 4.1, 2.10])
+}
+TAG_HEIGHT = 0.015
+START_POS = np.array([2.07, 0.70])
+RESULTS_GLOB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results', 'exp*', 'merged_imu_uwb_data.csv')
+REPEAT = 5              # Experimente hintereinander hängen, um ein langes Log zu erhalten
+CHUNK_SIZE = 5000
+TOLERANCE_M = 1e-3      # Erlaubte Abweichung zum sequentiellen Ergebnis
+
+
+def load_long_log():
+    """Hängt alle Experimente REPEAT-mal hintereinander (nur die Anker-Spalten)."""
+    anchor_cols = list(ANCHOR_POSITIONS_3D.keys())
+    parts = [pd.read_csv(path, usecols=anchor_cols)[anchor_cols] for path in sorted(glob.glob(RESULTS_GLOB))]
+    if not parts:
+        return None
+    ranges = pd.concat(parts, ignore_index=True).to_numpy(dtype=float)
+    return np.tile(ranges, (REPEAT, 1))
+
+
+if __name__ == "__main__":
+    ranges = load_long_log()
+    if ranges is None:
+        print(f"FEHLER: Keine Dateien gefunden unter {RESULTS_GLOB}")
+        exit()
+    anchors_3d = np.array(list(ANCHOR_POSITIONS_3D.values()))
+    num_solves = int(np.sum(np.any(~np.isnan(ranges), axis=1)))
+    print(f"Langes Log: {len(ranges)} Epochen, davon {num_solves} mit UWB-Daten.")
+
+    t_start = time.perf_counter()
+    reference = trilaterate_epochs(ranges, anchors_3d, TAG_HEIGHT, START_POS)
+    t_seq = time.perf_counter() - t_start
+    print(f"Sequentiell: {t_seq:.2f} s")
+
+    worker_counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    worker_counts = [w for w in worker_counts if w <= (os.cpu_count() or 1)]
+
+    print(f"\n{'Worker':<7} | {'Zeit (s)':>9} | {'Speedup':>8} | {'max. Abw. (m)':>13} | {'Anteil < Tol.':>13}")
+    print("-" * 62)
+    for workers in worker_counts:
+        t_start = time.perf_counter()
+        positions = trilaterate_epochs_parallel(ranges, anchors_3d, TAG_HEIGHT, START_POS,
+                                                chunk_size=CHUNK_SIZE, max_workers=workers)
+        t_par = time.perf_counter() - t_start
+        deviation = np.linalg.norm(positions - reference, axis=1)
+        within = np.mean(deviation < TOLERANCE_M) * 100
+        print(f"{workers:<7} | {t_par:>9.2f} | {t_seq / t_par:>7.2f}x | {deviation.max():>13.6f} | {within:>12.2f}%")
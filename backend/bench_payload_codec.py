@@ -0,0 +1,192 @@
+import glob
+import os
+import time
+import pandas as pd
+from payload_codec import (PayloadCodec, decode_imu, decode_uwb, decode_imu_text, decode_uwb_text, decode_imu_binary,
+                           decode_uwb_binary, decode_imu_frame, encode_imu_binary, encode_imu_block, encode_uwb_binary,
+                           imu_csv_row)
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+REPEATS = 5                 # Bester von REPEATS Durchläufen
+SAMPLES_PER_FRAME = 10      # IMU-Frames mit mehreren Samples
+NUM_ANCHORS = 3             # Bekannte Anker für die Index-Zuordnung (wie timestream.py / position_plotter.py)
+
+
+# --- Bisherige Parser (Referenz): mqtt_sub.py liefert Strings, timestream.py Anker-Indizes ---
+
+def legacy_parse_uwb_data(payload_str):
+    parts = payload_str.strip().split(';')
+    if len(parts) < 2:
+        return []
+    timestamp = parts[0]
+    rows_to_write = []
+    for device_data in parts[1:]:
+        if not device_data:
+            continue
+        try:
+            mac, dist = device_data.split(',')
+            rows_to_write.append([timestamp, mac, dist])
+        except ValueError:
+            print(f"Überspringe fehlerhafte UWB-Daten: {device_data}")
+    return rows_to_write
+
+def legacy_parse_imu_data(payload_str):
+    parts = payload_str.strip().split(';')
+    if len(parts) != 3:
+        print(f"Überspringe fehlerhafte IMU-Daten (falsche Anzahl an Teilen): {payload_str}")
+        return None
+    timestamp = parts[0]
+    try:
+        group1_values = parts[1].split(',')
+        group2_values = parts[2].split(',')
+        if len(group1_values) != 3 or len(group2_values) != 4:
+            print(f"Überspringe fehlerhafte IMU-Daten (falsche Anzahl an Werten): {payload_str}")
+            return None
+        ax, ay, az = group1_values
+        qw, qx, qy, qz = group2_values
+        return [timestamp, qw, qx, qy, qz, ax, ay, az]
+    except Exception as e:
+        print(f"Fehler beim Parsen der IMU-Daten: {e} -- Payload: {payload_str}")
+        return None
+
+def legacy_uwb_to_index(payload_str, known_macs):
+    try:
+        parts = payload_str.strip().split(';')
+        if len(parts) < 2:
+            return None
+        timestamp_ns = int(parts[0])
+        indices = []
+        for device_data in parts[1:]:
+            if not device_data:
+                continue
+            mac, dist_str = device_data.split(',')
+            if mac in known_macs:
+                indices.append((known_macs[mac], float(dist_str)))
+        return timestamp_ns, indices
+    except Exception:
+        return None
+
+
+def recorded_payloads():
+    """Payloads wie von der Firmware gesendet, rekonstruiert aus den aufgezeichneten CSV-Dateien (Text und binär)."""
+    imu_text, uwb_text = [], []
+    for exp_dir in sorted(glob.glob(os.path.join(RESULTS_DIR, 'exp*'))):
+        imu_file = os.path.join(exp_dir, 'imu_data_1.csv')
+        uwb_file = os.path.join(exp_dir, 'uwb_data_1.csv')
+        if not (os.path.exists(imu_file) and os.path.exists(uwb_file)):
+            continue
+        df_imu = pd.read_csv(imu_file, dtype=str)
+        imu_text += [f"{r.timestamp_ns};{r.ax},{r.ay},{r.az};{r.qw},{r.qx},{r.qy},{r.qz}".encode()
+                     for r in df_imu.itertuples()]
+        df_uwb = pd.read_csv(uwb_file, dtype=str)
+        for ts, group in df_uwb.groupby('timestamp_ns', sort=False):
+            uwb_text.append((f"{ts};" + "".join(f"{mac},{dist};" for mac, dist in
+                                                zip(group['mac_address'], group['distance']))).encode())
+    imu_binary = [encode_imu_binary(ts, ax, ay, az, qw, qx, qy, qz)
+                  for ts, qw, qx, qy, qz, ax, ay, az in map(decode_imu_text, imu_text)]
+    uwb_binary = [encode_uwb_binary(*decode_uwb_text(p)) for p in uwb_text]
+    return imu_text, imu_binary, uwb_text, uwb_binary
+
+def malformed_payloads(imu_text, imu_binary, uwb_text, uwb_binary):
+    """Typische Defekte: abgeschnittene Nachrichten, fehlende Trennzeichen, ungültige Zahlen und Zeichen."""
+    n = min(len(imu_text), len(uwb_text), 1000)
+    imu = ([p[:len(p) // 2] for p in imu_text[:n]] + [p.replace(b';', b',', 1) for p in imu_text[:n]] +
+           [p.replace(b'.', b'x', 1) for p in imu_text[:n]] + [p[:-4] for p in imu_binary[:n]])
+    uwb = ([p.split(b';', 1)[1] for p in uwb_text[:n]] + [p.replace(b',', b';', 1) for p in uwb_text[:n]] +
+           [p.replace(b'.', b'\xff', 1) for p in uwb_text[:n]] + [p[:-4] for p in uwb_binary[:n]])
+    return imu, uwb
+
+def throughput(decode, payloads):
+    best = float('inf')
+    for _ in range(REPEATS):
+        t_start = time.perf_counter()
+        for payload in payloads:
+            decode(payload)
+        best = min(best, time.perf_counter() - t_start)
+    return len(payloads) / best
+
+def report(name, variants):
+    """Erste Variante ist die Referenz für den Faktor."""
+    print(name)
+    rate = None
+    for variant_name, decode, variant_payloads in variants:
+        variant_rate = throughput(decode, variant_payloads)
+        rate = rate or variant_rate
+        size = sum(map(len, variant_payloads)) / len(variant_payloads)
+        print(f"{'  ' + variant_name:<44} | {size:>7.1f} | {variant_rate:>12,.0f} | {variant_rate / rate:>6.1f}x")
+
+
+if __name__ == "__main__":
+    imu_text, imu_binary, uwb_text, uwb_binary = recorded_payloads()
+    imu_frames = [b'\n'.join(imu_text[i:i + SAMPLES_PER_FRAME]) for i in range(0, len(imu_text), SAMPLES_PER_FRAME)]
+    imu_blocks = [encode_imu_block(*decode_imu_frame(frame)) for frame in imu_frames]
+    imu_bad, uwb_bad = malformed_payloads(imu_text, imu_binary, uwb_text, uwb_binary)
+    macs = list(dict.fromkeys(mac for p in uwb_text for mac, _ in decode_uwb_text(p).ranges))
+    known_macs = {mac: i for i, mac in enumerate(macs[:NUM_ANCHORS])}
+    codec = PayloadCodec(known_macs)
+    print(f"{len(imu_text)} IMU- und {len(uwb_text)} UWB-Payloads aus {RESULTS_DIR}, "
+          f"{len(known_macs)} von {len(macs)} Ankern bekannt\n")
+
+    # Codec und bisherige Parser müssen dieselben CSV-Zeilen bzw. Anker-Distanzen liefern,
+    # Binär und Text ebenfalls (float32 reicht für die 6 bzw. 2 Nachkommastellen)
+    same_imu = all(codec.imu_rows(t) == [legacy_parse_imu_data(t.decode())] == [imu_csv_row(decode_imu(b))]
+                   for t, b in zip(imu_text, imu_binary))
+    same_uwb = all(codec.uwb_rows(t) == legacy_parse_uwb_data(t.decode()) == codec.uwb_rows(b)
+                   for t, b in zip(uwb_text, uwb_binary))
+    same_anchors = all(codec.uwb_anchors(t).ranges == legacy_uwb_to_index(t.decode(), known_macs)[1]
+                       == [(i, round(d, 2)) for i, d in codec.uwb_anchors(b).ranges]
+                       for t, b in zip(uwb_text, uwb_binary))
+    print(f"Ergebnisse identisch mit den bisherigen Parsern und zwischen Text und Binär: "
+          f"IMU {same_imu}, UWB {same_uwb}, Anker-Indizes {same_anchors}")
+    codec = PayloadCodec(known_macs)
+    rejected_rows = sum(codec.imu_rows(p) is None for p in imu_bad)
+    rejected_imu = sum(PayloadCodec().imu_frame(p) is None for p in imu_bad)
+    rejected_uwb = sum(codec.uwb_rows(p) is None for p in uwb_bad)
+    print(f"Fehlerhafte Payloads erkannt: IMU {rejected_imu}/{len(imu_bad)} (CSV-Zeilen: {rejected_rows}, "
+          f"dort werden nur Felder geprüft, Zahlen unverändert übernommen), UWB {rejected_uwb}/{len(uwb_bad)}; "
+          f"Zähler: {dict(sorted(codec.errors.items()))}\n")
+
+    print(f"{'Payload-Typ / Dekodierung':<44} | {'Bytes':>7} | {'Nachr./s':>12} | {'Faktor':>7}")
+    print("-" * 80)
+    report("IMU Text, 1 Sample", [
+        ("bisheriger Parser (mqtt_sub, Strings)", lambda p: legacy_parse_imu_data(p.decode('utf-8')), imu_text),
+        ("codec.imu_rows -> CSV-Zeilen", codec.imu_rows, imu_text),
+        ("codec.imu_frame -> Arrays", codec.imu_frame, imu_text),
+        ("decode_imu -> ImuSample", decode_imu, imu_text),
+    ])
+    report("IMU Binär, 1 Sample", [
+        ("codec.imu_rows -> CSV-Zeilen", codec.imu_rows, imu_binary),
+        ("codec.imu_frame -> Arrays", codec.imu_frame, imu_binary),
+        ("decode_imu -> ImuSample", decode_imu, imu_binary),
+        ("decode_imu_binary -> ImuSample", decode_imu_binary, imu_binary),
+    ])
+    report(f"IMU Frame, {SAMPLES_PER_FRAME} Samples", [
+        ("bisheriger Parser zeilenweise (Strings)",
+         lambda p: [legacy_parse_imu_data(line) for line in p.decode('utf-8').split('\n')], imu_frames),
+        ("codec.imu_rows Text -> CSV-Zeilen", codec.imu_rows, imu_frames),
+        ("codec.imu_frame Text -> Arrays", codec.imu_frame, imu_frames),
+        ("codec.imu_rows Binär -> CSV-Zeilen", codec.imu_rows, imu_blocks),
+        ("codec.imu_frame Binär -> Arrays", codec.imu_frame, imu_blocks),
+    ])
+    report("UWB Text", [
+        ("bisheriger Parser (mqtt_sub, Strings)", lambda p: legacy_parse_uwb_data(p.decode('utf-8')), uwb_text),
+        ("bisheriger Parser (timestream, Indizes)", lambda p: legacy_uwb_to_index(p.decode('utf-8'), known_macs),
+         uwb_text),
+        ("codec.uwb_rows -> CSV-Zeilen", codec.uwb_rows, uwb_text),
+        ("codec.uwb_anchors -> Indizes", codec.uwb_anchors, uwb_text),
+        ("decode_uwb -> UwbFrame", decode_uwb, uwb_text),
+    ])
+    report("UWB Binär", [
+        ("codec.uwb_rows -> CSV-Zeilen", codec.uwb_rows, uwb_binary),
+        ("codec.uwb_anchors -> Indizes", codec.uwb_anchors, uwb_binary),
+        ("decode_uwb -> UwbFrame", decode_uwb, uwb_binary),
+        ("decode_uwb_binary -> UwbFrame", decode_uwb_binary, uwb_binary),
+    ])
+    report("Fehlerhaft (Text und Binär gemischt)", [
+        ("codec.imu_rows", codec.imu_rows, imu_bad),
+        ("codec.imu_frame", codec.imu_frame, imu_bad),
+        ("codec.uwb_rows", codec.uwb_rows, uwb_bad),
+        ("codec.uwb_anchors", codec.uwb_anchors, uwb_bad),
+    ])
+    print("\nFaktor: relativ zur ersten Zeile des jeweiligen Payload-Typs.")
@@ -0,0 +1,77 @@
+import glob
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+from merge_engine import merge_sensors, merge_sensors_long
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+ANCHOR_COUNTS = [3, 16, 64]
+DURATION_S = 1800           # Synthetische Aufnahme: 30 min
+IMU_RATE_HZ = 50
+UWB_RATE_HZ = 5
+DROPOUT = 0.1               # Anteil verlorener UWB-Messungen
+SEED = 0
+
+
+def synthetic_log(num_anchors, rng):
+    num_imu = DURATION_S * IMU_RATE_HZ
+    imu_ts = np.arange(num_imu, dtype=np.int64) * int(1e9 / IMU_RATE_HZ)
+    df_imu = pd.DataFrame({'timestamp_ns': imu_ts})
+    for col in ['qw', 'qx', 'qy', 'qz', 'ax', 'ay', 'az']:
+        df_imu[col] = rng.standard_normal(num_imu)
+
+    num_uwb = DURATION_S * UWB_RATE_HZ
+    uwb_period = int(1e9 / UWB_RATE_HZ)
+    parts = []
+    for a in range(num_anchors):
+        ts = np.arange(num_uwb, dtype=np.int64) * uwb_period + rng.integers(0, uwb_period, num_uwb)
+        keep = rng.uniform(size=num_uwb) >= DROPOUT
+        parts.append(pd.DataFrame({'timestamp_ns': ts[keep], 'mac_address': f'{a:05x}0000000',
+                                   'distance': np.round(rng.uniform(0.5, 8.0, keep.sum()), 2)}))
+    return df_imu, pd.concat(parts, ignore_index=True).sort_values('timestamp_ns', ignore_index=True)
+
+def csv_bytes(df):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    return len(buf.getvalue().encode())
+
+def compare(name, df_imu, df_uwb):
+    imu_cols = list(df_imu.columns)
+
+    t_start = time.perf_counter()
+    df_wide, _ = merge_sensors(df_imu, df_uwb)
+    t_wide = time.perf_counter() - t_start
+    dist_cols = [c for c in df_wide.columns if c not in imu_cols]
+    wide_mem = df_wide[dist_cols].memory_usage(index=False).sum()
+    wide_csv = csv_bytes(df_wide) - csv_bytes(df_imu)
+    nan_share = df_wide[dist_cols].isna().to_numpy().mean() * 100
+    del df_wide
+
+    t_start = time.perf_counter()
+    table, _ = merge_sensors_long(df_imu, df_uwb)
+    t_long = time.perf_counter() - t_start
+    long_csv = csv_bytes(table.to_frame())
+
+    print(f"{name:<22} | {len(dist_cols):>5} | {nan_share:>5.1f}% | {wide_mem / 2**20:>10.2f} | "
+          f"{table.nbytes / 2**20:>10.2f} | {wide_mem / table.nbytes:>6.1f}x | "
+          f"{wide_csv / 2**20:>9.2f} | {long_csv / 2**20:>9.2f} | {t_wide:>6.2f} | {t_long:>6.2f}")
+
+
+if __name__ == "__main__":
+    print(f"{'Datensatz':<22} | {'Anker':>5} | {'NaN':>6} | {'breit MiB':>10} | {'lang MiB':>10} | "
+          f"{'Faktor':>7} | {'CSV breit':>9} | {'CSV lang':>9} | {'t breit':>6} | {'t lang':>6}")
+    print("-" * 118)
+    for exp_dir in sorted(glob.glob(os.path.join(RESULTS_DIR, 'exp*'))):
+        imu_file = os.path.join(exp_dir, 'imu_data_1.csv')
+        uwb_file = os.path.join(exp_dir, 'uwb_data_1.csv')
+        if os.path.exists(imu_file) and os.path.exists(uwb_file):
+            compare(os.path.basename(exp_dir), pd.read_csv(imu_file), pd.read_csv(uwb_file))
+
+    rng = np.random.default_rng(SEED)
+    for num_anchors in ANCHOR_COUNTS:
+        df_imu, df_uwb = synthetic_log(num_anchors, rng)
+        compare(f"synthetisch {DURATION_S // 60} min", df_imu, df_uwb)
+    print("Speicher nur für die Distanzen (IMU-Spalten sind in beiden Formen gleich); Zeiten in s.")
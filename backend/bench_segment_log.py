@@ -0,0 +1,144 @@
+import csv
+import glob
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from segment_log import SegmentedLog, load_index, find_blocks, read_log, log_segments, log_files
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+REPEAT_DATA = 10                     # Aufgezeichnete IMU-Daten so oft hintereinanderhängen (längere Aufnahme)
+BLOCK_ROWS = 500                     # Zeilen pro append(), wie FLUSH_ROWS in mqtt_sub.py
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024  # Kleine Segmente, damit die Rotation mitgemessen wird
+WINDOWS_S = [1, 10, 60, 600]         # Länge der gelesenen Zeitfenster (Mitte der Aufnahme)
+REPEATS = 3
+# Komprimierung: (Name, compression, level) für die Tabelle; Referenz ist die ganze Datei am Stück
+COMPRESSIONS = [('ohne', None, 1), ('gzip Stufe 1', 'gzip', 1), ('gzip Stufe 6', 'gzip', 6)]
+STREAMS = ['imu_data_1.csv', 'uwb_data_1.csv']
+
+
+def recorded_rows(name='imu_data_1.csv'):
+    """Zeilen eines Stroms aus allen results/exp*, mit fortlaufenden Zeitstempeln REPEAT_DATA-mal hintereinander."""
+    frames = [pd.read_csv(f, dtype=str) for f in sorted(glob.glob(os.path.join(RESULTS_DIR, 'exp*', name)))]
+    df = pd.concat(frames, ignore_index=True)
+    ts = df['timestamp_ns'].astype(np.int64).to_numpy()
+    step = np.diff(ts)
+    step = np.where((step >= 0) & (step < 1_000_000_000), step, 10_000_000)
+    base = np.concatenate([[0], np.cumsum(step)])
+    span = base[-1] + 10_000_000
+    headers = list(df.columns)
+    values = df.drop(columns='timestamp_ns').values.tolist()
+    rows = [[str(int(t) + k * span)] + v for k in range(REPEAT_DATA) for t, v in zip(base, values)]
+    return headers, rows
+
+def best_time(func):
+    best = float('inf')
+    for _ in range(REPEATS):
+        t_start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t_start)
+    return best
+
+def write_plain(path, headers, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for i in range(0, len(rows), BLOCK_ROWS):
+            writer.writerows(rows[i:i + BLOCK_ROWS])
+            f.flush()
+
+def write_segmented(directory, headers, rows, compression=None, level=1):
+    shutil.rmtree(directory, ignore_errors=True)
+    log = SegmentedLog(directory, headers, max_bytes=SEGMENT_MAX_BYTES, compression=compression, level=level)
+    for i in range(0, len(rows), BLOCK_ROWS):
+        log.append(rows[i:i + BLOCK_ROWS])
+    log.close()
+
+def compression_table(work_dir):
+    """Größe, Verhältnis und Durchsatz der Komprimierungen je Strom; alle Varianten müssen gleich zurückgelesen werden."""
+    print(f"{'Strom / Komprimierung':<28} | {'MB':>6} | {'Verh.':>6} | {'Schreiben MB/s':>14} | "
+          f"{'Lesen MB/s':>10} | {'60 s (ms)':>9} | {'pd.read_csv':>11}")
+    print("-" * 102)
+    for name in STREAMS:
+        headers, rows = recorded_rows(name)
+        directory = os.path.join(work_dir, os.path.splitext(name)[0])
+        raw = None
+        reference = None
+        ts = np.array([int(r[0]) for r in rows])
+        t0 = int(ts[len(ts) // 2])
+        t1 = t0 + 60 * 1_000_000_000
+        print(f"{name} ({len(rows):,} Zeilen)")
+        for label, compression, level in COMPRESSIONS:
+            t_write = best_time(lambda: write_segmented(directory, headers, rows, compression, level))
+            size = sum(os.path.getsize(p) for p in log_segments(directory))
+            raw = raw or size
+            t_read = best_time(lambda: read_log(directory))
+            t_window = best_time(lambda: read_log(directory, t0, t1))
+            df = read_log(directory)
+            reference = df if reference is None else reference
+            # Die Segmente bleiben auch ohne Index mit pandas lesbar
+            direct = pd.concat([pd.read_csv(p) for p in log_files(directory)], ignore_index=True)
+            same = df.equals(reference) and direct.equals(reference)
+            print(f"{'  ' + label:<28} | {size / 1e6:>6.1f} | {raw / size:>5.1f}x | {raw / 1e6 / t_write:>14.1f} | "
+                  f"{raw / 1e6 / t_read:>10.1f} | {t_window * 1e3:>9.1f} | {str(same):>11}")
+        with open(os.path.join(work_dir, 'whole.csv'), 'w', newline='') as f:
+            csv.writer(f).writerows([headers] + rows)
+        with open(os.path.join(work_dir, 'whole.csv'), 'rb') as f:
+            whole = len(gzip.compress(f.read(), 6))
+        print(f"{'  gzip 6, ganze Datei (Ref.)':<28} | {whole / 1e6:>6.1f} | {raw / whole:>5.1f}x |")
+    print("MB/s bezogen auf die unkomprimierte CSV; 60 s: read_log eines Zeitfensters; "
+          "pd.read_csv: direkt gelesene Segmente identisch.\n")
+
+
+if __name__ == "__main__":
+    headers, rows = recorded_rows()
+    work_dir = tempfile.mkdtemp(prefix='bench_segment_log_')
+    plain = os.path.join(work_dir, 'imu_plain.csv')
+    directory = os.path.join(work_dir, 'imu_data_1')
+
+    try:
+        compression_table(work_dir)
+
+        t_plain = best_time(lambda: write_plain(plain, headers, rows))
+        t_seg = best_time(lambda: write_segmented(directory, headers, rows))
+        index = load_index(directory)
+        size = os.path.getsize(plain)
+        print(f"{len(rows):,} IMU-Zeilen ({size / 1e6:.1f} MB) aus {RESULTS_DIR} (x{REPEAT_DATA}), "
+              f"{len(log_segments(directory))} Segmente, {len(index['offset']):,} Index-Einträge\n")
+        print(f"{'Schreiben':<36} | {'Zeilen/s':>12}")
+        print("-" * 53)
+        print(f"{'Einzel-CSV':<36} | {len(rows) / t_plain:>12,.0f}")
+        print(f"{'Segmentiert + Index':<36} | {len(rows) / t_seg:>12,.0f}")
+
+        # Neustart: vorhandene Segmente bleiben, es kommt ein neues hinzu
+        before = len(log_segments(directory))
+        SegmentedLog(directory, headers, max_bytes=SEGMENT_MAX_BYTES).close()
+        print(f"\nNeustart: {before} -> {len(log_segments(directory))} Segmente, "
+              f"Inhalt unverändert: {read_log(directory).equals(pd.read_csv(plain))}\n")
+
+        t_lookup = best_time(lambda: [find_blocks(index, 0, 1) for _ in range(1000)]) / 1000
+        print(f"Index-Suche (find_blocks, {len(index['offset']):,} Einträge): {t_lookup * 1e6:.1f} µs\n")
+
+        ts = np.array([int(r[0]) for r in rows])
+        mid = int(ts[len(ts) // 2])
+        print(f"{'Zeitfenster':<12} | {'Zeilen':>9} | {'Einzel-CSV (ms)':>16} | {'Segmente (ms)':>14} | {'Faktor':>7}")
+        print("-" * 71)
+        for window_s in WINDOWS_S:
+            t0, t1 = mid, mid + window_s * 1_000_000_000
+
+            def full_scan():
+                df = pd.read_csv(plain)
+                return df[(df['timestamp_ns'] >= t0) & (df['timestamp_ns'] <= t1)].reset_index(drop=True)
+
+            same = full_scan().equals(read_log(directory, t0, t1))
+            t_full = best_time(full_scan)
+            t_window = best_time(lambda: read_log(directory, t0, t1))
+            n = int(((ts >= t0) & (ts <= t1)).sum())
+            print(f"{str(window_s) + ' s':<12} | {n:>9,} | {t_full * 1e3:>16.1f} | {t_window * 1e3:>14.1f} | "
+                  f"{t_full / t_window:>6.1f}x{'' if same else '  ABWEICHUNG'}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,74 @@
+import glob
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+import storage
+from storage import read_table, write_table
+
+# --- Konfiguration ---
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+# Artefakt -> Spalten, die der typische Leser braucht
+ARTIFACTS = {
+    'merged_imu_uwb_data.csv': ['timestamp_ns', 'dist_e05a1', 'dist_48e72', 'dist_83a8d'],
+    'ekf_results.csv': ['timestamp_ns', 'pos_x', 'pos_y'],
+    'trilat_results.csv': ['timestamp_ns', 'pos_x', 'pos_y'],
+    'imu_dead_reckoning.csv': ['timestamp_ns', 'pos_x', 'pos_y'],
+}
+FORMATS = ['csv', 'parquet', 'feather']
+REPEAT = 5
+
+
+def best_time(func):
+    """Kleinste Laufzeit aus REPEAT Durchläufen (s)."""
+    best = float('inf')
+    for _ in range(REPEAT):
+        t_start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t_start)
+    return best
+
+
+if __name__ == "__main__":
+    if not storage.HAVE_ARROW:
+        print("HINWEIS: pyarrow nicht installiert, es wird nur CSV gemessen.")
+        FORMATS = ['csv']
+
+    exp_dirs = sorted(d for d in glob.glob(os.path.join(RESULTS_DIR, 'exp*')) if os.path.isdir(d))
+    totals = {fmt: {'bytes': 0, 'load_all': 0.0, 'load_cols': 0.0} for fmt in FORMATS}
+    work_dir = tempfile.mkdtemp(prefix='bench_storage_')
+
+    try:
+        for exp_dir in exp_dirs:
+            for artifact, columns in ARTIFACTS.items():
+                src = os.path.join(exp_dir, artifact)
+                if not os.path.exists(src):
+                    continue
+                df = pd.read_csv(src)
+                columns = [c for c in columns if c in df.columns]
+                for fmt in FORMATS:
+                    name = os.path.join(work_dir, f"{os.path.basename(exp_dir)}_{artifact}")
+                    storage.remove_artifact(name)
+                    path = write_table(df, name, fmt)
+                    totals[fmt]['bytes'] += os.path.getsize(path)
+                    totals[fmt]['load_all'] += best_time(lambda: read_table(name))
+                    totals[fmt]['load_cols'] += best_time(lambda: read_table(name, columns=columns))
+
+                    # CSV-Parsing ist nicht immer bitgenau, die Binärformate müssen es sein
+                    if fmt != 'csv' and not read_table(name).equals(df):
+                        print(f"WARNUNG: {path} weicht nach dem Zurücklesen vom Original ab.")
+                    storage.remove_artifact(name)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    csv = totals['csv']
+    print(f"\n{len(exp_dirs)} Experimente, Artefakte: {', '.join(ARTIFACTS)}")
+    print(f"{'Format':<8} | {'Größe (MiB)':>11} | {'rel.':>6} | {'Laden alle (ms)':>15} | {'Laden Spalten (ms)':>18} | {'Speedup':>7}")
+    print("-" * 80)
+    for fmt in FORMATS:
+        t = totals[fmt]
+        print(f"{fmt:<8} | {t['bytes'] / 2**20:>11.2f} | {t['bytes'] / csv['bytes']:>6.2f} | "
+              f"{t['load_all'] * 1e3:>15.1f} | {t['load_cols'] * 1e3:>18.1f} | "
+              f"{csv['load_all'] / t['load_cols']:>6.1f}x")
+    print("Speedup: Spaltenauswahl im Format gegenüber vollständigem CSV-Laden.")
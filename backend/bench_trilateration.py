@@ -0,0 +1,195 @@
+import glob
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+import scipy
+from trilateration import (solve_least_squares, solve_analytic, TrilaterationCache, trilaterate_epochs,
+                           trilaterate_epochs_parallel, multilaterate_batch, multilaterate_robust)
+from distance_field import load_distance_field
+
+# --- Konfiguration ---
+ANCHOR_POSITIONS_3D = {
+    "dist_e05a1": np.array([2.8, 0, 1.31]),
+    "dist_48e72": np.array([0.1, 0, 2.0]),
+    "dist_83a8d": np.array([1.86, 4.1, 2.10])
+}
+TAG_HEIGHT = 0.015
+START_POS = np.array([2.07, 0.70])
+ROOM_X_DIM = 2.9
+ROOM_Y_DIM = 4.1
+RESULTS_GLOB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results', 'exp*', 'merged_imu_uwb_data.csv')
+OUTPUT_JSON = 'bench_trilateration.json'
+
+SYNTHETIC_ANCHOR_COUNTS = [3, 4, 8, 16, 32, 64]
+SYNTHETIC_EPOCHS = 1000
+SYNTHETIC_DROPOUT = 0.1     # Anteil fehlender Einzelmessungen
+RANGE_NOISE_M = 0.05
+SEED = 0
+# Prüfung 'batch_3d' gegen trilaterate_epochs auf den Aufnahmen: p95 der Abweichung in Epochen mit
+# mindestens zwei Ankern. Epochen mit einem Anker halten die Position; liegt die vorige Position fast
+# genau zwischen den beiden Schnittpunkten zweier Kreise, wählen die Solver u.U. verschiedene.
+BATCH_CHECK_P95_M = 0.5
+
+
+class TimedSolver:
+    """Umhüllt einen Solver und misst die Latenz jedes Aufrufs."""
+
+    def __init__(self, solver):
+        self.solver = solver
+        self.latencies_us = []
+
+    def __call__(self, anchor_positions_2d, distances_2d, x0):
+        t_start = time.perf_counter()
+        pos = self.solver(anchor_positions_2d, distances_2d, x0)
+        self.latencies_us.append((time.perf_counter() - t_start) * 1e6)
+        return pos
+
+
+def run_sequential(solver, use_cache=False, use_grid_init=False):
+    def run(ranges, anchors_3d):
+        timed = TimedSolver(solver)
+        cache = TrilaterationCache() if use_cache else None
+        initializer = load_distance_field(anchors_3d, TAG_HEIGHT).initial_guess if use_grid_init else None
+        positions = trilaterate_epochs(ranges, anchors_3d, TAG_HEIGHT, START_POS, solver=timed, cache=cache,
+                                       anchor_ids=list(range(len(anchors_3d))), initializer=initializer)
+        extra = {'cache': cache.stats()} if cache is not None else {}
+        return positions, timed.latencies_us, extra
+    return run
+
+def run_parallel(ranges, anchors_3d):
+    return trilaterate_epochs_parallel(ranges, anchors_3d, TAG_HEIGHT, START_POS), None, {}
+
+def run_batch_3d(ranges, anchors_3d):
+    return multilaterate_batch(ranges, anchors_3d, TAG_HEIGHT, START_POS)[:, :2], None, {}
+
+def run_robust(ranges, anchors_3d):
+    positions, inliers = multilaterate_robust(ranges, anchors_3d, TAG_HEIGHT, START_POS)
+    rejected = int(np.sum(~inliers & ~np.isnan(ranges)))
+    return positions[:, :2], None, {'rejected_ranges': rejected}
+
+# Referenz ist immer der erste Eintrag (bisheriger Per-Row-Solver)
+SOLVER_MODES = {
+    'least_squares': run_sequential(solve_least_squares),
+    'least_squares_cache': run_sequential(solve_least_squares, use_cache=True),
+    'least_squares_grid': run_sequential(solve_least_squares, use_cache=True, use_grid_init=True),
+    'analytic': run_sequential(solve_analytic),
+    'parallel': run_parallel,
+    'batch_3d': run_batch_3d,
+    'robust': run_robust,
+}
+
+
+def percentiles(values):
+    if values is None or len(values) == 0:
+        return None
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(np.max(values))}
+
+def benchmark_dataset(name, ranges, anchors_3d):
+    """Führt alle Solver-Modi auf einem Datensatz aus und vergleicht mit der Referenz."""
+    num_epochs = len(ranges)
+    num_solves = int(np.sum(np.any(~np.isnan(ranges), axis=1)))
+    print(f"\n== {name}: {num_epochs} Epochen, {num_solves} mit UWB-Daten, {len(anchors_3d)} Anker ==")
+    print(f"{'Modus':<20} | {'Epochen/s':>11} | {'p50 (µs)':>9} | {'p99 (µs)':>9} | {'Abw. p95 (m)':>12} | {'Abw. max (m)':>12}")
+
+    reference = None
+    results = {}
+    for mode, run in SOLVER_MODES.items():
+        t_start = time.perf_counter()
+        positions, latencies, extra = run(ranges, anchors_3d)
+        elapsed = time.perf_counter() - t_start
+        if reference is None:
+            reference = positions
+
+        deviation = np.linalg.norm(positions - reference, axis=1)
+        lat = percentiles(latencies)
+        results[mode] = {
+            'elapsed_s': elapsed,
+            'epochs_per_s': num_epochs / elapsed,
+            'solves_per_s': num_solves / elapsed,
+            'amortized_us_per_solve': elapsed / max(num_solves, 1) * 1e6,
+            'latency_us': lat,
+            'agreement_m': {'median': float(np.median(deviation)), 'p95': float(np.percentile(deviation, 95)),
+                            'max': float(deviation.max())},
+            **extra,
+        }
+        p50 = f"{lat['p50']:>9.1f}" if lat else f"{'-':>9}"
+        p99 = f"{lat['p99']:>9.1f}" if lat else f"{'-':>9}"
+        print(f"{mode:<20} | {num_epochs / elapsed:>11.0f} | {p50} | {p99} | "
+              f"{np.percentile(deviation, 95):>12.4f} | {deviation.max():>12.4f}")
+
+    return {'epochs': num_epochs, 'solves': num_solves, 'anchors': len(anchors_3d), 'modes': results}
+
+def check_batch_3d(ranges, anchors_3d):
+    """Vergleicht multilaterate_batch mit dem sequentiellen Solver (Voraussetzung für TRIL_MODE='3d')."""
+    reference = trilaterate_epochs(ranges, anchors_3d, TAG_HEIGHT, START_POS)
+    positions = multilaterate_batch(ranges, anchors_3d, TAG_HEIGHT, START_POS)[:, :2]
+    deviation = np.linalg.norm(positions - reference, axis=1)
+    solved = np.sum(~np.isnan(ranges), axis=1) >= 2
+    p95 = float(np.percentile(deviation[solved], 95)) if solved.any() else 0.0
+    ok = p95 <= BATCH_CHECK_P95_M
+    print(f"batch_3d gegen sequentiell (>= 2 Anker): p95 {p95:.3f} m, "
+          f"Median aller Epochen {np.median(deviation):.3f} m -> {'OK' if ok else 'ABWEICHUNG'}")
+    return {'p95_m': p95, 'median_m': float(np.median(deviation)), 'ok': bool(ok)}
+
+def make_synthetic(num_anchors, rng):
+    """Zufallsbewegung durch den Raum, Anker am Raumrand, verrauschte und lückenhafte Distanzen."""
+    anchors = list(ANCHOR_POSITIONS_3D.values())[:num_anchors]
+    while len(anchors) < num_anchors:
+        t = rng.uniform()
+        edge = rng.integers(4)
+        x, y = [(t * ROOM_X_DIM, 0), (ROOM_X_DIM, t * ROOM_Y_DIM),
+                (t * ROOM_X_DIM, ROOM_Y_DIM), (0, t * ROOM_Y_DIM)][edge]
+        anchors.append(np.array([x, y, rng.uniform(1.0, 2.5)]))
+    anchors = np.array(anchors)
+
+    steps = rng.normal(0, 0.02, (SYNTHETIC_EPOCHS, 2))
+    path = np.clip(START_POS + np.cumsum(steps, axis=0), [0, 0], [ROOM_X_DIM, ROOM_Y_DIM])
+    path_3d = np.column_stack([path, np.full(len(path), TAG_HEIGHT)])
+    ranges = np.linalg.norm(path_3d[:, None, :] - anchors[None], axis=2)
+    ranges = np.round(ranges + rng.normal(0, RANGE_NOISE_M, ranges.shape), 2)
+    ranges[rng.uniform(size=ranges.shape) < SYNTHETIC_DROPOUT] = np.nan
+    return ranges, anchors
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    report = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'cpu_count': os.cpu_count(),
+        'reference_mode': next(iter(SOLVER_MODES)),
+        'experiments': {},
+        'synthetic': {},
+    }
+
+    anchor_cols = list(ANCHOR_POSITIONS_3D.keys())
+    anchors_3d = np.array(list(ANCHOR_POSITIONS_3D.values()))
+    for path in sorted(glob.glob(RESULTS_GLOB)):
+        exp_name = os.path.basename(os.path.dirname(path))
+        ranges = pd.read_csv(path, usecols=anchor_cols)[anchor_cols].to_numpy(dtype=float)
+        report['experiments'][exp_name] = benchmark_dataset(exp_name, ranges, anchors_3d)
+        report['experiments'][exp_name]['batch_3d_check'] = check_batch_3d(ranges, anchors_3d)
+
+    rng = np.random.default_rng(SEED)
+    for num_anchors in SYNTHETIC_ANCHOR_COUNTS:
+        ranges, anchors = make_synthetic(num_anchors, rng)
+        report['synthetic'][f'{num_anchors}_anchors'] = benchmark_dataset(
+            f"synthetisch, {num_anchors} Anker", ranges, anchors)
+
+    with open(OUTPUT_JSON, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nErgebnisse gespeichert in '{OUTPUT_JSON}'.")
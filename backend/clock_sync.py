@@ -0,0 +1,220 @@
+import json
+import numpy as np
+import pandas as pd
+
+# --- Konfiguration ---
+IMU_FILE = 'imu_data_1.csv'
+UWB_FILE = 'uwb_data_1.csv'
+CLOCK_FILE = 'clock_calibration.json'
+GRID_NS = 50_000_000              # Raster der Bewegungssignale (20 Hz)
+SMOOTH_NS = 250_000_000           # Glättung der Hüllkurven (gleitendes Mittel)
+MAX_OFFSET_NS = 3_000_000_000     # Suchbereich für den Versatz (±)
+MAX_RATE_GAP_NS = 1_000_000_000   # Range-Rate nur aus Messpaaren eines Ankers mit kleinerem Abstand
+MAX_DRIFT_PPM = 500               # Suchbereich für die Drift (±)
+MAX_DRIFT_STEPS = 201             # Obergrenze für die Anzahl geprüfter Drift-Hypothesen
+DRIFT_PEAK_TOLERANCE = 0.003      # Mindestgewinn an Korrelation, damit eine Drift übernommen wird
+DRIFT_BATCH = 16                  # Drift-Hypothesen pro FFT-Aufruf
+MIN_CORRELATION = 0.1             # Schwächere Korrelationsmaxima gelten als nicht verlässlich
+
+
+class ClockModel:
+    """
+    Lineares Uhrenmodell zwischen den Sensorströmen:
+    UWB-Zeit - IMU-Zeit = offset_ns + drift * (t - t_ref_ns).
+    apply() rechnet UWB-Zeitstempel in die Zeitbasis der IMU um.
+    """
+
+    def __init__(self, offset_ns=0.0, drift=0.0, t_ref_ns=0):
+        self.offset_ns = float(offset_ns)
+        self.drift = float(drift)
+        self.t_ref_ns = int(t_ref_ns)
+
+    def apply(self, uwb_ts):
+        """Korrigierte Zeitstempel (int64), ein einziger vektorisierter Schritt."""
+        ts = np.asarray(uwb_ts, dtype=np.int64)
+        correction = self.offset_ns + self.drift * (ts - self.t_ref_ns)
+        return ts - np.rint(correction).astype(np.int64)
+
+    def to_dict(self):
+        return {'offset_ns': self.offset_ns, 'drift': self.drift, 't_ref_ns': self.t_ref_ns}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['offset_ns'], data['drift'], data['t_ref_ns'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __str__(self):
+        return f"Versatz {self.offset_ns / 1e6:+.1f} ms, Drift {self.drift * 1e6:+.1f} ppm"
+
+
+def _binned_signal(ts, values, start_ns, num_bins):
+    """Mittelwert je Rasterzelle; leere Zellen linear interpoliert, danach geglättet."""
+    bins = (ts - start_ns) // GRID_NS
+    inside = (bins >= 0) & (bins < num_bins)
+    sums = np.bincount(bins[inside], weights=values[inside], minlength=num_bins)
+    counts = np.bincount(bins[inside], minlength=num_bins)
+    filled = np.flatnonzero(counts)
+    if len(filled) == 0:
+        return np.zeros(num_bins)
+    signal = np.interp(np.arange(num_bins), filled, sums[filled] / counts[filled])
+    width = max(int(SMOOTH_NS // GRID_NS), 1)
+    return np.convolve(signal, np.ones(width) / width, mode='same')
+
+def motion_envelope(df_imu, start_ns, num_bins):
+    """Hüllkurve des Beschleunigungsbetrags: steigt bei Bewegungsbeginn, fällt im Stillstand."""
+    acc = np.sqrt(df_imu['ax'].to_numpy() ** 2 + df_imu['ay'].to_numpy() ** 2 + df_imu['az'].to_numpy() ** 2)
+    return _binned_signal(df_imu['timestamp_ns'].to_numpy(dtype=np.int64), acc, start_ns, num_bins)
+
+def range_rate_envelope(df_uwb, start_ns, num_bins):
+    """Hüllkurve von |d Distanz / dt| über alle Anker (aufeinanderfolgende Messungen je Anker)."""
+    codes, _ = pd.factorize(df_uwb['mac_address'])
+    ts = df_uwb['timestamp_ns'].to_numpy(dtype=np.int64)
+    dist = df_uwb['distance'].to_numpy(dtype=float)
+    order = np.lexsort((ts, codes))
+    codes, ts, dist = codes[order], ts[order], dist[order]
+
+    dt = np.diff(ts)
+    pair = (codes[1:] == codes[:-1]) & (dt > 0) & (dt < MAX_RATE_GAP_NS)
+    rate = np.abs(np.diff(dist)[pair]) / (dt[pair] / 1e9)
+    mid_ts = ts[:-1][pair] + dt[pair] // 2
+    return _binned_signal(mid_ts, rate, start_ns, num_bins)
+
+def xcorr_peak(x, y, max_lag):
+    """
+    Normierte Kreuzkorrelation zeilenweise per FFT (x: (Rasterzellen,) oder wie y: (Zeilen, Rasterzellen)).
+    Gibt je Zeile den Versatz von y gegenüber x in Rasterzellen (per Parabel verfeinert)
+    und den Korrelationswert am Maximum zurück. Positiver Versatz: y läuft x hinterher.
+    """
+    x = np.atleast_2d(x).astype(float)
+    y = np.atleast_2d(y).astype(float)
+    x_std = x.std(axis=1, keepdims=True)
+    y_std = y.std(axis=1, keepdims=True)
+    x = np.divide(x - x.mean(axis=1, keepdims=True), x_std, out=np.zeros_like(x), where=x_std > 0)
+    y = np.divide(y - y.mean(axis=1, keepdims=True), y_std, out=np.zeros_like(y), where=y_std > 0)
+
+    n = x.shape[1]
+    size = 2 * n
+    corr = np.fft.irfft(np.conj(np.fft.rfft(x, size)) * np.fft.rfft(y, size), size) / n
+    max_lag = min(max_lag, n - 1)
+    lags = np.arange(-max_lag, max_lag + 1)
+    corr = corr[:, lags % size]
+
+    rows = np.arange(len(corr))
+    best = np.argmax(corr, axis=1)
+    peak = corr[rows, best]
+    inner = np.clip(best, 1, len(lags) - 2)
+    y0, y1, y2 = corr[rows, inner - 1], corr[rows, inner], corr[rows, inner + 1]
+    denom = y0 - 2 * y1 + y2
+    shift = np.divide(0.5 * (y0 - y2), denom, out=np.zeros_like(denom), where=denom < 0)
+    shift = np.where(inner == best, np.clip(shift, -0.5, 0.5), 0.0)
+    return lags[best] + shift, peak
+
+def estimate_clock(df_imu, df_uwb, max_offset_ns=MAX_OFFSET_NS, max_drift_ppm=MAX_DRIFT_PPM):
+    """
+    Schätzt Versatz und lineare Drift der UWB- gegenüber der IMU-Uhr über das ganze Log:
+    Kreuzkorrelation der Beschleunigungs-Hüllkurve mit der Range-Rate-Hüllkurve.
+    Für jede Drift-Hypothese wird die Range-Rate-Hüllkurve gestaucht/gestreckt, alle
+    Hypothesen laufen als Matrix durch einen einzigen Batch-FFT.
+
+    Gibt (ClockModel, info) zurück. Ist die Korrelation zu schwach, bleibt das Modell
+    neutral (Versatz 0) und info['reliable'] ist False.
+    """
+    imu_ts = df_imu['timestamp_ns'].to_numpy(dtype=np.int64)
+    uwb_ts = df_uwb['timestamp_ns'].to_numpy(dtype=np.int64)
+    info = {'reliable': False, 'correlation': 0.0, 'drifts': [], 'drift_correlations': []}
+    if len(imu_ts) < 2 or len(uwb_ts) < 2:
+        return ClockModel(), info
+
+    start_ns = int(min(imu_ts.min(), uwb_ts.min()))
+    num_bins = int((max(imu_ts.max(), uwb_ts.max()) - start_ns) // GRID_NS) + 1
+    x = motion_envelope(df_imu, start_ns, num_bins)
+    y = range_rate_envelope(df_uwb, start_ns, num_bins)
+
+    # Schrittweite so, dass benachbarte Hypothesen am Log-Ende um höchstens eine halbe Rasterzelle abweichen
+    span_bins = max(num_bins - 1, 1)
+    num_steps = min(int(np.ceil(max_drift_ppm * 1e-6 * span_bins * 2)), MAX_DRIFT_STEPS // 2)
+    drifts = np.linspace(-max_drift_ppm, max_drift_ppm, 2 * num_steps + 1) * 1e-6
+    # UWB-Zeit = IMU-Zeit * (1 + Drift): korrigierte Hüllkurve an gestreckten Rasterpunkten abtasten
+    # (blockweise, damit die FFT-Matrix auch bei stundenlangen Logs klein bleibt)
+    grid = np.arange(num_bins, dtype=float)
+    max_lag = int(max_offset_ns // GRID_NS)
+    lags, peaks = np.empty(len(drifts)), np.empty(len(drifts))
+    for lo in range(0, len(drifts), DRIFT_BATCH):
+        hi = lo + DRIFT_BATCH
+        y_batch = np.interp(np.outer(1 + drifts[lo:hi], grid), grid, y)
+        lags[lo:hi], peaks[lo:hi] = xcorr_peak(x, y_batch, max_lag)
+    # Drift nur übernehmen, wenn das Maximum innen im Suchbereich liegt und spürbar besser ist
+    # als keine Drift (kurze Logs lösen sie kaum auf); Feinwert per Parabel durch die Nachbarn
+    drift = 0.0
+    best = int(np.argmax(peaks))
+    zero = int(np.argmin(np.abs(drifts)))
+    if 0 < best < len(drifts) - 1 and peaks[best] - peaks[zero] > DRIFT_PEAK_TOLERANCE:
+        p0, p1, p2 = peaks[best - 1:best + 2]
+        step = drifts[1] - drifts[0]
+        drift = drifts[best] + 0.5 * (p0 - p2) / (p0 - 2 * p1 + p2) * step
+    lag, peak = xcorr_peak(x, np.interp((1 + drift) * grid, grid, y), max_lag)
+
+    info['drifts'] = drifts.tolist()
+    info['drift_correlations'] = peaks.tolist()
+    info['correlation'] = float(peak[0])
+    # Maximum am Rand des Suchbereichs: das echte Maximum liegt womöglich außerhalb
+    if peak[0] < MIN_CORRELATION or abs(lag[0]) > max_lag - 1:
+        return ClockModel(), info
+    info['reliable'] = True
+    return ClockModel(lag[0] * GRID_NS, drift, start_ns), info
+
+def resolve_clock(setting, df_imu=None, df_uwb=None):
+    """
+    Uhrenmodell zur Konfiguration CLOCK_SYNC der Merge-Skripte:
+    None = keine Korrektur, 'estimate' = aus den geladenen Logs schätzen,
+    sonst Pfad zu einer mit clock_sync.py gespeicherten Kalibrierung.
+    """
+    if setting is None:
+        return None
+    if setting == 'estimate':
+        if df_imu is None or df_uwb is None:
+            raise ValueError("CLOCK_SYNC='estimate' braucht die Logs im Speicher; "
+                             "Kalibrierung vorher mit clock_sync.py speichern und den Pfad angeben.")
+        model, info = estimate_clock(df_imu, df_uwb)
+        if not info['reliable']:
+            print(f"HINWEIS: Uhrenabgleich unsicher (Korrelation {info['correlation']:.2f}), keine Korrektur.")
+            return None
+        print(f"Uhrenabgleich: {model} (Korrelation {info['correlation']:.2f})")
+        return model
+    model = ClockModel.load(setting)
+    print(f"Uhrenabgleich aus '{setting}': {model}")
+    return model
+
+
+if __name__ == "__main__":
+    from merge_engine import merge_sensors
+    from segment_log import read_log
+
+    # Einzel-CSV oder segmentiertes Log von mqtt_sub.py
+    df_imu = read_log(IMU_FILE)
+    df_uwb = read_log(UWB_FILE)
+    model, info = estimate_clock(df_imu, df_uwb)
+
+    print(f"Globale Korrelation: {info['correlation']:.3f} ({'verlässlich' if info['reliable'] else 'unsicher'})")
+    if info['drifts']:
+        print(f"{len(info['drifts'])} Drift-Hypothesen zwischen ±{MAX_DRIFT_PPM} ppm geprüft.")
+    print(f"Modell: {model}")
+
+    # Wirkung auf den Merge: zugeordnete Messungen ohne und mit Korrektur
+    _, stats_raw = merge_sensors(df_imu, df_uwb)
+    df_fixed = df_uwb.assign(timestamp_ns=model.apply(df_uwb['timestamp_ns']))
+    _, stats_fixed = merge_sensors(df_imu, df_fixed)
+    for col in stats_raw:
+        print(f"  {col}: {stats_raw[col]['matched']} -> {stats_fixed[col]['matched']} zugeordnet")
+
+    if info['reliable']:
+        model.save(CLOCK_FILE)
+        print(f"Kalibrierung gespeichert: {CLOCK_FILE}")
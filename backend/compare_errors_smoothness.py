@@ -2,6 +2,9 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from scipy.interpolate import interp1d
+from storage import read_table
+
+RESULT_COLUMNS = ['timestamp_ns', 'pos_x', 'pos_y']
 
 # --- HILFSFUNKTIONEN ---
 def calculate_errors(res_df, gt_df):
@@ -60,8 +63,8 @@ def get_stats(errors):
 print("1. Lade CSV-Dateien...")
 try:
     gt_df = pd.read_csv('mqtt_ground_truth.csv')
-    ekf_df = pd.read_csv('ekf_results.csv') 
-    trilat_df = pd.read_csv('trilat_results.csv')
+    ekf_df = read_table('ekf_results.csv', columns=RESULT_COLUMNS)
+    trilat_df = read_table('trilat_results.csv', columns=RESULT_COLUMNS)
 except FileNotFoundError as e:
     print(f"FEHLER: Datei nicht gefunden: {e.filename}")
     exit()
@@ -0,0 +1,134 @@
+import time
+import numpy as np
+from grid_cache import ANCHOR_POSITIONS_3D, TAG_HEIGHT, ROOM_X_DIM, ROOM_Y_DIM, CACHE_DIR, \
+    cache_path, load_cached, save_cached
+
+# --- Konfiguration ---
+FIELD_RESOLUTION_M = 0.05
+FIELD_MARGIN_M = 0.5          # Gitter reicht so weit über den Raum hinaus
+REINIT_RESIDUAL_M = 0.3       # Ab diesem RMS-Residuum an last_pos wird global neu initialisiert
+BATCH_BLOCK_ELEMENTS = 4_000_000  # Max. Kostenmatrix-Elemente (Epochen x Zellen) pro Block
+
+
+class DistanceField:
+    """
+    Vorberechnetes Gitter der erwarteten Anker-Distanzen (float32, (Zellen, Anker)).
+
+    nearest() liefert für gemessene Distanzen die Zelle mit dem kleinsten
+    Quadratsummen-Residuum als globalen Startwert für den feinen Solver.
+    """
+
+    def __init__(self, cells_xy, dists, anchor_positions_3d, tag_height):
+        self.cells_xy = cells_xy
+        self.dists = dists
+        self.anchors = np.asarray(anchor_positions_3d, dtype=float)
+        self.tag_height = tag_height
+        self._dists_sq_t = np.ascontiguousarray((dists**2).T)
+        self._dists_t = np.ascontiguousarray(dists.T)
+
+    def nearest(self, ranges):
+        """
+        Grobe Position für eine Epoche (n_anker,) oder viele Epochen (N, n_anker).
+        NaN-Distanzen werden ignoriert; ohne gültige Distanz ergibt sich NaN.
+        """
+        ranges = np.asarray(ranges, dtype=np.float32)
+        if ranges.ndim == 1:
+            valid = ~np.isnan(ranges)
+            if not valid.any():
+                return np.full(2, np.nan)
+            diff = self.dists[:, valid] - ranges[valid]
+            return self.cells_xy[np.argmin(np.einsum('ij,ij->i', diff, diff))].astype(float)
+
+        # Batch: sum((d - r)^2) = sum(d^2 * v) - 2 d.r + sum(r^2), als Matrixprodukt
+        valid = ~np.isnan(ranges)
+        r = np.where(valid, ranges, 0.0).astype(np.float32)
+        v = valid.astype(np.float32)
+        best = np.empty(len(ranges), dtype=np.int64)
+        block = max(1, BATCH_BLOCK_ELEMENTS // len(self.cells_xy))
+        for start in range(0, len(ranges), block):
+            cost = v[start:start + block] @ self._dists_sq_t - 2.0 * (r[start:start + block] @ self._dists_t)
+            best[start:start + block] = np.argmin(cost, axis=1)
+        out = self.cells_xy[best].astype(float)
+        out[~valid.any(axis=1)] = np.nan
+        return out
+
+    def residual_rms(self, pos_xy, ranges):
+        """RMS-Residuum der 3D-Distanzen an pos_xy (z = Tag-Höhe) über gültige Anker."""
+        ranges = np.asarray(ranges, dtype=float)
+        valid = ~np.isnan(ranges)
+        if not valid.any():
+            return 0.0
+        diff = self.anchors[valid] - np.array([pos_xy[0], pos_xy[1], self.tag_height])
+        pred = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        return float(np.sqrt(np.mean((pred - ranges[valid])**2)))
+
+    def initial_guess(self, ranges, last_pos, reinit_residual=REINIT_RESIDUAL_M):
+        """
+        Startwert für den feinen Solver: last_pos, solange es zu den Messungen passt,
+        sonst (z.B. nach Sprung oder langem Ausfall) die beste Gitterzelle.
+        Erst ab drei Ankern ist die Gitterzelle eindeutig.
+        """
+        ranges = np.asarray(ranges, dtype=float)
+        if np.sum(~np.isnan(ranges)) < 3:
+            return last_pos
+        if self.residual_rms(last_pos, ranges) <= reinit_residual:
+            return last_pos
+        return self.nearest(ranges)
+
+
+def load_distance_field(anchor_positions_3d=None, tag_height=TAG_HEIGHT, room_x=ROOM_X_DIM,
+                        room_y=ROOM_Y_DIM, resolution=FIELD_RESOLUTION_M,
+                        margin=FIELD_MARGIN_M, cache_dir=CACHE_DIR):
+    """Lädt das Distanzfeld aus dem Cache (.npz) oder berechnet und speichert es."""
+    if anchor_positions_3d is None:
+        anchor_positions_3d = list(ANCHOR_POSITIONS_3D.values())
+    anchors = np.asarray(anchor_positions_3d, dtype=float)
+
+    cache_file = cache_path('distfield', anchors, cache_dir, tag_height=tag_height,
+                            room=[room_x, room_y], resolution=resolution, margin=margin)
+
+    data = load_cached(cache_file)
+    if data is not None:
+        return DistanceField(data['cells_xy'], data['dists'], anchors, tag_height)
+
+    xs = np.arange(-margin, room_x + margin + resolution / 2, resolution)
+    ys = np.arange(-margin, room_y + margin + resolution / 2, resolution)
+    gx, gy = np.meshgrid(xs, ys, indexing='ij')
+    cells_xy = np.column_stack([gx.ravel(), gy.ravel()]).astype(np.float32)
+    cells = np.column_stack([cells_xy, np.full(len(cells_xy), tag_height, dtype=np.float32)])
+    dists = np.linalg.norm(cells[:, None, :] - anchors[None, :, :], axis=2).astype(np.float32)
+
+    save_cached(cache_file, cells_xy=cells_xy, dists=dists)
+    return DistanceField(cells_xy, dists, anchors, tag_height)
+
+
+if __name__ == "__main__":
+    anchors = np.array(list(ANCHOR_POSITIONS_3D.values()))
+    field = load_distance_field(anchors)
+    print(f"Distanzfeld: {len(field.cells_xy)} Zellen x {len(anchors)} Anker "
+          f"({field.dists.nbytes / 1024:.0f} KiB, Raster {FIELD_RESOLUTION_M * 100:.0f} cm)")
+
+    # Latenz des Nachschlagens für zufällige Positionen im Raum
+    rng = np.random.default_rng(0)
+    num = 2000
+    true_xy = np.column_stack([rng.uniform(0, ROOM_X_DIM, num), rng.uniform(0, ROOM_Y_DIM, num)])
+    true_3d = np.column_stack([true_xy, np.full(num, TAG_HEIGHT)])
+    ranges = np.round(np.linalg.norm(true_3d[:, None, :] - anchors[None], axis=2)
+                      + rng.normal(0, 0.05, (num, len(anchors))), 2)
+
+    field.nearest(ranges[:10])  # Aufwärmen (BLAS-Initialisierung)
+    latencies = np.empty(num)
+    guesses = np.empty((num, 2))
+    for i in range(num):
+        t_start = time.perf_counter()
+        guesses[i] = field.nearest(ranges[i])
+        latencies[i] = (time.perf_counter() - t_start) * 1e6
+    errors = np.linalg.norm(guesses - true_xy, axis=1)
+
+    t_start = time.perf_counter()
+    field.nearest(ranges)
+    batch_us = (time.perf_counter() - t_start) * 1e6 / num
+
+    print(f"Einzel-Lookup: p50 {np.percentile(latencies, 50):.1f} µs, p99 {np.percentile(latencies, 99):.1f} µs")
+    print(f"Batch-Lookup:  {batch_us:.2f} µs pro Epoche")
+    print(f"Fehler grober Startwert: median {np.median(errors):.3f} m, p95 {np.percentile(errors, 95):.3f} m")
@@ -0,0 +1,110 @@
+import numpy as np
+from grid_cache import ANCHOR_POSITIONS_3D, TAG_HEIGHT, ROOM_X_DIM, ROOM_Y_DIM, CACHE_DIR, \
+    cache_path, load_cached, save_cached
+
+# --- Konfiguration ---
+GRID_RESOLUTION_M = 0.02
+OUTPUT_PLOT = 'gdop_map.png'
+
+SIGMA_UWB = 0.5     # Wie sigma_uwb in run_ekf.py
+MAX_GDOP = 1e3      # Obergrenze für (nahezu) singuläre Geometrie
+
+
+def compute_gdop_grid(anchor_positions_3d, tag_height, x_edges, y_edges):
+    """
+    Berechnet die horizontale DOP (HDOP) für jede Zelle des Gitters, vektorisiert.
+
+    Die Geometriematrix H enthält pro Anker die Ableitung der 3D-Distanz nach
+    (x, y) bei fester Tag-Höhe. HDOP = sqrt(trace((H^T H)^-1)).
+    Gibt ein (len(x_edges), len(y_edges))-Array zurück.
+    """
+    anchors = np.asarray(anchor_positions_3d, dtype=float)
+    gx, gy = np.meshgrid(x_edges, y_edges, indexing='ij')
+    cells = np.stack([gx, gy, np.full_like(gx, tag_height)], axis=-1)     # (X, Y, 3)
+
+    diff = cells[..., None, :] - anchors                                  # (X, Y, M, 3)
+    dist = np.linalg.norm(diff, axis=-1)
+    H = diff[..., :2] / np.maximum(dist, 1e-9)[..., None]                 # (X, Y, M, 2)
+    HtH = np.einsum('xymi,xymj->xyij', H, H)
+
+    a, b, d = HtH[..., 0, 0], HtH[..., 0, 1], HtH[..., 1, 1]
+    det = a * d - b * b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gdop = np.sqrt((a + d) / det)
+    return np.where((det > 1e-12) & np.isfinite(gdop), np.minimum(gdop, MAX_GDOP), MAX_GDOP)
+
+
+class GdopMap:
+    """GDOP-Gitter über den Raum mit O(1)-Nachschlagen pro Position."""
+
+    def __init__(self, gdop, x0, y0, resolution):
+        self.gdop = gdop
+        self.x0 = x0
+        self.y0 = y0
+        self.resolution = resolution
+
+    def lookup(self, x, y):
+        """GDOP an (x, y); Skalare oder Arrays. Außerhalb des Raums wird geklemmt."""
+        ix = np.clip(np.rint((np.asarray(x) - self.x0) / self.resolution).astype(int), 0, self.gdop.shape[0] - 1)
+        iy = np.clip(np.rint((np.asarray(y) - self.y0) / self.resolution).astype(int), 0, self.gdop.shape[1] - 1)
+        return self.gdop[ix, iy]
+
+    def expected_error(self, x, y, sigma_range=SIGMA_UWB):
+        """Erwarteter horizontaler Fehler (m) = GDOP * Distanz-Standardabweichung."""
+        return self.lookup(x, y) * sigma_range
+
+    def coverage(self, max_gdop):
+        """Anteil der Raumfläche mit GDOP <= max_gdop."""
+        return float(np.mean(self.gdop <= max_gdop))
+
+
+def load_gdop_map(anchor_positions_3d=None, tag_height=TAG_HEIGHT, room_x=ROOM_X_DIM,
+                  room_y=ROOM_Y_DIM, resolution=GRID_RESOLUTION_M, cache_dir=CACHE_DIR):
+    """
+    Lädt das GDOP-Gitter für die Ankerkonfiguration aus dem Cache oder berechnet
+    und speichert es (.npz, Dateiname aus dem Hash der Konfiguration).
+    """
+    if anchor_positions_3d is None:
+        anchor_positions_3d = list(ANCHOR_POSITIONS_3D.values())
+    cache_file = cache_path('gdop', anchor_positions_3d, cache_dir, tag_height=tag_height,
+                            room=[room_x, room_y], resolution=resolution)
+
+    data = load_cached(cache_file)
+    if data is not None:
+        return GdopMap(data['gdop'], float(data['x0']), float(data['y0']), float(data['resolution']))
+
+    x_edges = np.arange(0.0, room_x + resolution / 2, resolution)
+    y_edges = np.arange(0.0, room_y + resolution / 2, resolution)
+    gdop = compute_gdop_grid(anchor_positions_3d, tag_height, x_edges, y_edges)
+
+    save_cached(cache_file, gdop=gdop, x0=0.0, y0=0.0, resolution=resolution,
+                anchors=np.asarray(anchor_positions_3d, dtype=float))
+    return GdopMap(gdop, 0.0, 0.0, resolution)
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    anchors = np.array(list(ANCHOR_POSITIONS_3D.values()))
+    gdop_map = load_gdop_map(anchors)
+
+    print(f"GDOP-Gitter: {gdop_map.gdop.shape[0]} x {gdop_map.gdop.shape[1]} Zellen "
+          f"({GRID_RESOLUTION_M * 100:.0f} cm)")
+    print(f"GDOP min / median / max: {gdop_map.gdop.min():.2f} / "
+          f"{np.median(gdop_map.gdop):.2f} / {gdop_map.gdop.max():.2f}")
+    for limit in [1.5, 2.0, 3.0, 5.0]:
+        print(f"Abdeckung GDOP <= {limit:.1f}: {gdop_map.coverage(limit) * 100:.1f}%")
+
+    plt.figure(figsize=(6, 8))
+    extent = [0, ROOM_X_DIM, 0, ROOM_Y_DIM]
+    img = plt.imshow(gdop_map.gdop.T, origin='lower', extent=extent, cmap='viridis',
+                     vmin=1.0, vmax=min(5.0, gdop_map.gdop.max()))
+    plt.colorbar(img, label='HDOP')
+    plt.plot(anchors[:, 0], anchors[:, 1], 'rx', markersize=12, label='Anker')
+    plt.title('GDOP-Karte der Ankerkonfiguration')
+    plt.xlabel('X-Position (m)')
+    plt.ylabel('Y-Position (m)')
+    plt.legend(loc='upper right')
+    plt.tight_layout()
+    plt.savefig(OUTPUT_PLOT, dpi=300)
+    print(f"Plot gespeichert als '{OUTPUT_PLOT}'.")
@@ -0,0 +1,36 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# --- Konfiguration ---
+# Ankerlayout und Raum, für die gdop_map.py und distance_field.py ihre Gitter vorberechnen
+ANCHOR_POSITIONS_3D = {
+    "dist_e05a1": np.array([2.8, 0, 1.31]),
+    "dist_48e72": np.array([0.1, 0, 2.0]),
+    "dist_83a8d": np.array([1.86, 4.1, 2.10])
+}
+TAG_HEIGHT = 0.015
+ROOM_X_DIM = 2.9
+ROOM_Y_DIM = 4.1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gdop_cache')
+
+
+def cache_path(prefix, anchor_positions_3d, cache_dir=CACHE_DIR, **params):
+    """
+    Cache-Datei (.npz) eines vorberechneten Gitters: Dateiname aus prefix und dem Hash der
+    Ankerkonfiguration samt Gitterparametern, z.B. cache_path('gdop', anchors, resolution=0.02).
+    """
+    config = {'anchors': np.round(np.asarray(anchor_positions_3d, dtype=float), 6).tolist(), **params}
+    key = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{prefix}_{key}.npz')
+
+def load_cached(path):
+    """Gespeicherte Arrays oder None, wenn das Gitter noch nicht berechnet wurde."""
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+def save_cached(path, **arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, **arrays)
@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 import time
 import os 
+from payload_codec import PayloadCodec
 
 # --- Ihre MQTT-Konfiguration ---
 MQTT_BROKER = ""
@@ -33,6 +34,7 @@ all_data_records = []
 current_state = 'STOP' 
 stop_start_timestamp_ns = None 
 valid_stop_counter = 0
+codec = PayloadCodec()
 
 # --- Nachverarbeitungs-Funktion ---
 def process_and_save_data(records, gt_positions_list):
@@ -128,90 +130,76 @@ def on_connect(client, userdata, flags, rc):
     else:
         print(f"Verbindung fehlgeschlagen mit Code: {rc}")
 
-def on_message(client, userdata, msg):
+def process_imu_sample(timestamp_ns, current_accel, current_quat):
     global last_accel, all_data_records, current_state, stop_start_timestamp_ns, valid_stop_counter
+
+    # 2. Bewegung berechnen
+    if last_accel is None:
+        last_accel = current_accel
+        if stop_start_timestamp_ns is None:
+            stop_start_timestamp_ns = timestamp_ns 
+            print(f"Warte auf Stopp #1 (Ziel: {gt_positions[0]}). Timer gestartet...")
+        return
+    
+    ax_diff = current_accel['x'] - last_accel['x']
+    ay_diff = current_accel['y'] - last_accel['y']
+    az_diff = current_accel['z'] - last_accel['z']
+    accel_change_mag = math.sqrt(ax_diff**2 + ay_diff**2 + az_diff**2)
     
-    payload_str = msg.payload.decode()
+    is_moving = accel_change_mag > ACCEL_CHANGE_THRESHOLD
     
+    # 3. Alle Daten speichern
+    record = {
+        'timestamp_ns': timestamp_ns,
+        'is_moving': is_moving,
+        'accel_change_mag': accel_change_mag,
+        'ax': current_accel['x'], 'ay': current_accel['y'], 'az': current_accel['z'],
+        'qw': current_quat['w'], 'qx': current_quat['x'], 'qy': current_quat['y'], 'qz': current_quat['z']
+    }
+    all_data_records.append(record)
+
+    # 4. Live-Feedback-Statusmaschine
+    if is_moving:
+        if current_state == 'STOP':
+            if stop_start_timestamp_ns is None:
+                stop_start_timestamp_ns = timestamp_ns 
+
+            stop_duration_s = (timestamp_ns - stop_start_timestamp_ns) / 1e9
+            if stop_duration_s >= MIN_STOP_DURATION_S:
+                valid_stop_counter += 1
+                if valid_stop_counter <= len(gt_positions):
+                    pos = gt_positions[valid_stop_counter-1]
+                    print(f"BEWEGUNG. Gültiger Stopp #{valid_stop_counter} (Pos: {pos}) beendet (Dauer: {stop_duration_s:.2f}s).")
+                else:
+                    print(f"BEWEGT. Gültiger Stopp #{valid_stop_counter} (Extra) beendet (Dauer: {stop_duration_s:.2f}s).")
+            else:
+                print(f"BEWEGUNG. (Stopp war zu kurz: {stop_duration_s:.2f}s).")
+        current_state = 'MOVING'
+    else: # not is_moving
+        if current_state == 'MOVING':
+            # Dies ist ein neuer Stopp
+            if valid_stop_counter < len(gt_positions):
+                pos = gt_positions[valid_stop_counter] 
+                print(f"STILLSTAND. Warte auf Stopp #{valid_stop_counter + 1} (Ziel: {pos}). Timer gestartet...")
+            else:
+                 print(f"STILLSTAND. (Alle {len(gt_positions)} erwarteten Stopps bereits erfasst). Timer gestartet...")
+            stop_start_timestamp_ns = timestamp_ns
+        
+        current_state = 'STOP'
+
+    last_accel = current_accel
+
+def on_message(client, userdata, msg):
     if msg.topic == UWB_TOPIC:
         return
 
     try:
         if msg.topic == IMU_TOPIC:
-            # 1. Payload parsen
-            parts = payload_str.split(';')
-            if len(parts) != 3: return
-            timestamp_ns = int(parts[0])
-
-            # IMU-Parsing (3+4 Format)
-            accel_parts = parts[1].split(',')
-            if len(accel_parts) != 3: return
-            current_accel = {
-                'x': float(accel_parts[0]), 'y': float(accel_parts[1]), 'z': float(accel_parts[2])
-            }
-
-            quat_parts = parts[2].split(',')
-            if len(quat_parts) != 4: return
-            current_quat = {
-                'w': float(quat_parts[0]), 'x': float(quat_parts[1]),
-                'y': float(quat_parts[2]), 'z': float(quat_parts[3])
-            }
-            
-            # 2. Bewegung berechnen
-            if last_accel is None:
-                last_accel = current_accel
-                if stop_start_timestamp_ns is None:
-                    stop_start_timestamp_ns = timestamp_ns 
-                    print(f"Warte auf Stopp #1 (Ziel: {gt_positions[0]}). Timer gestartet...")
-                return
-            
-            ax_diff = current_accel['x'] - last_accel['x']
-            ay_diff = current_accel['y'] - last_accel['y']
-            az_diff = current_accel['z'] - last_accel['z']
-            accel_change_mag = math.sqrt(ax_diff**2 + ay_diff**2 + az_diff**2)
-            
-            is_moving = accel_change_mag > ACCEL_CHANGE_THRESHOLD
-            
-            # 3. Alle Daten speichern
-            record = {
-                'timestamp_ns': timestamp_ns,
-                'is_moving': is_moving,
-                'accel_change_mag': accel_change_mag,
-                'ax': current_accel['x'], 'ay': current_accel['y'], 'az': current_accel['z'],
-                'qw': current_quat['w'], 'qx': current_quat['x'], 'qy': current_quat['y'], 'qz': current_quat['z']
-            }
-            all_data_records.append(record)
-
-            # 4. Live-Feedback-Statusmaschine
-            if is_moving:
-                if current_state == 'STOP':
-                    if stop_start_timestamp_ns is None:
-                        stop_start_timestamp_ns = timestamp_ns 
-
-                    stop_duration_s = (timestamp_ns - stop_start_timestamp_ns) / 1e9
-                    if stop_duration_s >= MIN_STOP_DURATION_S:
-                        valid_stop_counter += 1
-                        if valid_stop_counter <= len(gt_positions):
-                            pos = gt_positions[valid_stop_counter-1]
-                            print(f"BEWEGUNG. Gültiger Stopp #{valid_stop_counter} (Pos: {pos}) beendet (Dauer: {stop_duration_s:.2f}s).")
-                        else:
-                            print(f"BEWEGT. Gültiger Stopp #{valid_stop_counter} (Extra) beendet (Dauer: {stop_duration_s:.2f}s).")
-                    else:
-                        print(f"BEWEGUNG. (Stopp war zu kurz: {stop_duration_s:.2f}s).")
-                current_state = 'MOVING'
-            else: # not is_moving
-                if current_state == 'MOVING':
-                    # Dies ist ein neuer Stopp
-                    if valid_stop_counter < len(gt_positions):
-                        pos = gt_positions[valid_stop_counter] 
-                        print(f"STILLSTAND. Warte auf Stopp #{valid_stop_counter + 1} (Ziel: {pos}). Timer gestartet...")
-                    else:
-                         print(f"STILLSTAND. (Alle {len(gt_positions)} erwarteten Stopps bereits erfasst). Timer gestartet...")
-                    stop_start_timestamp_ns = timestamp_ns
-                
-                current_state = 'STOP'
-
-            last_accel = current_accel
+            # 1. Payload parsen (ein oder mehrere Samples, Text oder binär, siehe payload_codec.py)
+            frame = codec.imu_frame(msg.payload)
+            if frame is None: return
+            for timestamp_ns, (qw, qx, qy, qz, ax, ay, az) in zip(frame[0].tolist(), frame[1].tolist()):
+                process_imu_sample(timestamp_ns, {'x': ax, 'y': ay, 'z': az}, {'w': qw, 'x': qx, 'y': qy, 'z': qz})
 
     except (ValueError, IndexError):
         pass 
@@ -253,6 +241,7 @@ def main():
     except KeyboardInterrupt:
         client.disconnect()
         print("\nAufzeichnung gestoppt. Verarbeite Daten und speichere CSV...")
+        print(codec.format_stats())
         process_and_save_data(all_data_records, gt_positions)
         print("Verarbeitung abgeschlossen.")
 
@@ -0,0 +1,366 @@
+import paho.mqtt.client as mqtt
+import asyncio
+import collections
+import csv
+import os
+import re
+import signal
+import sys
+import time
+import numpy as np
+from mqtt_sub import UWB_HEADERS, IMU_HEADERS
+from payload_codec import PayloadCodec
+from segment_log import recover_csv
+
+# --- MQTT Konfiguration ---
+MQTT_BROKER = ""
+MQTT_PORT = 1883
+MQTT_USER = ""
+MQTT_PASS = ""
+
+# Topics: je Tag 'tags/<tag>/uwb/data' und 'tags/<tag>/imu/data'. Die bisherigen Einzel-Tag-Topics
+# 'uwb/data' und 'imu/data' werden weiter abonniert und LEGACY_TAG zugeordnet
+TAG_PREFIX = "tags"
+LEGACY_TAG = "tag0"
+TOPICS = [(f"{TAG_PREFIX}/+/uwb/data", 0), (f"{TAG_PREFIX}/+/imu/data", 0), ("uwb/data", 0), ("imu/data", 0)]
+
+# --- Ausgabe ---
+OUTPUT_DIR = 'tags'               # Je Tag ein Unterordner mit uwb_data_1.csv und imu_data_1.csv
+QUEUE_SIZE = 100000               # Empfangene, noch nicht geparste Nachrichten; bei Überlauf wird verworfen
+INGEST_BATCH = 1000               # Nachrichten pro Durchlauf der Parse-Coroutine
+BATCH_ROWS = 5000                 # Zeilen, ab denen ein Schreibvorgang angestoßen wird
+FLUSH_INTERVAL_S = 1.0            # Spätestens nach dieser Zeit wird geschrieben
+MAX_PENDING_ROWS = 200000         # Noch nicht geschriebene Zeilen der CsvOutput (während ein Block geschrieben wird)
+PENDING_FULL_POLICY = 'block'     # 'block': Parse-Coroutine wartet auf den Schreibvorgang, 'drop_oldest': älteste verwerfen
+MAX_OPEN_FILES = 512              # Offene CSV-Dateien (2 je Tag); darüber wird die am längsten unbenutzte geschlossen
+LIVE_QUEUE_SIZE = 1000            # QueueOutput: Nachrichten pro Tag
+STATS_INTERVAL_S = 10.0
+LATENCY_WINDOW = 100000           # Anzahl der letzten Latenzen für Median/p99
+
+TAG_PATTERN = re.compile(r'[\w\-]+')
+PARSERS = {'uwb': PayloadCodec.uwb_rows, 'imu': PayloadCodec.imu_rows}
+HEADERS = {'uwb': UWB_HEADERS, 'imu': IMU_HEADERS}
+
+
+def parse_topic(topic):
+    """'tags/<tag>/imu/data' -> ('<tag>', 'imu'), 'imu/data' -> (LEGACY_TAG, 'imu'); sonst (None, None)."""
+    parts = topic.split('/')
+    if len(parts) == 4 and parts[0] == TAG_PREFIX and parts[3] == 'data' and TAG_PATTERN.fullmatch(parts[1]):
+        tag, kind = parts[1], parts[2]
+    elif len(parts) == 2 and parts[1] == 'data':
+        tag, kind = LEGACY_TAG, parts[0]
+    else:
+        return None, None
+    return (tag, kind) if kind in PARSERS else (None, None)
+
+
+class AsyncioMqtt:
+    """
+    Betreibt einen paho-Client auf dem asyncio-Event-Loop statt mit loop_forever()/loop_start():
+    Lesen und Schreiben über add_reader/add_writer auf dem Socket, Keepalive in einer Coroutine.
+    Alle paho-Callbacks laufen damit im Event-Loop-Thread.
+    """
+
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self.misc_task = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self.misc_task = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+
+class CsvOutput:
+    """
+    Schreibt je Tag OUTPUT_DIR/<tag>/uwb_data_1.csv und imu_data_1.csv (Spalten wie mqtt_sub.py).
+    Zeilen werden im Speicher gesammelt und blockweise in einem Worker-Thread geschrieben, damit der
+    Event-Loop nie auf die Platte wartet; es läuft höchstens ein Schreibvorgang gleichzeitig (Reihenfolge
+    bleibt erhalten). Vorhandene Dateien werden fortgesetzt, nicht gelöscht.
+    Die gesammelten Zeilen sind auf max_pending_rows begrenzt: bei 'block' wartet write() auf den
+    Schreibvorgang (Rückstau in die Empfangs-Queue), bei 'drop_oldest' werden die ältesten Nachrichten
+    verworfen und gezählt. Angestoßene Schreibvorgänge werden bis zu ihrem Ende in flush_tasks gehalten.
+    """
+
+    def __init__(self, out_dir=OUTPUT_DIR, batch_rows=BATCH_ROWS, flush_interval_s=FLUSH_INTERVAL_S,
+                 max_open_files=MAX_OPEN_FILES, max_pending_rows=MAX_PENDING_ROWS, policy=PENDING_FULL_POLICY):
+        if policy not in ('block', 'drop_oldest'):
+            raise ValueError(f"Unbekannte Strategie für vollen Puffer: '{policy}'")
+        self.out_dir = out_dir
+        self.batch_rows = batch_rows
+        self.flush_interval_s = flush_interval_s
+        self.max_open_files = max_open_files
+        self.max_pending_rows = max_pending_rows
+        self.policy = policy
+        self.pending = collections.deque()        # (tag, kind, rows, t_received) in Empfangsreihenfolge
+        self.pending_rows = 0
+        self.flush_tasks = set()
+        self.error = None
+        self.files = collections.OrderedDict()    # (tag, kind) -> (Datei, csv.writer), zuletzt benutzt am Ende
+        self.recovered = set()                    # Beim ersten Öffnen auf Absturzreste geprüfte Dateien
+        self.lock = asyncio.Lock()
+        self.rows_written = 0
+        self.batches = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.dropped_messages = 0
+        self.dropped_rows = 0
+
+    async def write(self, tag, kind, rows, t_received):
+        if self.pending and self.pending_rows + len(rows) > self.max_pending_rows:
+            if self.policy == 'block':
+                await self.flush()
+            else:
+                while self.pending and self.pending_rows + len(rows) > self.max_pending_rows:
+                    dropped_rows = self.pending.popleft()[2]
+                    self.pending_rows -= len(dropped_rows)
+                    self.dropped_messages += 1
+                    self.dropped_rows += len(dropped_rows)
+        self.pending.append((tag, kind, rows, t_received))
+        self.pending_rows += len(rows)
+        if self.pending_rows >= self.batch_rows and not self.lock.locked():
+            task = asyncio.create_task(self.flush())
+            self.flush_tasks.add(task)
+            task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        self.flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None and self.error is None:
+            self.error = task.exception()
+            print(f"FEHLER beim Schreiben der CSV-Dateien: {self.error}")
+
+    async def flush(self):
+        async with self.lock:
+            entries, self.pending, self.pending_rows = self.pending, collections.deque(), 0
+            if entries:
+                batch = collections.defaultdict(list)
+                for tag, kind, rows, _ in entries:
+                    batch[(tag, kind)].extend(rows)
+                await asyncio.to_thread(self._write_batch, batch)
+                self.latencies.extend(time.time() - np.array([t_received for *_, t_received in entries]))
+                self.rows_written += sum(len(rows) for rows in batch.values())
+                self.batches += 1
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            # Beim Beenden wird run() abgebrochen, ein laufender Schreibvorgang aber zu Ende geführt
+            await asyncio.shield(self.flush())
+
+    async def close(self):
+        await asyncio.gather(*self.flush_tasks, return_exceptions=True)
+        await self.flush()
+        for f, _ in self.files.values():
+            f.close()
+        self.files.clear()
+
+    def _writer(self, tag, kind):
+        key = (tag, kind)
+        if key in self.files:
+            self.files.move_to_end(key)
+            return self.files[key][1]
+        if len(self.files) >= self.max_open_files:
+            _, (old_file, _) = self.files.popitem(last=False)
+            old_file.close()
+        tag_dir = os.path.join(self.out_dir, tag)
+        os.makedirs(tag_dir, exist_ok=True)
+        path = os.path.join(tag_dir, f'{kind}_data_1.csv')
+        if path not in self.recovered:
+            self.recovered.add(path)
+            if os.path.exists(path) and recover_csv(path):
+                print(f"WARNUNG: Unvollständigen letzten Datensatz in {path} entfernt.")
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        f = open(path, 'a', newline='')
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(HEADERS[kind])
+        self.files[key] = (f, writer)
+        return writer
+
+    def _write_batch(self, batch):
+        touched = []
+        for (tag, kind), rows in batch.items():
+            self._writer(tag, kind).writerows(rows)
+            touched.append((tag, kind))
+        for key in touched:
+            if key in self.files:
+                self.files[key][0].flush()
+
+
+class QueueOutput:
+    """
+    Live-Ausgabe für Anzeigen (z.B. position_plotter.py): je Tag eine asyncio.Queue mit (kind, rows).
+    Ist die Queue eines Tags voll, wird dort die älteste Nachricht verworfen.
+    """
+
+    def __init__(self, maxsize=LIVE_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.queues = {}
+        self.dropped = 0
+
+    def queue(self, tag):
+        if tag not in self.queues:
+            self.queues[tag] = asyncio.Queue(self.maxsize)
+        return self.queues[tag]
+
+    async def write(self, tag, kind, rows, t_received):
+        q = self.queue(tag)
+        if q.full():
+            q.get_nowait()
+            self.dropped += 1
+        q.put_nowait((kind, rows))
+
+    async def run(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class IngestService:
+    """
+    Ein MQTT-Client für beliebig viele Tags: on_message legt die Nachricht nur in eine begrenzte
+    asyncio.Queue, die Parse-Coroutine arbeitet sie blockweise ab und verteilt die Zeilen an die Ausgaben.
+    Ingest-Latenz: vom Empfang bis die Zeilen bei den Ausgaben sind; die CsvOutput misst zusätzlich
+    bis zum Schreiben in die Datei.
+    """
+
+    def __init__(self, outputs, queue_size=QUEUE_SIZE):
+        self.outputs = outputs
+        self.queue = asyncio.Queue(queue_size)
+        self.received = 0
+        self.dropped = 0
+        self.parse_errors = 0
+        self.codec = PayloadCodec()
+        self.max_depth = 0
+        self.tags = set()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            print("Erfolgreich mit MQTT-Broker verbunden.")
+            client.subscribe(TOPICS)
+            print(f"Abonniert: {', '.join(topic for topic, _ in TOPICS)}")
+        else:
+            print(f"Verbindung fehlgeschlagen, return code {rc}")
+
+    def on_message(self, client, userdata, msg):
+        self.received += 1
+        try:
+            self.queue.put_nowait((msg.topic, msg.payload, time.time()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def ingest(self):
+        while True:
+            batch = [await self.queue.get()]
+            self.max_depth = max(self.max_depth, self.queue.qsize() + 1)
+            while len(batch) < INGEST_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self.process(batch)
+
+    async def process(self, batch):
+        if batch:
+            self.latencies.extend(time.time() - np.array([t_received for _, _, t_received in batch]))
+        for topic, payload, t_received in batch:
+            tag, kind = parse_topic(topic)
+            if tag is None:
+                self.parse_errors += 1
+                continue
+            rows = PARSERS[kind](self.codec, payload)
+            if not rows:
+                self.parse_errors += 1
+                continue
+            self.tags.add(tag)
+            for output in self.outputs:
+                await output.write(tag, kind, rows, t_received)
+
+    async def drain(self):
+        """Alles noch Empfangene verarbeiten (beim Beenden, nach dem Trennen vom Broker)."""
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        await self.process(batch)
+
+    def stats(self):
+        csv_outputs = [o for o in self.outputs if isinstance(o, CsvOutput)]
+        write_latencies = [l for o in csv_outputs for l in o.latencies]
+        p50, p99 = (np.percentile(self.latencies, [50, 99]) * 1e3) if self.latencies else (0.0, 0.0)
+        write_p99 = np.percentile(write_latencies, 99) * 1e3 if write_latencies else 0.0
+        return {'received': self.received, 'dropped': self.dropped, 'parse_errors': self.parse_errors,
+                'payload_errors': dict(self.codec.errors),
+                'tags': len(self.tags), 'max_depth': self.max_depth,
+                'rows_written': sum(o.rows_written for o in csv_outputs),
+                'write_dropped_rows': sum(o.dropped_rows for o in csv_outputs),
+                'latency_p50_ms': p50, 'latency_p99_ms': p99, 'write_latency_p99_ms': write_p99}
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"{s['received']} Nachrichten von {s['tags']} Tags, {s['dropped']} verworfen, "
+                f"{s['parse_errors']} fehlerhaft, Warteschlange max. {s['max_depth']}/{self.queue.maxsize}, "
+                f"{s['rows_written']} Zeilen geschrieben ({s['write_dropped_rows']} verworfen), Ingest-Latenz Median {s['latency_p50_ms']:.1f} ms, "
+                f"p99 {s['latency_p99_ms']:.1f} ms, bis zur Datei p99 {s['write_latency_p99_ms']:.1f} ms")
+
+
+async def run_service(broker=MQTT_BROKER, port=MQTT_PORT, outputs=None, service_cls=IngestService,
+                      stats_interval_s=STATS_INTERVAL_S):
+    """Läuft bis SIGINT/SIGTERM, schreibt dann alles Empfangene und liefert den Service (für stats())."""
+    loop = asyncio.get_running_loop()
+    outputs = outputs if outputs is not None else [CsvOutput()]
+    service = service_cls(outputs)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    client = mqtt.Client()
+    client.username_pw_set(MQTT_USER, MQTT_PASS)
+    client.on_connect = service.on_connect
+    client.on_message = service.on_message
+    AsyncioMqtt(loop, client)
+    print(f"Verbinde mit {broker}...")
+    try:
+        client.connect(broker, port, 60)
+    except Exception as e:
+        print(f"Konnte nicht mit MQTT-Broker verbinden: {e}")
+        sys.exit(1)
+
+    async def print_stats():
+        while True:
+            await asyncio.sleep(stats_interval_s)
+            print(service.format_stats())
+
+    tasks = [asyncio.create_task(service.ingest()), asyncio.create_task(print_stats())]
+    tasks += [asyncio.create_task(output.run()) for output in outputs]
+    await stop.wait()
+
+    client.disconnect()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await service.drain()
+    for output in outputs:
+        await output.close()
+    print("\nIngestion gestoppt. " + service.format_stats())
+    return service
+
+
+if __name__ == "__main__":
+    asyncio.run(run_service())
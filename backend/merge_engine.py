@@ -0,0 +1,669 @@
+import glob
+import io
+import itertools
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from storage import read_table
+from segment_log import resolve_log, load_index, read_blocks, read_log_chunks, read_log
+
+# --- Konfiguration ---
+TIME_TOLERANCE_NS = 1e8
+# Mehrere Distanzen eines Ankers fallen auf dieselbe IMU-Zeile:
+# 'nearest' - die zeitlich nächste Messung gewinnt
+# 'mean'    - Mittelwert aller Messungen
+# 'last'    - die letzte Messung gewinnt (Verhalten des alten Skripts)
+COLLISION_POLICY = 'nearest'
+COLLISION_POLICIES = ('nearest', 'mean', 'last')
+STREAM_CHUNK_ROWS = 100_000  # Zeilen pro gelesenem/geschriebenem Block im Streaming-Merge
+
+
+def anchor_column(mac):
+    """Spaltenname für einen Anker: 'dist_' + die ersten fünf Zeichen der MAC."""
+    return f"dist_{mac.replace(':', '')[:5]}"
+
+def nearest_index(sorted_ts, query_ts):
+    """
+    Index des zeitlich nächsten Eintrags in sorted_ts für jeden Zeitstempel in query_ts
+    sowie der zugehörige Abstand in ns. Bei Gleichstand gewinnt der spätere Eintrag.
+    """
+    right = np.clip(np.searchsorted(sorted_ts, query_ts), 0, len(sorted_ts) - 1)
+    left = np.maximum(right - 1, 0)
+    dt_right = np.abs(sorted_ts[right] - query_ts)
+    dt_left = np.abs(sorted_ts[left] - query_ts)
+    use_left = dt_left < dt_right
+    return np.where(use_left, left, right), np.where(use_left, dt_left, dt_right)
+
+def merge_sensors(df_imu, df_uwb, tolerance_ns=TIME_TOLERANCE_NS, collision=COLLISION_POLICY, clock=None):
+    """
+    Ordnet alle UWB-Distanzen in einem Durchgang der zeitlich nächsten IMU-Zeile zu
+    und pivotiert sie in eine Spalte pro Anker (Reihenfolge des ersten Auftretens).
+
+    df_imu muss nach timestamp_ns sortiert sein, df_uwb nicht.
+    clock: optionales Uhrenmodell (clock_sync.ClockModel), rechnet die UWB-Zeitstempel
+    vor der Zuordnung in die IMU-Zeitbasis um.
+    Gibt (df_merged, stats) zurück; stats enthält je Ankerspalte die Anzahl
+    zugeordneter, wegen Toleranz verworfener und kollidierender Messungen.
+    """
+    if collision not in COLLISION_POLICIES:
+        raise ValueError(f"Unbekannte Kollisionsstrategie '{collision}', erlaubt: {COLLISION_POLICIES}")
+
+    imu_ts = df_imu['timestamp_ns'].to_numpy(dtype=np.int64)
+    if len(imu_ts) > 1 and np.any(np.diff(imu_ts) < 0):
+        raise ValueError("IMU-Zeitstempel müssen aufsteigend sortiert sein.")
+    uwb_ts = _uwb_timestamps(df_uwb, clock)
+    codes, macs = pd.factorize(df_uwb['mac_address'])
+    columns = [anchor_column(mac) for mac in macs]
+    num_cols = len(columns)
+
+    stats = {col: {'matched': 0, 'dropped': 0, 'collisions': 0} for col in columns}
+    if len(imu_ts) == 0 or len(uwb_ts) == 0:
+        return _assemble(df_imu, columns, np.full((len(imu_ts), num_cols), np.nan)), stats
+
+    imu_idx, dt = nearest_index(imu_ts, uwb_ts)
+    distances = df_uwb['distance'].to_numpy(dtype=float)
+    values, counts = _assign_block(imu_idx, dt, codes, distances, len(imu_ts), num_cols, tolerance_ns, collision)
+    for i, col in enumerate(columns):
+        stats[col] = {key: int(counts[key][i]) for key in stats[col]}
+    return _assemble(df_imu, columns, values), stats
+
+def merge_sensors_long(df_imu, df_uwb, tolerance_ns=TIME_TOLERANCE_NS, collision=COLLISION_POLICY, clock=None):
+    """
+    Wie merge_sensors, aber ohne breite dist_*-Spalten: gibt (RangeTable, stats) zurück.
+    Die IMU-Tabelle bleibt unverändert; RangeTable.imu_row verweist auf ihre Zeilen.
+    """
+    if collision not in COLLISION_POLICIES:
+        raise ValueError(f"Unbekannte Kollisionsstrategie '{collision}', erlaubt: {COLLISION_POLICIES}")
+    imu_ts = df_imu['timestamp_ns'].to_numpy(dtype=np.int64)
+    if len(imu_ts) > 1 and np.any(np.diff(imu_ts) < 0):
+        raise ValueError("IMU-Zeitstempel müssen aufsteigend sortiert sein.")
+    codes, macs = pd.factorize(df_uwb['mac_address'])
+    columns = [anchor_column(mac) for mac in macs]
+
+    stats = {col: {'matched': 0, 'dropped': 0, 'collisions': 0} for col in columns}
+    if len(imu_ts) == 0 or len(codes) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return RangeTable(empty, empty, np.empty(0), columns, len(imu_ts)), stats
+
+    imu_idx, dt = nearest_index(imu_ts, _uwb_timestamps(df_uwb, clock))
+    rows, anchors, values, counts = _resolve_block(imu_idx, dt, codes, df_uwb['distance'].to_numpy(dtype=float),
+                                                   len(columns), tolerance_ns, collision)
+    for i, col in enumerate(columns):
+        stats[col] = {key: int(counts[key][i]) for key in stats[col]}
+    return RangeTable(rows, anchors, values, columns, len(imu_ts)), stats
+
+def _uwb_timestamps(df_uwb, clock):
+    """UWB-Zeitstempel als int64, bei gegebenem Uhrenmodell in IMU-Zeit umgerechnet."""
+    uwb_ts = df_uwb['timestamp_ns'].to_numpy(dtype=np.int64)
+    return uwb_ts if clock is None else clock.apply(uwb_ts)
+
+def _assign_block(imu_idx, dt, codes, distances, num_rows, num_cols, tolerance_ns, collision):
+    """
+    Schreibt die Distanzen in eine (num_rows, num_cols)-Matrix und löst Kollisionen auf.
+    Gibt die Matrix und je Spalte die Zähler matched/dropped/collisions zurück.
+    """
+    rows, cols, cell_values, counts = _resolve_block(imu_idx, dt, codes, distances, num_cols,
+                                                     tolerance_ns, collision)
+    values = np.full((num_rows, num_cols), np.nan)
+    values[rows, cols] = cell_values
+    return values, counts
+
+def _resolve_block(imu_idx, dt, codes, distances, num_cols, tolerance_ns, collision):
+    """
+    Verwirft Messungen außerhalb der Toleranz und löst Kollisionen auf.
+    Gibt (Zeile, Anker, Distanz) je belegter Zelle, sortiert nach (Zeile, Anker),
+    sowie je Anker die Zähler matched/dropped/collisions zurück.
+    """
+    valid = dt < tolerance_ns
+    dropped = np.bincount(codes[~valid], minlength=num_cols)
+
+    imu_idx, dt, codes, distances = imu_idx[valid], dt[valid], codes[valid], distances[valid]
+    keys = imu_idx * num_cols + codes
+
+    if collision == 'mean':
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=distances)
+        counts = np.bincount(inverse)
+        cell_values = sums / counts
+    else:
+        # Pro (Zeile, Anker) die erste Messung nach Sortierung behalten:
+        # 'nearest' sortiert nach Zeitabstand, 'last' nach umgekehrter Eingangsreihenfolge
+        secondary = dt if collision == 'nearest' else -np.arange(len(keys))
+        order = np.lexsort((secondary, keys))
+        sorted_keys = keys[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        unique_keys = sorted_keys[first]
+        cell_values = distances[order][first]
+
+    matched = np.bincount(codes, minlength=num_cols)
+    filled = np.bincount(unique_keys % num_cols, minlength=num_cols)
+    counts = {'matched': matched, 'dropped': dropped, 'collisions': matched - filled}
+    return unique_keys // num_cols, unique_keys % num_cols, cell_values, counts
+
+def _assemble(df_imu, columns, values):
+    df_dist = pd.DataFrame(values, columns=columns, index=df_imu.index)
+    return pd.concat([df_imu, df_dist], axis=1)
+
+class RangeTable:
+    """
+    Langform der UWB-Distanzen: eine Zeile pro Messung (imu_row, anchor, range),
+    sortiert nach (imu_row, anchor). anchors[anchor] ist der Spaltenname (dist_<mac>).
+    Statt einer zu ~90 % leeren (Zeilen x Anker)-Matrix wächst der Speicher nur mit
+    der Zahl der Messungen.
+    """
+
+    def __init__(self, imu_row, anchor, ranges, anchors, num_rows):
+        self.imu_row = np.asarray(imu_row, dtype=np.int64)
+        self.anchor = np.asarray(anchor, dtype=np.int16)
+        self.ranges = np.asarray(ranges, dtype=float)
+        self.anchors = list(anchors)
+        self.num_rows = num_rows
+
+    def __len__(self):
+        return len(self.imu_row)
+
+    @property
+    def nbytes(self):
+        return self.imu_row.nbytes + self.anchor.nbytes + self.ranges.nbytes
+
+    @classmethod
+    def from_wide(cls, values, anchors):
+        """Aus einer (Zeilen x Anker)-Matrix mit NaN für fehlende Messungen."""
+        values = np.asarray(values, dtype=float)
+        rows, cols = np.nonzero(~np.isnan(values))
+        return cls(rows, cols, values[rows, cols], anchors, len(values))
+
+    @classmethod
+    def from_frame(cls, df, num_rows, anchors=None):
+        """Aus einem DataFrame mit den Spalten imu_row, anchor (Spaltenname), range."""
+        codes, found = pd.factorize(df['anchor'])
+        table = cls(df['imu_row'].to_numpy(), codes, df['range'].to_numpy(), list(found), num_rows)
+        return table.select(anchors if anchors is not None else list(found))
+
+    def to_frame(self):
+        return pd.DataFrame({'imu_row': self.imu_row,
+                             'anchor': np.array(self.anchors, dtype=object)[self.anchor] if len(self) else [],
+                             'range': self.ranges})
+
+    def select(self, anchors):
+        """Neue Tabelle mit genau diesen Ankern in dieser Reihenfolge (andere entfallen)."""
+        remap = np.array([anchors.index(a) if a in anchors else -1 for a in self.anchors], dtype=np.int64)
+        codes = remap[self.anchor] if len(self) else np.empty(0, dtype=np.int64)
+        keep = codes >= 0
+        order = np.lexsort((codes[keep], self.imu_row[keep]))
+        return RangeTable(self.imu_row[keep][order], codes[keep][order], self.ranges[keep][order],
+                          anchors, self.num_rows)
+
+    def row_pointers(self):
+        """CSR-Zeiger: Messungen der IMU-Zeile i liegen in [ptr[i], ptr[i + 1])."""
+        return np.searchsorted(self.imu_row, np.arange(self.num_rows + 1))
+
+    def to_wide(self):
+        values = np.full((self.num_rows, len(self.anchors)), np.nan)
+        values[self.imu_row, self.anchor] = self.ranges
+        return values
+
+
+def load_range_table(name, num_rows, anchors=None):
+    """Lädt ein mit merged_imu_uwb_data.py (MERGE_LAYOUT = 'long') geschriebenes Distanz-Artefakt."""
+    return RangeTable.from_frame(read_table(name), num_rows, anchors)
+
+
+def format_stats(stats):
+    lines = []
+    for col, s in stats.items():
+        lines.append(f"  -> Anker {col}: {s['matched']} Messungen zugeordnet, "
+                     f"{s['collisions']} Kollisionen, {s['dropped']} außerhalb der Toleranz.")
+    return "\n".join(lines)
+
+
+class StreamingMerger:
+    """
+    Inkrementeller Merge mit derselben Semantik wie merge_sensors, aber blockweise.
+
+    Die letzte IMU-Zeile eines Blocks bleibt offen, bis die nächste bekannt ist,
+    denn erst dann steht fest, welche UWB-Messungen ihr zeitlich am nächsten liegen.
+    Bevor add_imu() aufgerufen wird, müssen alle UWB-Messungen mit Zeitstempel
+    kleiner als der letzte IMU-Zeitstempel des Blocks per add_uwb() übergeben sein.
+    Der Speicherbedarf hängt damit nur von der Blockgröße ab, nicht von der Log-Länge.
+    """
+
+    def __init__(self, columns, tolerance_ns=TIME_TOLERANCE_NS, collision=COLLISION_POLICY):
+        if collision not in COLLISION_POLICIES:
+            raise ValueError(f"Unbekannte Kollisionsstrategie '{collision}', erlaubt: {COLLISION_POLICIES}")
+        self.columns = list(columns)
+        self.col_index = {col: i for i, col in enumerate(self.columns)}
+        self.tolerance_ns = tolerance_ns
+        self.collision = collision
+        self.imu_carry = None
+        self.uwb_ts = np.empty(0, dtype=np.int64)
+        self.uwb_codes = np.empty(0, dtype=np.int64)
+        self.uwb_dist = np.empty(0)
+        self.stats = {col: {'matched': 0, 'dropped': 0, 'collisions': 0} for col in self.columns}
+
+    def add_columns(self, columns):
+        """Hängt Ankerspalten hinten an, z.B. für einen Anker, der erst später im Log auftaucht."""
+        for col in columns:
+            if col not in self.col_index:
+                self.col_index[col] = len(self.columns)
+                self.columns.append(col)
+                self.stats[col] = {'matched': 0, 'dropped': 0, 'collisions': 0}
+
+    def add_uwb(self, df_uwb):
+        """Nimmt UWB-Messungen (timestamp_ns, mac_address, distance) in den offenen Puffer auf."""
+        chunk_codes, macs = pd.factorize(df_uwb['mac_address'])
+        try:
+            lookup = np.array([self.col_index[anchor_column(mac)] for mac in macs], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"Unbekannter Anker {e} (bekannt: {self.columns})") from None
+        codes = lookup[chunk_codes] if len(lookup) else np.empty(0, dtype=np.int64)
+        self.uwb_ts = np.concatenate([self.uwb_ts, df_uwb['timestamp_ns'].to_numpy(dtype=np.int64)])
+        self.uwb_codes = np.concatenate([self.uwb_codes, codes])
+        self.uwb_dist = np.concatenate([self.uwb_dist, df_uwb['distance'].to_numpy(dtype=float)])
+
+    def drop_uwb(self, df_uwb):
+        """Zählt Messungen als außerhalb der Toleranz, ohne sie zu puffern."""
+        for col, count in df_uwb['mac_address'].map(anchor_column).value_counts().items():
+            self.stats[col]['dropped'] += int(count)
+
+    def add_imu(self, df_imu):
+        """Hängt einen IMU-Block an und gibt alle nun endgültig gemergten Zeilen zurück."""
+        block = df_imu if self.imu_carry is None else pd.concat([self.imu_carry, df_imu], ignore_index=True)
+        if len(block) == 0:
+            return self._empty()
+        imu_ts = block['timestamp_ns'].to_numpy(dtype=np.int64)
+        if np.any(np.diff(imu_ts) < 0):
+            raise ValueError("IMU-Zeitstempel müssen aufsteigend sortiert sein.")
+
+        imu_idx, dt = nearest_index(imu_ts, self.uwb_ts)
+        final = imu_idx < len(block) - 1
+        merged = self._merge_rows(block.iloc[:-1], imu_idx[final], dt[final], final)
+        self.imu_carry = block.iloc[-1:]
+        return merged
+
+    def finish(self):
+        """Schließt den Merge ab: die zurückgehaltene letzte IMU-Zeile und alle offenen Messungen."""
+        if self.imu_carry is None:
+            self.uwb_ts = self.uwb_ts[:0]
+            return self._empty()
+        imu_ts = self.imu_carry['timestamp_ns'].to_numpy(dtype=np.int64)
+        imu_idx, dt = nearest_index(imu_ts, self.uwb_ts)
+        merged = self._merge_rows(self.imu_carry, imu_idx, dt, np.ones(len(imu_idx), dtype=bool))
+        self.imu_carry = None
+        return merged
+
+    def _merge_rows(self, rows, imu_idx, dt, final):
+        values, counts = _assign_block(imu_idx, dt, self.uwb_codes[final], self.uwb_dist[final],
+                                       len(rows), len(self.columns), self.tolerance_ns, self.collision)
+        for i, col in enumerate(self.columns):
+            for key in self.stats[col]:
+                self.stats[col][key] += int(counts[key][i])
+        self.uwb_ts, self.uwb_codes, self.uwb_dist = \
+            self.uwb_ts[~final], self.uwb_codes[~final], self.uwb_dist[~final]
+        return _assemble(rows, self.columns, values)
+
+    def _empty(self):
+        return pd.DataFrame(columns=self.columns)
+
+    def get_state(self):
+        """Offener Zustand (zurückgehaltene IMU-Zeile, gepufferte Messungen) als JSON-fähiges dict."""
+        carry = None
+        if self.imu_carry is not None:
+            carry = {col: self.imu_carry[col].iloc[0].item() for col in self.imu_carry.columns}
+        return {'columns': self.columns, 'tolerance_ns': self.tolerance_ns, 'collision': self.collision,
+                'imu_carry': carry, 'uwb_ts': self.uwb_ts.tolist(), 'uwb_codes': self.uwb_codes.tolist(),
+                'uwb_dist': self.uwb_dist.tolist(), 'stats': self.stats}
+
+    @classmethod
+    def from_state(cls, state):
+        merger = cls(state['columns'], state['tolerance_ns'], state['collision'])
+        if state['imu_carry'] is not None:
+            merger.imu_carry = pd.DataFrame({col: [value] for col, value in state['imu_carry'].items()})
+            merger.imu_carry['timestamp_ns'] = merger.imu_carry['timestamp_ns'].astype(np.int64)
+        merger.uwb_ts = np.array(state['uwb_ts'], dtype=np.int64)
+        merger.uwb_codes = np.array(state['uwb_codes'], dtype=np.int64)
+        merger.uwb_dist = np.array(state['uwb_dist'], dtype=float)
+        merger.stats = state['stats']
+        return merger
+
+
+def sorted_log_files(pattern):
+    """Dateien zum Muster in natürlicher Reihenfolge (imu_data_2.csv vor imu_data_10.csv)."""
+    return sorted(glob.glob(pattern), key=lambda p: [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', p)])
+
+def _read_chunks(paths, chunk_rows, usecols=None):
+    """Liest mehrere Logs (CSV-Dateien oder Segment-Ordner) nacheinander blockweise (timestamp_ns als int64)."""
+    for path in paths:
+        for chunk in read_log_chunks(path, chunk_rows, usecols):
+            if 'timestamp_ns' in chunk:
+                chunk['timestamp_ns'] = chunk['timestamp_ns'].astype(np.int64)
+            yield chunk
+
+def _check_sorted(ts, last_ts):
+    if np.any(np.diff(ts) < 0) or (last_ts is not None and ts[0] < last_ts):
+        raise ValueError("UWB-Zeitstempel müssen für den Streaming-Merge sortiert sein.")
+    return ts[-1]
+
+def scan_anchor_columns(uwb_paths, chunk_rows=STREAM_CHUNK_ROWS):
+    """Ankerspalten in Reihenfolge des ersten Auftretens, ohne die Dateien ganz zu laden."""
+    columns = []
+    for chunk in _read_chunks(uwb_paths, chunk_rows, usecols=['mac_address']):
+        for mac in chunk['mac_address'].unique():
+            col = anchor_column(mac)
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+def _apply_clock(chunks, clock):
+    """Rechnet die Zeitstempel jedes UWB-Blocks beim Lesen in IMU-Zeit um."""
+    for chunk in chunks:
+        chunk['timestamp_ns'] = clock.apply(chunk['timestamp_ns'].to_numpy())
+        yield chunk
+
+def stream_merge(imu_paths, uwb_paths, output_file, tolerance_ns=TIME_TOLERANCE_NS,
+                 collision=COLLISION_POLICY, chunk_rows=STREAM_CHUNK_ROWS, clock=None, quality=None):
+    """
+    Streaming-Merge beliebig langer Logs mit konstantem Speicherbedarf.
+
+    imu_paths/uwb_paths werden jeweils in der gegebenen Reihenfolge als ein
+    zeitlich sortierter Strom gelesen (z.B. imu_data_1.csv, imu_data_2.csv, ...);
+    ein Segment-Log von mqtt_sub.py wird über seinen Namen angegeben (read_log_chunks).
+    Schreibt dieselben Spalten wie merged_imu_uwb_data.py (inkl. t_sec) blockweise
+    nach output_file und gibt die Zuordnungsstatistik zurück.
+    clock: optionales Uhrenmodell wie bei merge_sensors.
+    quality: optionaler quality_index.QualityIndexBuilder, bekommt jeden gelesenen Block mit.
+    """
+    if not imu_paths:
+        raise ValueError("Keine IMU-Daten gefunden.")
+    columns = scan_anchor_columns(uwb_paths, chunk_rows)
+    merger = StreamingMerger(columns, tolerance_ns, collision)
+    # Leere Dateien (nur Header, z.B. direkt nach dem Start des Loggers) liefern leere Blöcke
+    imu_chunks = (chunk for chunk in _read_chunks(imu_paths, chunk_rows) if len(chunk))
+    uwb_chunks = (chunk for chunk in _read_chunks(uwb_paths, chunk_rows) if len(chunk))
+    if clock is not None:
+        uwb_chunks = _apply_clock(uwb_chunks, clock)
+
+    first_imu = next(imu_chunks, None)
+    first_uwb = next(uwb_chunks, None)
+    if first_imu is None:
+        # Noch keine IMU-Zeilen: leere Ausgabe mit Header, alle Messungen zählen als verworfen
+        imu_columns = list(read_log(imu_paths[0]).columns)
+        for uwb_chunk in itertools.chain([first_uwb] if first_uwb is not None else [], uwb_chunks):
+            if quality is not None:
+                quality.add_uwb(uwb_chunk['timestamp_ns'].to_numpy(), uwb_chunk['mac_address'])
+            merger.drop_uwb(uwb_chunk)
+        pd.DataFrame(columns=imu_columns + ['t_sec'] + columns).to_csv(output_file, index=False)
+        return merger.stats
+    t0 = first_imu['timestamp_ns'].iloc[0]
+    if first_uwb is not None:
+        t0 = min(t0, first_uwb['timestamp_ns'].min())
+
+    uwb_chunks = itertools.chain([first_uwb] if first_uwb is not None else [], uwb_chunks)
+    last_uwb_ts = None
+    uwb_exhausted = False
+    header = True
+    with open(output_file, 'w', newline='') as f:
+        for imu_chunk in itertools.chain([first_imu], imu_chunks):
+            imu_chunk['t_sec'] = (imu_chunk['timestamp_ns'] - t0) / 1e9
+            if quality is not None:
+                quality.add_imu(imu_chunk['timestamp_ns'].to_numpy())
+            # UWB nur so weit nachladen, bis alle Messungen vor der letzten IMU-Zeile bekannt sind
+            block_end = imu_chunk['timestamp_ns'].iloc[-1]
+            while not uwb_exhausted and (last_uwb_ts is None or last_uwb_ts < block_end):
+                uwb_chunk = next(uwb_chunks, None)
+                if uwb_chunk is None:
+                    uwb_exhausted = True
+                elif len(uwb_chunk):
+                    last_uwb_ts = _check_sorted(uwb_chunk['timestamp_ns'].to_numpy(), last_uwb_ts)
+                    merger.add_uwb(uwb_chunk)
+                    if quality is not None:
+                        quality.add_uwb(uwb_chunk['timestamp_ns'].to_numpy(), uwb_chunk['mac_address'])
+            merged = merger.add_imu(imu_chunk)
+            if len(merged):
+                merged.to_csv(f, index=False, header=header)
+                header = False
+
+        # Rest des UWB-Stroms kann nur noch der letzten IMU-Zeile zugeordnet werden,
+        # alles jenseits der Toleranz wird nur noch gezählt
+        tail_end = merger.imu_carry['timestamp_ns'].iloc[0] + tolerance_ns
+        for uwb_chunk in uwb_chunks:
+            if quality is not None:
+                quality.add_uwb(uwb_chunk['timestamp_ns'].to_numpy(), uwb_chunk['mac_address'])
+            in_reach = uwb_chunk['timestamp_ns'].to_numpy() < tail_end
+            merger.add_uwb(uwb_chunk[in_reach])
+            merger.drop_uwb(uwb_chunk[~in_reach])
+        merger.finish().to_csv(f, index=False, header=header)
+
+    return merger.stats
+
+
+def _read_appended_csv(path, offset):
+    """
+    Liest alle vollständigen Zeilen ab Byte-Offset (eine halb geschriebene letzte Zeile
+    bleibt liegen). Gibt (DataFrame, Byte-Offset nach jeder Datenzeile) zurück.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        data = f.read() if header.endswith(b'\n') else b''
+    if not header.endswith(b'\n'):
+        header = b'timestamp_ns\n'  # Header noch unvollständig: keine Daten
+    data = data[:data.rfind(b'\n') + 1]
+    start = max(offset, len(header))
+    line_ends = start + np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n')) + 1
+    names = header.decode().strip().split(',')
+    dtypes = {name: str if name == 'mac_address' else float for name in names if name != 'timestamp_ns'}
+    df = pd.read_csv(io.BytesIO(data), names=names, header=None, dtype=dtypes)
+    df['timestamp_ns'] = df['timestamp_ns'].astype(np.int64)
+    return df, line_ends
+
+def _first_block(index, segment, offset):
+    """Erster Indexeintrag mit (Segment, Offset) >= (segment, offset)."""
+    lo = np.searchsorted(index['segment'], segment, side='left')
+    hi = np.searchsorted(index['segment'], segment, side='right')
+    return int(lo + np.searchsorted(index['offset'][lo:hi], offset, side='left'))
+
+def _read_appended_segments(directory, position):
+    """
+    Wie _read_appended_csv für ein Segment-Log (segment_log.py). position = [Segment, Block-Offset,
+    schon gelesene Zeilen dieses Blocks]: komprimierte Blöcke lassen sich nur als Ganzes lesen.
+    Gelesen werden nur Blöcke, die schon im Index stehen, also vollständig geschrieben sind.
+    Gibt (DataFrame, Position nach jeder Datenzeile) zurück.
+    """
+    index = load_index(directory)
+    segment, offset, skip = position
+    lo = _first_block(index, segment, offset)
+    if lo < len(index['offset']) and (index['segment'][lo], index['offset'][lo]) != (segment, offset):
+        skip = 0
+    df = read_blocks(directory, index, lo, len(index['offset']), dtype={'mac_address': str})
+    df = df.iloc[skip:].reset_index(drop=True)
+    if len(df):
+        df['timestamp_ns'] = df['timestamp_ns'].astype(np.int64)
+    ends = []
+    for block in range(lo, len(index['offset'])):
+        segment, offset, length, rows = (int(index[name][block]) for name in ('segment', 'offset', 'length', 'rows'))
+        first = skip if block == lo else 0
+        ends += [[segment, offset, k] for k in range(first + 1, rows)] + [[segment, offset + length, 0]]
+    return df, ends
+
+def _read_appended(path, position):
+    """Neue Zeilen eines Logs ab dem Watermark position (None = von vorn), siehe _read_appended_*."""
+    path, segmented = resolve_log(path)
+    if segmented:
+        return _read_appended_segments(path, position or [0, 0, 0])
+    return _read_appended_csv(path, position or 0)
+
+def _position_valid(path, position):
+    """False, wenn das Log seit dem Watermark gekürzt oder ersetzt wurde (Einzel-CSV <-> Segmente)."""
+    if position is None:
+        return True
+    path, segmented = resolve_log(path)
+    if segmented != isinstance(position, list):
+        return False
+    if not segmented:
+        return os.path.getsize(path) >= position
+    index = load_index(path)
+    if not len(index['offset']):
+        return position == [0, 0, 0]
+    return tuple(position) <= (index['segment'][-1], index['offset'][-1] + index['length'][-1], 0)
+
+def _add_output_columns(path, columns):
+    """
+    Schreibt path mit zusätzlichen leeren Spalten nach path + '.tmp' (Zeilen byteweise unverändert,
+    nur ',' angehängt) und gibt den Pfad der neuen Datei zurück.
+    """
+    tmp_file = path + '.tmp'
+    suffix = b',' * len(columns) + b'\n'
+    with open(path, 'rb') as src, open(tmp_file, 'wb') as dst:
+        header = src.readline().rstrip(b'\r\n')
+        dst.write(header + b''.join(b',' + col.encode() for col in columns) + b'\n')
+        for line in src:
+            dst.write(line.rstrip(b'\r\n') + suffix)
+    return tmp_file
+
+def _state_position(position):
+    return [int(v) for v in position] if isinstance(position, list) else int(position)
+
+class IncrementalMerge:
+    """
+    Merged nur die seit dem letzten Lauf an imu_file/uwb_file angehängten Zeilen und
+    hängt sie an output_file an. imu_file/uwb_file sind Einzel-CSVs oder segmentierte Logs
+    (segment_log.py). Der Watermark (Byte-Offsets bzw. [Segment, Block-Offset, Zeilen], t0,
+    zurückgehaltene IMU-Zeile und noch nicht zugeordnete UWB-Messungen) liegt in state_file.
+
+    IMU-Zeilen werden erst verarbeitet, wenn UWB-Daten bis zu ihrem Zeitstempel vorliegen,
+    so landen Messungen an der Grenze zweier Läufe auf derselben Zeile wie beim vollen Merge.
+    Schrumpft eine Eingabedatei (z.B. Neustart von mqtt_sub.py) oder ändert sich das
+    Uhrenmodell, wird von vorn begonnen. Ein optionaler quality_index.QualityIndexBuilder
+    (quality) wird mit den neuen Zeilen fortgeschrieben, sein Stand liegt ebenfalls im Watermark.
+    """
+
+    def __init__(self, imu_file, uwb_file, output_file, state_file=None,
+                 tolerance_ns=TIME_TOLERANCE_NS, collision=COLLISION_POLICY, clock=None, quality=None):
+        self.imu_file = imu_file
+        self.uwb_file = uwb_file
+        self.output_file = output_file
+        self.state_file = state_file or os.path.splitext(output_file)[0] + '.watermark.json'
+        self.tolerance_ns = tolerance_ns
+        self.collision = collision
+        self.clock = clock
+        self.quality = quality
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file) as f:
+            state = json.load(f)
+        inputs_shrunk = not (_position_valid(self.imu_file, state['imu_offset'])
+                             and _position_valid(self.uwb_file, state['uwb_offset']))
+        output_mismatch = not os.path.exists(self.output_file) or \
+            os.path.getsize(self.output_file) < state['output_size']
+        if state.get('clock') != self._clock_state() or (self.quality is not None and state.get('quality') is None):
+            print("HINWEIS: Uhrenmodell oder Qualitätsindex passt nicht zum Watermark, merge von vorn.")
+            return None
+        if inputs_shrunk or output_mismatch:
+            print("HINWEIS: Eingabe- oder Ausgabedatei passt nicht zum Watermark, merge von vorn.")
+            return None
+        # Abgebrochener Lauf: Zeilen nach dem letzten gespeicherten Stand verwerfen
+        with open(self.output_file, 'r+b') as f:
+            f.truncate(state['output_size'])
+        return state
+
+    def _clock_state(self):
+        return None if self.clock is None else self.clock.to_dict()
+
+    def _save_state(self, state):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+
+    def _add_columns(self, state, merger, columns):
+        """
+        Neuer Anker seit dem letzten Lauf: Spalte hinten anfügen (wie beim vollen Merge, dort in
+        Reihenfolge des ersten Auftretens) und in den schon geschriebenen Zeilen leer ergänzen.
+        Der Watermark wird vor dem Austausch der Ausgabedatei gespeichert; bricht der Lauf
+        dazwischen ab, passt die Ausgabe nicht mehr dazu und es wird von vorn gemergt.
+        """
+        print(f"HINWEIS: Neue Anker {columns}, Spalten werden in '{self.output_file}' ergänzt.")
+        merger.add_columns(columns)
+        if state['output_size'] == 0:
+            return
+        tmp_file = _add_output_columns(self.output_file, columns)
+        state['output_size'] = os.path.getsize(tmp_file)
+        state['merger'] = merger.get_state()
+        self._save_state(state)
+        os.replace(tmp_file, self.output_file)
+
+    def run(self, finalize=False):
+        """
+        Verarbeitet neue Zeilen; finalize=True schließt auch die zurückgehaltene letzte
+        IMU-Zeile ab (Ende der Aufnahme). Gibt (geschriebene Zeilen, Statistik) zurück.
+        """
+        state = self._load_state()
+        if state is None:
+            state = {'imu_offset': None, 'uwb_offset': None, 'output_size': 0, 't0': None,
+                     'first_uwb_ts': None, 'last_uwb_ts': None, 'merger': None, 'clock': self._clock_state(),
+                     'quality': None}
+        if self.quality is not None and state.get('quality') is not None:
+            self.quality.state = state['quality']
+
+        df_uwb, uwb_ends = _read_appended(self.uwb_file, state['uwb_offset'])
+        if self.clock is not None:
+            df_uwb['timestamp_ns'] = self.clock.apply(df_uwb['timestamp_ns'].to_numpy())
+        if state['merger'] is None:
+            if len(df_uwb) == 0 and not finalize:
+                return 0, {}
+            columns = list(dict.fromkeys(anchor_column(mac) for mac in df_uwb['mac_address']))
+            merger = StreamingMerger(columns, self.tolerance_ns, self.collision)
+        else:
+            merger = StreamingMerger.from_state(state['merger'])
+            new_columns = [col for col in dict.fromkeys(anchor_column(mac) for mac in df_uwb['mac_address'])
+                           if col not in merger.col_index]
+            if new_columns:
+                self._add_columns(state, merger, new_columns)
+        if len(df_uwb):
+            if state['first_uwb_ts'] is None:
+                state['first_uwb_ts'] = int(df_uwb['timestamp_ns'].min())
+            state['last_uwb_ts'] = int(_check_sorted(df_uwb['timestamp_ns'].to_numpy(), state['last_uwb_ts']))
+            merger.add_uwb(df_uwb)
+            if self.quality is not None:
+                self.quality.add_uwb(df_uwb['timestamp_ns'].to_numpy(), df_uwb['mac_address'])
+            state['uwb_offset'] = _state_position(uwb_ends[-1])
+
+        df_imu, imu_ends = _read_appended(self.imu_file, state['imu_offset'])
+        if not finalize:
+            # Nur IMU-Zeilen, bis zu denen alle UWB-Messungen bekannt sind
+            limit = 0 if state['last_uwb_ts'] is None else \
+                np.searchsorted(df_imu['timestamp_ns'].to_numpy(), state['last_uwb_ts'], side='right')
+            df_imu, imu_ends = df_imu.iloc[:limit], imu_ends[:limit]
+        if len(df_imu):
+            if state['t0'] is None:
+                t0 = df_imu['timestamp_ns'].iloc[0]
+                if state['first_uwb_ts'] is not None:
+                    t0 = min(t0, state['first_uwb_ts'])
+                state['t0'] = int(t0)
+            df_imu['t_sec'] = (df_imu['timestamp_ns'] - state['t0']) / 1e9
+            state['imu_offset'] = _state_position(imu_ends[-1])
+            if self.quality is not None:
+                self.quality.add_imu(df_imu['timestamp_ns'].to_numpy())
+
+        parts = [merger.add_imu(df_imu)] if len(df_imu) else []
+        if finalize:
+            parts.append(merger.finish())
+        parts = [df for df in parts if len(df)]
+        merged = pd.concat(parts, ignore_index=True) if parts else merger._empty()
+
+        mode = 'a' if state['output_size'] > 0 else 'w'
+        with open(self.output_file, mode, newline='') as f:
+            if len(merged):
+                merged.to_csv(f, index=False, header=(mode == 'w'))
+        state['output_size'] = os.path.getsize(self.output_file)
+        state['merger'] = merger.get_state()
+        if self.quality is not None:
+            state['quality'] = self.quality.state
+        self._save_state(state)
+        return len(merged), merger.stats
@@ -1,56 +1,121 @@
-import pandas as pd
 import numpy as np
+from merge_engine import merge_sensors, merge_sensors_long, stream_merge, sorted_log_files, format_stats, \
+    IncrementalMerge
+from storage import write_table
+from segment_log import read_log, is_segmented
+from clock_sync import resolve_clock
+from quality_index import QualityIndexBuilder, quality_index_path, write_quality_index, format_quality
 
 # === KONFIGURATION ===
+# Einzel-CSV oder segmentiertes Log von mqtt_sub.py (Ordner 'imu_data_1/', wird automatisch gefunden)
 IMU_FILE = 'imu_data_1.csv'
 UWB_FILE = 'uwb_data_1.csv'
+# (t0, t1) in ns: nur diesen Zeitraum mergen; bei segmentierten Logs werden nur die Blöcke gelesen,
+# die ihn abdecken. None = alles
+TIME_RANGE_NS = None
 OUTPUT_FILE = 'merged_imu_uwb_data.csv'
-TIME_TOLERANCE_NS = 1e8 
+TIME_TOLERANCE_NS = 1e8
+COLLISION_POLICY = 'nearest'  # 'nearest', 'mean' oder 'last' (siehe merge_engine.py)
+# Uhrenabgleich IMU/UWB (siehe clock_sync.py): None = Zeitstempel unverändert,
+# 'estimate' = Versatz und Drift aus den Logs schätzen (nur ohne Streaming/inkrementell),
+# sonst Pfad zu einer mit clock_sync.py gespeicherten Kalibrierung, z.B. 'clock_calibration.json'
+CLOCK_SYNC = None
+# Streaming: alle imu_data_*.csv / uwb_data_*.csv (bzw. alle Segmente der Logs) blockweise mergen,
+# konstanter Speicherbedarf
+USE_STREAMING = False
+IMU_GLOB = 'imu_data_*.csv'
+UWB_GLOB = 'uwb_data_*.csv'
+CHUNK_ROWS = 100_000
+# Inkrementell: nur seit dem letzten Lauf angehängte Zeilen mergen (Watermark neben OUTPUT_FILE)
+USE_INCREMENTAL = False
+FINALIZE = False  # Aufnahme beendet: auch die zurückgehaltene letzte IMU-Zeile schreiben
+STORAGE_FORMAT = 'csv'  # 'csv', 'parquet' oder 'feather' (siehe storage.py); Streaming/inkrementell immer CSV
+# 'wide': eine dist_*-Spalte pro Anker (meist NaN)
+# 'long': IMU-Tabelle + Distanz-Tabelle (imu_row, anchor, range), eine Zeile pro Messung
+MERGE_LAYOUT = 'wide'
+LONG_IMU_FILE = 'merged_imu.csv'
+LONG_RANGES_FILE = 'merged_ranges.csv'
+# Datenqualitäts-Index je Anker (Lücken, Toleranzverfehlungen, Kollisionen, Empfang pro Sekunde),
+# wird beim Merge mitgeschrieben und von sample_rate_*.py und run_ekf.py gelesen
+WRITE_QUALITY_INDEX = True
+QUALITY_INDEX_FILE = quality_index_path(OUTPUT_FILE)
+
+# Gelesene Logs für den Abgleich in sample_rate_*.py (Streaming über mehrere Einzeldateien: die Dateiliste)
+QUALITY_SOURCES = {'imu': IMU_FILE if not USE_STREAMING or is_segmented(IMU_FILE) else sorted_log_files(IMU_GLOB),
+                   'uwb': UWB_FILE if not USE_STREAMING or is_segmented(UWB_FILE) else sorted_log_files(UWB_GLOB)}
+
+quality = QualityIndexBuilder(TIME_TOLERANCE_NS, sources=QUALITY_SOURCES,
+                              time_range=None if USE_STREAMING or USE_INCREMENTAL else TIME_RANGE_NS) \
+    if WRITE_QUALITY_INDEX else None
+
+def save_quality_index(merge_stats, output_path):
+    """Nach dem Schreiben von output_path aufrufen: dessen Stand kommt in den Index (Prüfung in run_ekf.py)."""
+    if quality is None:
+        return
+    index = quality.finish(merge_stats, outputs={'merged': output_path})
+    write_quality_index(index, QUALITY_INDEX_FILE)
+    print(format_quality(index))
+    print(f"Qualitätsindex gespeichert als: {QUALITY_INDEX_FILE}")
+
+if USE_INCREMENTAL:
+    merge = IncrementalMerge(IMU_FILE, UWB_FILE, OUTPUT_FILE, tolerance_ns=TIME_TOLERANCE_NS,
+                             collision=COLLISION_POLICY, clock=resolve_clock(CLOCK_SYNC), quality=quality)
+    new_rows, merge_stats = merge.run(finalize=FINALIZE)
+    print(f"Inkrementeller Merge: {new_rows} neue Zeilen an '{OUTPUT_FILE}' angehängt.")
+    print(format_stats(merge_stats))
+    save_quality_index(merge_stats, OUTPUT_FILE)
+    exit()
+
+if USE_STREAMING:
+    # Segmentierte Logs von mqtt_sub.py haben Vorrang vor den Einzeldateien zum Muster
+    imu_files = [IMU_FILE] if is_segmented(IMU_FILE) else sorted_log_files(IMU_GLOB)
+    uwb_files = [UWB_FILE] if is_segmented(UWB_FILE) else sorted_log_files(UWB_GLOB)
+    print(f"Streaming-Merge von {imu_files} und {uwb_files}...")
+    merge_stats = stream_merge(imu_files, uwb_files, OUTPUT_FILE, TIME_TOLERANCE_NS, COLLISION_POLICY, CHUNK_ROWS,
+                               clock=resolve_clock(CLOCK_SYNC), quality=quality)
+    print(format_stats(merge_stats))
+    save_quality_index(merge_stats, OUTPUT_FILE)
+    print(f"Fertig! Gemergte Datei gespeichert als: {OUTPUT_FILE}")
+    exit()
 
 # === 1. DATEN LADEN ===
 print("Lade Daten...")
-df_imu = pd.read_csv(IMU_FILE)
-df_uwb = pd.read_csv(UWB_FILE)
+df_imu = read_log(IMU_FILE, *(TIME_RANGE_NS or ()))
+df_uwb = read_log(UWB_FILE, *(TIME_RANGE_NS or ()))
 
 df_imu['timestamp_ns'] = df_imu['timestamp_ns'].astype(np.int64)
 df_uwb['timestamp_ns'] = df_uwb['timestamp_ns'].astype(np.int64)
 
-t0 = min(df_imu['timestamp_ns'].iloc[0], df_uwb['timestamp_ns'].min())
+clock = resolve_clock(CLOCK_SYNC, df_imu, df_uwb)
+uwb_start = df_uwb['timestamp_ns'].min() if clock is None else clock.apply(df_uwb['timestamp_ns'].min())
+t0 = min(df_imu['timestamp_ns'].iloc[0], uwb_start)
 df_imu['t_sec'] = (df_imu['timestamp_ns'] - t0) / 1e9
 
 # === 2. UWB DATEN VORBEREITEN ===
 uwb_macs = df_uwb['mac_address'].unique()
 print(f"Gefundene UWB Anker: {uwb_macs}")
-
-df_merged = df_imu.copy()
+if quality is not None:
+    quality.add_imu(df_imu['timestamp_ns'].to_numpy())
+    uwb_ts = df_uwb['timestamp_ns'].to_numpy()
+    quality.add_uwb(uwb_ts if clock is None else clock.apply(uwb_ts), df_uwb['mac_address'])
 
 # === 3. SPARSE MERGE (DER KERN) ===
+# Alle Anker in einem Durchgang, jeweils auf die zeitlich nächste IMU-Zeile
 print("Starte Merge-Vorgang...")
-for mac in uwb_macs: 
-    col_name = f"dist_{mac.replace(':', '')[:5]}"
-
-    df_merged[col_name] = np.nan
-    
-    uwb_subset = df_uwb[df_uwb['mac_address'] == mac]
-    
-    idx_closest_imu = df_merged['timestamp_ns'].searchsorted(uwb_subset['timestamp_ns'])
-    
-    idx_closest_imu = np.clip(idx_closest_imu, 0, len(df_merged) - 1)
-    
-    imu_timestamps = df_merged['timestamp_ns'].values[idx_closest_imu]
-    uwb_timestamps = uwb_subset['timestamp_ns'].values
-    time_diffs = np.abs(imu_timestamps - uwb_timestamps)
-    
-    valid_mask = time_diffs < TIME_TOLERANCE_NS
-    
-    valid_imu_indices = idx_closest_imu[valid_mask]
-    valid_uwb_distances = uwb_subset['distance'].values[valid_mask]
-    
-    df_merged.loc[df_merged.index[valid_imu_indices], col_name] = valid_uwb_distances
-    
-    print(f"  -> Anker {col_name}: {len(valid_uwb_distances)} Messungen zugeordnet.")
+if MERGE_LAYOUT == 'long':
+    range_table, merge_stats = merge_sensors_long(df_imu, df_uwb, TIME_TOLERANCE_NS, COLLISION_POLICY, clock)
+    print(format_stats(merge_stats))
+    imu_path = write_table(df_imu, LONG_IMU_FILE, STORAGE_FORMAT)
+    ranges_path = write_table(range_table.to_frame(), LONG_RANGES_FILE, STORAGE_FORMAT)
+    save_quality_index(merge_stats, imu_path)
+    print(f"Fertig! IMU-Tabelle: {imu_path}, {len(range_table)} Distanzen: {ranges_path}")
+    exit()
+
+df_merged, merge_stats = merge_sensors(df_imu, df_uwb, TIME_TOLERANCE_NS, COLLISION_POLICY, clock)
+print(format_stats(merge_stats))
 
 # === 4. SPEICHERN ===
-df_merged.to_csv(OUTPUT_FILE, index=False)
-print(f"Fertig! Gemergte Datei gespeichert als: {OUTPUT_FILE}")
-print(df_merged.head())
\ No newline at end of file
+output_path = write_table(df_merged, OUTPUT_FILE, STORAGE_FORMAT)
+save_quality_index(merge_stats, output_path)
+print(f"Fertig! Gemergte Datei gespeichert als: {output_path}")
+print(df_merged.head())
@@ -1,7 +1,15 @@
 import paho.mqtt.client as mqtt
+import collections
 import csv
 import os
+import queue
+import signal
 import sys
+import threading
+import time
+import numpy as np
+from payload_codec import PayloadCodec, is_binary
+from segment_log import SegmentedLog, SyncPolicy, log_dir, recover_csv, SEGMENT_MAX_BYTES, SEGMENT_MAX_S
 
 # --- MQTT Konfiguration ---
 MQTT_BROKER = ""
@@ -18,90 +26,327 @@ UWB_CSV_FILE = 'uwb_data_1.csv'
 IMU_CSV_FILE = 'imu_data_1.csv'
 UWB_HEADERS = ['timestamp_ns', 'mac_address', 'distance']
 IMU_HEADERS = ['timestamp_ns', 'qw', 'qx', 'qy', 'qz', 'ax', 'ay', 'az']
+# Segmentierte Logs (segment_log.py), optional: statt einer wachsenden CSV je Strom ein Ordner neben
+# dem Dateinamen ('imu_data_1/') mit rotierenden Segmenten und Zeitindex. Standard bleibt die einzelne,
+# unkomprimierte CSV, die alle Auswerteskripte und results/* erwarten. Vorhandene Daten bleiben beim
+# Neustart erhalten; auch ohne Segmentierung wird an eine vorhandene CSV nur angehängt.
+SEGMENTED_LOGS = False
+# Nur mit SEGMENTED_LOGS: Komprimierung der Segmente, 'gzip' (jeder Block ein gzip-Member, Stufe 1)
+# oder None. read_log und die Merge-/Store-Skripte entpacken automatisch.
+SEGMENT_COMPRESSION = None
 
+# --- Schreibpuffer ---
+# Zeilen werden gesammelt und erst geschrieben, wenn FLUSH_ROWS erreicht sind oder
+# der letzte Schreibvorgang FLUSH_INTERVAL_S zurückliegt; beim Beenden immer
+FLUSH_ROWS = 500
+FLUSH_INTERVAL_S = 1.0
 
-def check_and_write_headers():
-    """Überprüft, ob die CSV-Dateien existieren, und schreibt die Header, falls nicht."""
-    try:
-        with open(UWB_CSV_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(UWB_HEADERS)
-        print(f"Header in {UWB_CSV_FILE} geschrieben.")
-    except IOError as e:
-        print(f"FEHLER: Konnte Header nicht in {UWB_CSV_FILE} schreiben: {e}")
-        sys.exit(1)
-            
-    try:
-        with open(IMU_CSV_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(IMU_HEADERS)
-        print(f"Header in {IMU_CSV_FILE} geschrieben.")
-    except IOError as e:
-        print(f"FEHLER: Konnte Header nicht in {IMU_CSV_FILE} schreiben: {e}")
-        sys.exit(1)
+# --- Dauerhaftigkeit (SyncPolicy in segment_log.py) ---
+# fsync nach FSYNC_EVERY_ROWS geschriebenen Zeilen oder FSYNC_INTERVAL_S Sekunden seit dem letzten
+# (None = aus, 0 Zeilen = nach jedem Schreibvorgang). Ohne fsync übersteht das Geschriebene einen
+# Absturz des Prozesses, aber keinen Stromausfall. Kosten je Stufe: bench_durability.py.
+# Ein beim Absturz halb geschriebener Datensatz wird beim nächsten Start immer abgeschnitten.
+FSYNC_EVERY_ROWS = None
+FSYNC_INTERVAL_S = 1.0
 
-def parse_uwb_data(payload_str):
+# --- Schreib-Thread ---
+# on_message legt die geparsten Zeilen nur in die Warteschlange, geschrieben wird in einem
+# eigenen Thread, damit ein hängendes Dateisystem die MQTT-Schleife nicht aufhält
+QUEUE_SIZE = 10000                # Nachrichten
+QUEUE_FULL_POLICY = 'block'       # 'block': Netzwerk-Schleife wartet, 'drop_oldest': älteste Nachricht verwerfen
+STATS_INTERVAL_S = 10.0           # Ausgabe der Warteschlangen-Kennzahlen
+LATENCY_WINDOW = 10000            # Anzahl der letzten Latenzen für Median/p99
+PUT_TIMEOUT_S = 0.5               # 'block': so oft prüft put(), ob der Schreib-Thread noch lebt
+
+
+class BufferedCsvWriter:
     """
-    Parst den UWB-Payload (Format: "timestamp;mac,dist;mac,dist;...")
-    und wandelt ihn in mehrere CSV-Zeilen um.
+    CSV-Datei mit dauerhaft geöffnetem Handle und Zeilenpuffer im Speicher,
+    statt die Datei für jede MQTT-Nachricht neu zu öffnen. Eine vorhandene Datei wird fortgesetzt,
+    ein unvollständiger letzter Datensatz (Absturz) vorher abgeschnitten; sync (SyncPolicy) bestimmt,
+    wann per fsync gesichert wird. Thread-sicher, wird aber im Normalbetrieb nur vom WriterThread benutzt.
     """
-    parts = payload_str.strip().split(';')
-    if len(parts) < 2:
-        return []
-        
-    timestamp = parts[0]
-    rows_to_write = []
-    
-    for device_data in parts[1:]:
-        if not device_data: 
-            continue
+
+    def __init__(self, path, headers, flush_rows=FLUSH_ROWS, flush_interval_s=FLUSH_INTERVAL_S, sync=None):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval_s = flush_interval_s
+        self.sync = sync or SyncPolicy()
+        self.closed = False
+        self.recovered_bytes = 0
+        self._open(path, headers)
+        self.rows = []
+        self.rows_written = 0
+        self.flushes = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def write_rows(self, rows):
+        with self.lock:
+            self.rows.extend(rows)
+            if len(self.rows) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval_s:
+                self._flush()
+
+    def flush_if_due(self):
+        """Für den periodischen Aufruf: schreibt den Puffer, wenn das Zeitintervall abgelaufen ist."""
+        with self.lock:
+            if self.rows and time.monotonic() - self.last_flush >= self.flush_interval_s:
+                self._flush()
+            if not self.closed:
+                self._sync_if_due()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self._flush()
+            self._close()
+            self.closed = True
+
+    def _open(self, path, headers):
+        if os.path.exists(path):
+            self.recovered_bytes = recover_csv(path)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(headers)
+            self.file.flush()
+
+    def _write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        self.sync.after_write(len(rows), self.file)
+
+    def _sync_if_due(self):
+        self.sync.after_write(0, self.file)
+
+    def _close(self):
+        self.sync.sync_pending(self.file)
+        self.file.close()
+
+    def _flush(self):
+        if self.rows:
+            self._write(self.rows)
+            self.rows_written += len(self.rows)
+            self.flushes += 1
+            self.rows = []
+        self.last_flush = time.monotonic()
+
+
+class SegmentedCsvWriter(BufferedCsvWriter):
+    """BufferedCsvWriter, der in ein SegmentedLog schreibt: path ist der Log-Ordner, jeder Flush ein Indexblock."""
+
+    def __init__(self, path, headers, flush_rows=FLUSH_ROWS, flush_interval_s=FLUSH_INTERVAL_S, sync=None,
+                 max_bytes=SEGMENT_MAX_BYTES, max_age_s=SEGMENT_MAX_S, compression=SEGMENT_COMPRESSION):
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.compression = compression
+        super().__init__(path, headers, flush_rows, flush_interval_s, sync)
+
+    def _open(self, path, headers):
+        self.log = SegmentedLog(path, headers, self.max_bytes, self.max_age_s, self.compression, sync=self.sync)
+        self.recovered_bytes = self.log.recovered_bytes
+
+    def _write(self, rows):
+        self.log.append(rows)
+
+    def _sync_if_due(self):
+        self.log.sync_if_due()
+
+    def _close(self):
+        self.log.close()
+
+
+class WriterThread(threading.Thread):
+    """
+    Schreibt die Zeilen aus einer begrenzten Warteschlange in die BufferedCsvWriter und
+    übernimmt auch den zeitgesteuerten Flush. put() wird aus dem Netzwerk-Thread aufgerufen;
+    ist die Warteschlange voll, wartet put() ('block') oder verwirft die älteste Nachricht
+    ('drop_oldest'). Kennzahlen: Füllstand, verworfene Zeilen, Latenz vom Empfang bis zum Schreiben.
+    Scheitert das Schreiben (Datenträger voll, E/A-Fehler), endet der Thread, error hält die Ursache
+    und failed wird gesetzt; put() wartet dann nicht mehr, sondern verwirft und zählt die Nachrichten.
+    """
+
+    def __init__(self, writers, queue_size=QUEUE_SIZE, policy=QUEUE_FULL_POLICY,
+                 flush_interval_s=FLUSH_INTERVAL_S):
+        super().__init__(name='csv-writer', daemon=True)
+        if policy not in ('block', 'drop_oldest'):
+            raise ValueError(f"Unbekannte Strategie für volle Warteschlange: '{policy}'")
+        self.writers = writers
+        self.policy = policy
+        self.flush_interval_s = flush_interval_s
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.enqueued = 0
+        self.written = 0
+        self.dropped_messages = 0
+        self.dropped_records = 0
+        self.max_depth = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.latency_max = 0.0
+        self.error = None
+        self.failed = threading.Event()
+
+    def put(self, writer, rows):
+        item = (writer, rows, time.monotonic())
+        if self.policy == 'block':
+            while True:
+                if self.failed.is_set():
+                    self.dropped_messages += 1
+                    self.dropped_records += len(rows)
+                    return
+                try:
+                    self.queue.put(item, timeout=PUT_TIMEOUT_S)
+                    break
+                except queue.Full:
+                    continue
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        _, dropped_rows, _ = self.queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    self.dropped_messages += 1
+                    self.dropped_records += len(dropped_rows)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def stop(self):
+        """Warteschlange abarbeiten, Puffer schreiben, Dateien schließen."""
+        while self.is_alive():
+            try:
+                self.queue.put(None, timeout=PUT_TIMEOUT_S)
+                break
+            except queue.Full:
+                continue
+        self.join()
+
+    def run(self):
         try:
-            mac, dist = device_data.split(',')
-            rows_to_write.append([timestamp, mac, dist])
-        except ValueError:
-            print(f"Überspringe fehlerhafte UWB-Daten: {device_data}")
-            
-    return rows_to_write
-
-def parse_imu_data(payload_str):
+            self._write_queue()
+        except Exception as e:
+            self.error = e
+            self.failed.set()
+            print(f"FEHLER: Schreiben fehlgeschlagen, keine weiteren Daten werden gespeichert: {e!r}")
+        for writer in self.writers:
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"FEHLER: {writer.path} konnte nicht geschlossen werden: {e!r}")
+
+    def _write_queue(self):
+        last_check = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                writer, rows, t_received = item
+                writer.write_rows(rows)
+                latency = time.monotonic() - t_received
+                self.latencies.append(latency)
+                self.latency_max = max(self.latency_max, latency)
+                self.written += 1
+            now = time.monotonic()
+            if now - last_check >= self.flush_interval_s:
+                for writer in self.writers:
+                    writer.flush_if_due()
+                last_check = now
+
+    def stats(self):
+        latencies = list(self.latencies)
+        p50, p99 = (np.percentile(latencies, [50, 99]) * 1e3) if latencies else (0.0, 0.0)
+        return {'depth': self.queue.qsize(), 'max_depth': self.max_depth, 'enqueued': self.enqueued,
+                'written': self.written, 'dropped_messages': self.dropped_messages,
+                'dropped_records': self.dropped_records, 'latency_p50_ms': p50, 'latency_p99_ms': p99,
+                'latency_max_ms': self.latency_max * 1e3, 'error': self.error}
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Warteschlange: {s['depth']} (max. {s['max_depth']}/{self.queue.maxsize}), "
+                f"{s['written']}/{s['enqueued']} Nachrichten geschrieben, "
+                f"{s['dropped_records']} Zeilen verworfen, Latenz Median {s['latency_p50_ms']:.2f} ms, "
+                f"p99 {s['latency_p99_ms']:.2f} ms, max. {s['latency_max_ms']:.2f} ms"
+                + (f", FEHLER: {s['error']!r}" if s['error'] is not None else ""))
+
+
+uwb_writer = None
+imu_writer = None
+writer_thread = None
+codec = PayloadCodec()
+
+def open_writers():
     """
-    Parst den IMU-Payload basierend auf dem C-Code-Format: 
-    "timestamp;ax,ay,az;qw,qx,qy,qz"
-    und ordnet ihn entsprechend der IMU_HEADERS an.
+    Öffnet die Logs für die ganze Aufnahme: segmentiert je Strom ein Ordner mit neuem Segment,
+    sonst die CSV-Dateien (Header nur bei neuen Dateien). Vorhandene Daten werden nie gelöscht.
     """
-    parts = payload_str.strip().split(';')
-    
-    if len(parts) != 3: 
-        print(f"Überspringe fehlerhafte IMU-Daten (falsche Anzahl an Teilen): {payload_str}")
-        return None
-        
-    timestamp = parts[0]
-    try:
-        group1_values = parts[1].split(',')
-        group2_values = parts[2].split(',')
-
-        if len(group1_values) != 3 or len(group2_values) != 4:
-            print(f"Überspringe fehlerhafte IMU-Daten (falsche Anzahl an Werten): {payload_str}")
-            return None
-            
-        # Gruppe 1: ax, ay, az
-        ax = group1_values[0]
-        ay = group1_values[1]
-        az = group1_values[2]
-        
-        # Gruppe 2: qw, qx, qy, qz
-        qw = group2_values[0]
-        qx = group2_values[1]
-        qy = group2_values[2]
-        qz = group2_values[3]
-            
-        # Die Daten in der Reihenfolge zurückgeben, die in IMU_HEADERS definiert ist:
-        # ['timestamp_ns', 'qw', 'qx', 'qy', 'qz', 'ax', 'ay', 'az']
-        return [timestamp, qw, qx, qy, qz, ax, ay, az]
-        
-    except Exception as e:
-        print(f"Fehler beim Parsen der IMU-Daten: {e} -- Payload: {payload_str}")
-        return None
+    global uwb_writer, imu_writer
+    writer_cls = SegmentedCsvWriter if SEGMENTED_LOGS else BufferedCsvWriter
+    writers = []
+    for path, headers in ((UWB_CSV_FILE, UWB_HEADERS), (IMU_CSV_FILE, IMU_HEADERS)):
+        path = log_dir(path) if SEGMENTED_LOGS else path
+        try:
+            writer = writer_cls(path, headers, sync=SyncPolicy(FSYNC_EVERY_ROWS, FSYNC_INTERVAL_S))
+        except IOError as e:
+            print(f"FEHLER: Konnte {path} nicht öffnen: {e}")
+            sys.exit(1)
+        if writer.recovered_bytes:
+            print(f"WARNUNG: {writer.recovered_bytes} Bytes unvollständiger Daten am Ende von {path} entfernt "
+                  f"(vorheriger Lauf abgebrochen).")
+        if SEGMENTED_LOGS:
+            print(f"Schreibe in {path}/ (Segment {writer.log.segment}).")
+        else:
+            print(f"Schreibe in {path}.")
+        writers.append(writer)
+    uwb_writer, imu_writer = writers
+
+def start_writer_thread(queue_size=QUEUE_SIZE, policy=QUEUE_FULL_POLICY):
+    global writer_thread
+    writer_thread = WriterThread([uwb_writer, imu_writer], queue_size, policy)
+    writer_thread.start()
+
+def close_writers():
+    """Arbeitet die Warteschlange ab, schreibt die gepufferten Zeilen und schließt die Dateien."""
+    if writer_thread is not None and writer_thread.is_alive():
+        writer_thread.stop()
+        print(writer_thread.format_stats())
+    for writer in (uwb_writer, imu_writer):
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"FEHLER: {writer.path} konnte nicht geschlossen werden: {e!r}")
+                continue
+            print(f"{writer.rows_written} Zeilen in {writer.path} ({writer.flushes} Schreibvorgänge).")
+            if isinstance(writer, SegmentedCsvWriter) and writer.compression and writer.log.bytes_out:
+                print(f"  Komprimierung {writer.compression}: {writer.log.bytes_in / writer.log.bytes_out:.1f}:1 "
+                      f"({writer.log.bytes_out / 1e6:.2f} MB)")
+
+def parse_uwb_payload(payload):
+    """UWB-Payload (bytes) im Text- oder Binärformat (siehe payload_codec.py) -> CSV-Zeilen."""
+    rows = codec.uwb_rows(payload)
+    if rows is None:
+        print(f"Überspringe fehlerhafte {'binäre ' if is_binary(payload) else ''}UWB-Daten: {payload[:100]!r}")
+        return []
+    return rows
+
+def parse_imu_payload(payload):
+    """
+    IMU-Payload (bytes) mit einem oder mehreren Samples, Text oder binär (siehe payload_codec.py) -> CSV-Zeilen.
+    Textzeilen werden unverändert übernommen (kein Umweg über float), Binär-Blöcke in einem Schritt dekodiert.
+    """
+    rows = codec.imu_rows(payload)
+    if rows is None:
+        print(f"Überspringe fehlerhafte {'binäre ' if is_binary(payload) else ''}IMU-Daten: {payload[:100]!r}")
+        return []
+    return rows
 
 # --- MQTT Callback-Funktionen ---
 
@@ -118,41 +363,24 @@ def on_connect(client, userdata, flags, rc):
 def on_message(client, userdata, msg):
     """Wird aufgerufen, wenn eine Nachricht auf einem abonnierten Topic empfangen wird."""
     try:
-        payload_str = msg.payload.decode('utf-8')
-        
         if msg.topic == UWB_TOPIC:
-            csv_rows = parse_uwb_data(payload_str)
+            csv_rows = parse_uwb_payload(msg.payload)
             if csv_rows:
-                with open(UWB_CSV_FILE, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerows(csv_rows) 
-                            
+                writer_thread.put(uwb_writer, csv_rows)
+
         elif msg.topic == IMU_TOPIC:
-            csv_row = parse_imu_data(payload_str)
-            if csv_row:
-                with open(IMU_CSV_FILE, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(csv_row)
-                    
+            csv_rows = parse_imu_payload(msg.payload)
+            if csv_rows:
+                writer_thread.put(imu_writer, csv_rows)
+
     except Exception as e:
         print(f"Ein Fehler ist in on_message aufgetreten: {e}")
 
 def main():
-    
-    if os.path.exists(UWB_CSV_FILE):
-        try:
-            os.remove(UWB_CSV_FILE)
-            print(f"Alte Datei '{UWB_CSV_FILE}' erfolgreich gelöscht.")
-        except OSError as e:
-            print(f"FEHLER: Konnte '{UWB_CSV_FILE}' nicht löschen: {e}")
-            
-    if os.path.exists(IMU_CSV_FILE):
-        try:
-            os.remove(IMU_CSV_FILE)
-            print(f"Alte Datei '{IMU_CSV_FILE}' erfolgreich gelöscht.")
-        except OSError as e:
-            print(f"FEHLER: Konnte '{IMU_CSV_FILE}' nicht löschen: {e}")
-    check_and_write_headers()
+    open_writers()
+    start_writer_thread()
+    # SIGTERM (z.B. systemd, docker stop) wie Strg+C behandeln, damit der Puffer geschrieben wird
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     # MQTT-Client initialisieren
     client = mqtt.Client()
@@ -165,12 +393,24 @@ def main():
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
     except Exception as e:
         print(f"Konnte nicht mit MQTT-Broker verbinden: {e}")
+        close_writers()
         sys.exit(1)
+    # Netzwerk-Schleife im Hintergrund-Thread, hier nur die Ausgabe der Kennzahlen;
+    # endet, sobald der Schreib-Thread wegen eines Fehlers aufgibt
+    client.loop_start()
     try:
-        client.loop_forever()
+        while not writer_thread.failed.wait(STATS_INTERVAL_S):
+            print(writer_thread.format_stats())
+            print(codec.format_stats())
+        print(writer_thread.format_stats())
+        print("Logger gestoppt, da nicht mehr geschrieben werden kann.")
+        sys.exit(1)
     except KeyboardInterrupt:
         print("\nLogger gestoppt. Auf Wiedersehen.")
+    finally:
+        client.loop_stop()
         client.disconnect()
+        close_writers()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,349 @@
+import collections
+import struct
+import numpy as np
+
+# --- Payload-Formate ---
+# Text (bisherige Firmware, imu.cpp / uwb.cpp):
+#   IMU: "%llu;%f,%f,%f;%f,%f,%f,%f"  -> timestamp_ns; ax,ay,az; qw,qx,qy,qz
+#   UWB: "%llu;%llx,%.2f;..."         -> timestamp_ns; mac,distanz; ...
+# Binär (feste Struktur, little-endian, ohne Ausrichtung):
+#   Kopf:  uint8 BINARY_MAGIC, uint8 Typ ('I' oder 'U')
+#   IMU:   uint64 timestamp_ns, float32 ax, ay, az, qw, qx, qy, qz                 -> 38 Bytes
+#   UWB:   uint64 timestamp_ns, uint8 Anzahl n, n x (uint64 mac, float32 distanz) -> 11 + 12 n Bytes
+# Text-Payloads beginnen immer mit einer Ziffer, BINARY_MAGIC ist kein ASCII-Zeichen; daran wird erkannt.
+# IMU-Frames mit mehreren Samples pro Nachricht:
+#   Text:  IMU-Zeilen wie oben, durch '\n' getrennt
+#   Binär: Kopf (Typ 'M'), uint16 Anzahl n, n x (uint64 timestamp_ns, float32 ax, ay, az, qw, qx, qy, qz) -> 4 + 36 n Bytes
+#   Dekodiert: (timestamps int64 [n], values float64 [n, 7]) mit den Spalten IMU_COLUMNS
+BINARY_MAGIC = 0xA5
+IMU_TYPE = ord('I')
+IMU_BLOCK_TYPE = ord('M')
+UWB_TYPE = ord('U')
+IMU_FIELDS = 8                    # Werte pro IMU-Sample im Payload
+
+IMU_STRUCT = struct.Struct('<BBQ7f')
+IMU_BLOCK_HEAD_STRUCT = struct.Struct('<BBH')
+IMU_WIRE_DTYPE = np.dtype([('timestamp_ns', '<u8'), ('values', '<f4', (7,))])   # values: ax, ay, az, qw, qx, qy, qz
+IMU_COLUMNS = ['qw', 'qx', 'qy', 'qz', 'ax', 'ay', 'az']      # Reihenfolge der Werte in den Frames (wie die CSV)
+_WIRE_TO_COLUMNS = [3, 4, 5, 6, 0, 1, 2]
+UWB_HEAD_STRUCT = struct.Struct('<BBQB')
+UWB_RANGE_STRUCT = struct.Struct('<Qf')
+_uwb_structs = {}
+_mac_names = {}                   # uint64 -> Hex-String, die Anker wiederholen sich in jeder Nachricht
+
+# Typisierte Datensätze (Tupel, Feldzugriff per Name oder Position). In den Dekodierern direkt über
+# tuple.__new__ erzeugt, das spart den Python-Konstruktor der namedtuple (~40 % bei IMU binär)
+ImuSample = collections.namedtuple('ImuSample', ['timestamp_ns'] + IMU_COLUMNS)
+UwbFrame = collections.namedtuple('UwbFrame', ['timestamp_ns', 'ranges'])                # ranges: [(mac, distanz)]
+UwbAnchors = collections.namedtuple('UwbAnchors', ['timestamp_ns', 'ranges', 'unknown'])  # ranges: [(index, distanz)]
+
+
+def is_binary(payload):
+    return len(payload) > 0 and payload[0] == BINARY_MAGIC
+
+def _uwb_struct(n):
+    """Vorkompiliertes Struct für einen UWB-Payload mit n Ankern (je Anzahl einmal erzeugt)."""
+    if n not in _uwb_structs:
+        _uwb_structs[n] = struct.Struct('<BBQB' + 'Qf' * n)
+    return _uwb_structs[n]
+
+def _mac_name(mac):
+    _mac_names[mac] = format(mac, 'x')
+    return _mac_names[mac]
+
+
+# --- Dekodieren ---
+# IMU: ImuSample (timestamp_ns, qw, qx, qy, qz, ax, ay, az) in der Spaltenreihenfolge der CSV-Dateien
+# UWB: UwbFrame (timestamp_ns, [(mac, distanz), ...]) mit mac als Hex-String wie in der Firmware ('%llx')
+# Fehlerhafte Payloads liefern None. Wohlgeformte Payloads lösen keine Ausnahme aus; Ausnahmen (falsche
+# Anzahl Felder, ungültige Zahlen oder Zeichen) gibt es nur auf dem Fehlerpfad, die try-Blöcke selbst kosten nichts.
+
+def decode_imu(payload):
+    """IMU-Payload (bytes) im Binär- oder Textformat dekodieren."""
+    if is_binary(payload):
+        return decode_imu_binary(payload)
+    return decode_imu_text(payload)
+
+def decode_uwb(payload):
+    """UWB-Payload (bytes) im Binär- oder Textformat dekodieren."""
+    if is_binary(payload):
+        return decode_uwb_binary(payload)
+    return decode_uwb_text(payload)
+
+def decode_imu_binary(payload):
+    if len(payload) != IMU_STRUCT.size:
+        return None
+    _, kind, ts, ax, ay, az, qw, qx, qy, qz = IMU_STRUCT.unpack(payload)
+    if kind != IMU_TYPE:
+        return None
+    return tuple.__new__(ImuSample, (ts, qw, qx, qy, qz, ax, ay, az))
+
+def _unpack_uwb_binary(payload):
+    """Binärer UWB-Payload -> (timestamp_ns, macs als uint64, distanzen), sonst None."""
+    if len(payload) < UWB_HEAD_STRUCT.size:
+        return None
+    _, kind, ts, n = UWB_HEAD_STRUCT.unpack_from(payload)
+    if kind != UWB_TYPE or len(payload) != UWB_HEAD_STRUCT.size + n * UWB_RANGE_STRUCT.size:
+        return None
+    values = _uwb_struct(n).unpack(payload)
+    return ts, values[4::2], values[5::2]
+
+def decode_uwb_binary(payload):
+    unpacked = _unpack_uwb_binary(payload)
+    if unpacked is None:
+        return None
+    ts, macs, dists = unpacked
+    ranges = [(_mac_names.get(mac) or _mac_name(mac), dist) for mac, dist in zip(macs, dists)]
+    return tuple.__new__(UwbFrame, (ts, ranges))
+
+def decode_imu_frame(payload):
+    """
+    IMU-Payload mit einem oder mehreren Samples (Text, Binär einzeln oder Binär-Block) in einem
+    vektorisierten Schritt dekodieren: (timestamps int64 [n], values float64 [n, 7] in IMU_COLUMNS), sonst None.
+    """
+    if is_binary(payload):
+        if len(payload) > 1 and payload[1] == IMU_BLOCK_TYPE:
+            return decode_imu_block(payload)
+        sample = decode_imu_binary(payload)
+        if sample is None:
+            return None
+        return np.array([sample[0]], dtype=np.int64), np.array([sample[1:]], dtype=np.float64)
+    return decode_imu_text_frame(payload)
+
+def decode_imu_block(payload):
+    if len(payload) < IMU_BLOCK_HEAD_STRUCT.size:
+        return None
+    _, kind, n = IMU_BLOCK_HEAD_STRUCT.unpack_from(payload)
+    if kind != IMU_BLOCK_TYPE or len(payload) != IMU_BLOCK_HEAD_STRUCT.size + n * IMU_WIRE_DTYPE.itemsize:
+        return None
+    samples = np.frombuffer(payload, dtype=IMU_WIRE_DTYPE, count=n, offset=IMU_BLOCK_HEAD_STRUCT.size)
+    return samples['timestamp_ns'].astype(np.int64), samples['values'][:, _WIRE_TO_COLUMNS].astype(np.float64)
+
+def decode_imu_text_frame(payload):
+    """
+    Eine oder mehrere Textzeilen: alle Felder mit einem split trennen, die Werte in einem Aufruf
+    umwandeln und als [n, 7]-Block umsortieren (Zeitstempel getrennt als int, float64 wäre zu ungenau).
+    """
+    payload = payload.strip()
+    n = payload.count(b'\n') + 1
+    if payload.count(b';') != 2 * n or payload.count(b',') != 5 * n:
+        return None
+    fields = payload.replace(b';', b',').replace(b'\n', b',').split(b',')
+    try:
+        timestamps = np.array(list(map(int, fields[0::IMU_FIELDS])), dtype=np.int64)
+        del fields[0::IMU_FIELDS]
+        values = np.array(list(map(float, fields))).reshape(n, IMU_FIELDS - 1)
+    except ValueError:
+        return None
+    return timestamps, values[:, _WIRE_TO_COLUMNS]
+
+def decode_imu_text(payload):
+    if payload.count(b';') != 2 or payload.count(b',') != 5:
+        return None
+    ts, ax, ay, az, qw, qx, qy, qz = payload.replace(b';', b',').split(b',')
+    try:
+        return tuple.__new__(ImuSample, (int(ts), float(qw), float(qx), float(qy), float(qz), float(ax), float(ay),
+                                         float(az)))
+    except ValueError:
+        return None
+
+def _split_uwb_text(payload):
+    """
+    UWB-Textpayload -> (timestamp, [[timestamp, mac, distanz], ...]) als Strings, sonst None. Leere
+    Einträge (z.B. nach dem abschließenden ';') werden übersprungen, jeder andere muss genau ein ','
+    enthalten; sonst wird der ganze Payload verworfen.
+    """
+    try:
+        parts = payload.decode('ascii').strip().split(';')
+        ts = parts[0]
+        if len(parts) < 2 or not ts.isdigit():
+            return None
+        rows = []
+        for entry in parts[1:]:
+            if entry:
+                mac, dist = entry.split(',')
+                rows.append([ts, mac, dist])
+        return ts, rows
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def decode_uwb_text(payload):
+    split = _split_uwb_text(payload)
+    if split is None:
+        return None
+    ts, rows = split
+    try:
+        return tuple.__new__(UwbFrame, (int(ts), [(mac, float(dist)) for _, mac, dist in rows]))
+    except ValueError:
+        return None
+
+def decode_uwb_anchors(payload, anchor_index):
+    """
+    UWB-Payload (Text oder binär) direkt auf Anker-Indizes abbilden: UwbAnchors(timestamp_ns,
+    [(index, distanz)], Anzahl unbekannter MACs), sonst None. anchor_index siehe anchor_lookup().
+    """
+    ranges = []
+    n = 0
+    if is_binary(payload):
+        unpacked = _unpack_uwb_binary(payload)
+        if unpacked is None:
+            return None
+        ts, macs, dists = unpacked
+        for mac, dist in zip(macs, dists):
+            index = anchor_index.get(mac)
+            if index is not None:
+                ranges.append((index, dist))
+        return tuple.__new__(UwbAnchors, (ts, ranges, len(macs) - len(ranges)))
+    # Text: wie _split_uwb_text, aber ohne Zwischenlisten direkt auf die Indizes
+    try:
+        parts = payload.decode('ascii').strip().split(';')
+        ts = parts[0]
+        if len(parts) < 2 or not ts.isdigit():
+            return None
+        for entry in parts[1:]:
+            if entry:
+                mac, dist = entry.split(',')
+                n += 1
+                index = anchor_index.get(mac)
+                if index is not None:
+                    ranges.append((index, float(dist)))
+        return tuple.__new__(UwbAnchors, (int(ts), ranges, n - len(ranges)))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def anchor_lookup(macs):
+    """
+    Vorab berechnete Zuordnung MAC -> Anker-Index für decode_uwb_anchors, für beide Formate:
+    Hex-String wie im Textpayload und uint64 wie im Binärpayload.
+    """
+    lookup = {}
+    for index, mac in enumerate(macs):
+        lookup[mac] = index
+        lookup[int(mac, 16)] = index
+    return lookup
+
+
+# --- Kodieren (Referenz für die Firmware, Tests und Benchmarks) ---
+
+def encode_imu_binary(ts, ax, ay, az, qw, qx, qy, qz):
+    return IMU_STRUCT.pack(BINARY_MAGIC, IMU_TYPE, ts, ax, ay, az, qw, qx, qy, qz)
+
+def encode_imu_block(timestamps, values):
+    """timestamps [n], values [n, 7] in IMU_COLUMNS -> binärer IMU-Block."""
+    samples = np.empty(len(timestamps), dtype=IMU_WIRE_DTYPE)
+    samples['timestamp_ns'] = timestamps
+    samples['values'][:, _WIRE_TO_COLUMNS] = values
+    return IMU_BLOCK_HEAD_STRUCT.pack(BINARY_MAGIC, IMU_BLOCK_TYPE, len(samples)) + samples.tobytes()
+
+def encode_uwb_binary(ts, ranges):
+    """ranges: [(mac als Hex-String oder int, distanz), ...]"""
+    values = []
+    for mac, dist in ranges:
+        values += [int(mac, 16) if isinstance(mac, str) else mac, dist]
+    return _uwb_struct(len(ranges)).pack(BINARY_MAGIC, UWB_TYPE, ts, len(ranges), *values)
+
+
+# --- CSV-Zeilen (Spalten und Zahlenformat wie die Textpayloads der Firmware: %f bzw. 2 Nachkommastellen) ---
+
+def imu_csv_row(sample):
+    ts, qw, qx, qy, qz, ax, ay, az = sample
+    return [str(ts), f'{qw:f}', f'{qx:f}', f'{qy:f}', f'{qz:f}', f'{ax:f}', f'{ay:f}', f'{az:f}']
+
+def imu_csv_rows(frame):
+    """CSV-Zeilen aller Samples eines IMU-Frames (siehe decode_imu_frame)."""
+    timestamps, values = frame
+    return [imu_csv_row((ts,) + tuple(v)) for ts, v in zip(timestamps.tolist(), values.tolist())]
+
+def uwb_csv_rows(frame):
+    ts, ranges = frame
+    ts = str(ts)
+    return [[ts, mac, f'{dist:.2f}'] for mac, dist in ranges]
+
+def imu_text_rows(payload):
+    """IMU-Textzeilen unverändert als CSV-Zeilen (ohne Umweg über float), sonst None."""
+    try:
+        lines = payload.decode('ascii').strip().split('\n')
+    except UnicodeDecodeError:
+        return None
+    rows = []
+    for line in lines:
+        parts = line.split(';')
+        if len(parts) != 3:
+            return None
+        acc, quat = parts[1].split(','), parts[2].split(',')
+        if len(acc) != 3 or len(quat) != 4:
+            return None
+        rows.append([parts[0], *quat, *acc])
+    return rows
+
+def uwb_text_rows(payload):
+    """UWB-Textpayload unverändert als CSV-Zeilen, sonst None."""
+    split = _split_uwb_text(payload)
+    return None if split is None else split[1]
+
+
+# --- Gemeinsamer Einstieg für die Subscriber ---
+
+class PayloadCodec:
+    """
+    Dekodiert IMU- und UWB-Payloads beider Formate für mqtt_sub.py, ingest_service.py, timestream.py,
+    position_plotter.py und ground_truth.py und zählt fehlerhafte Nachrichten je Payload-Typ und Format.
+    Fehlerhafte Payloads liefern None; wie sie gemeldet werden, entscheidet der Aufrufer.
+    """
+
+    def __init__(self, anchor_macs=()):
+        self.anchor_macs = list(anchor_macs)
+        self.anchor_index = anchor_lookup(self.anchor_macs)
+        self.errors = collections.Counter()       # 'imu_text', 'imu_binary', 'uwb_text', 'uwb_binary' -> Anzahl
+        self.unknown_macs = 0                     # Distanzen zu Ankern außerhalb von anchor_macs
+
+    def imu_frame(self, payload):
+        """(timestamps [n], values [n, 7]), siehe decode_imu_frame."""
+        frame = decode_imu_frame(payload)
+        if frame is None:
+            self.errors['imu_binary' if is_binary(payload) else 'imu_text'] += 1
+        return frame
+
+    def imu_rows(self, payload):
+        """CSV-Zeilen; Textzeilen werden unverändert übernommen, Binär-Frames formatiert."""
+        if is_binary(payload):
+            frame = decode_imu_frame(payload)
+            if frame is None:
+                self.errors['imu_binary'] += 1
+                return None
+            return imu_csv_rows(frame)
+        rows = imu_text_rows(payload)
+        if rows is None:
+            self.errors['imu_text'] += 1
+        return rows
+
+    def uwb(self, payload):
+        frame = decode_uwb(payload)
+        if frame is None:
+            self.errors['uwb_binary' if is_binary(payload) else 'uwb_text'] += 1
+        return frame
+
+    def uwb_rows(self, payload):
+        if is_binary(payload):
+            frame = decode_uwb_binary(payload)
+            if frame is None:
+                self.errors['uwb_binary'] += 1
+                return None
+            return uwb_csv_rows(frame)
+        rows = uwb_text_rows(payload)
+        if rows is None:
+            self.errors['uwb_text'] += 1
+        return rows
+
+    def uwb_anchors(self, payload):
+        """UwbAnchors mit Indizes in anchor_macs, siehe decode_uwb_anchors."""
+        frame = decode_uwb_anchors(payload, self.anchor_index)
+        if frame is None:
+            self.errors['uwb_binary' if is_binary(payload) else 'uwb_text'] += 1
+        elif frame.unknown:
+            self.unknown_macs += frame.unknown
+        return frame
+
+    def format_stats(self):
+        errors = ', '.join(f'{kind} {n}' for kind, n in sorted(self.errors.items())) or 'keine'
+        return f"Fehlerhafte Payloads: {errors}, Distanzen zu unbekannten Ankern: {self.unknown_macs}"
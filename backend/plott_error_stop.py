@@ -2,10 +2,11 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from storage import read_table
 
 try:
     gt_df = pd.read_csv('mqtt_ground_truth.csv')
-    trilat_df = pd.read_csv('trilat_results.csv')
+    trilat_df = read_table('trilat_results.csv', columns=['timestamp_ns', 'pos_x', 'pos_y'])
 
     trilat_df['timestamp_ns'] = trilat_df['timestamp_ns'].astype('int64')
 
@@ -5,7 +5,9 @@ import numpy as np
 import paho.mqtt.client as mqtt
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtWidgets, QtCore, QtGui
-from scipy.optimize import least_squares 
+from trilateration import project_to_2d, solve_analytic, TrilaterationCache
+from distance_field import load_distance_field
+from payload_codec import PayloadCodec
 
 # --- MQTT-Konfiguration ---
 MQTT_BROKER = ""
@@ -28,40 +30,34 @@ ROOM_X_DIM = 2.9
 ROOM_Y_DIM = 4.1
 TAG_HEIGHT = 0.015 
 
+# Schneller Solver (analytische Jacobi-Matrix, max. Iterationen begrenzt) im 50-ms-Timer
+LIVE_SOLVER = solve_analytic
+
 # --- Globale Variablen ---
 POSITION_HISTORY_LENGTH = 200 
 current_distances = {}
 current_quaternion = None
 position_history = deque(maxlen=POSITION_HISTORY_LENGTH)
 data_lock = threading.Lock()
+codec = PayloadCodec(KNOWN_MACS)
 circle_plots = {}
 
 last_pos = np.array([2.07, 0.70]) 
+position_cache = TrilaterationCache()
+# Globaler Startwert aus dem vorberechneten Distanzfeld nach Sprüngen/Ausfällen
+distance_field = load_distance_field(list(ANCHOR_POSITIONS.values()), TAG_HEIGHT, ROOM_X_DIM, ROOM_Y_DIM)
 
 # --- Berechnungsfunktionen ---
 
-def project_to_2d(dist_3d, anchor_h, tag_h):
-    """Projiziert 3D-Distanz auf 2D-Ebene basierend auf Höhendifferenz."""
-    h_diff = abs(anchor_h - tag_h)
-    if dist_3d < h_diff:
-        return 0.01 # Physikalischer Fehler 
-    return np.sqrt(dist_3d**2 - h_diff**2)
-
-def trilateration_residuals(pos_2d, anchor_positions_2d, distances_2d):
-    """Residuen-Funktion für Least-Squares Optimierung."""
-    residuals = []
-    for i, anchor_pos in enumerate(anchor_positions_2d):
-        dist_pred = np.linalg.norm(pos_2d - anchor_pos)
-        residuals.append(dist_pred - distances_2d[i])
-    return residuals
-
 def calculate_position(distances_dict):
     """
-    Berechnet die 2D-Position mittels 'least_squares', 
+    Berechnet die 2D-Position mit LIVE_SOLVER (Warmstart von last_pos),
     basierend auf dem Algorithmus von Skript 1.
     """
     global last_pos 
 
+    active_macs = []
+    active_raw = []
     active_anchors_2d = []
     active_dists_2d = []
 
@@ -72,26 +68,26 @@ def calculate_position(distances_dict):
 
             dist_2d = project_to_2d(dist_raw, anchor_pos_3d[2], TAG_HEIGHT)
             
+            active_macs.append(mac)
+            active_raw.append(dist_raw)
             active_anchors_2d.append(anchor_pos_3d[:2]) # Nur (x, y)
             active_dists_2d.append(dist_2d)
     if len(active_dists_2d) < 3:
         return None 
+    # 2. Startwert: last_pos, oder Gitter-Lookup wenn last_pos nicht zu den Distanzen passt
+    raw_ranges = np.array([distances_dict.get(mac, np.nan) for mac in ANCHOR_POSITIONS])
+    x_start = distance_field.initial_guess(raw_ranges, last_pos)
+
+    # 3. Gleiche Distanz-Tupel (z.B. im Stillstand) aus dem Cache bedienen
     try:
-        res = least_squares(
-            trilateration_residuals, 
-            last_pos, 
-            args=(np.array(active_anchors_2d), np.array(active_dists_2d)),
-            method='lm' 
-        )
-        
-        if res.success:
-            pos_est = res.x
-            last_pos = pos_est 
-            return pos_est
-        else:
-            return None # Optimierung fehlgeschlagen
+        pos_est = position_cache.solve(active_macs, active_raw, active_anchors_2d, active_dists_2d, x_start,
+                                       solver=LIVE_SOLVER)
     except Exception:
         return None
+    if pos_est is None:
+        return None # Optimierung fehlgeschlagen
+    last_pos = pos_est 
+    return pos_est
 
 # --- Orientierungsfunktion ---
 def get_orientation_vectors(q):
@@ -117,42 +113,26 @@ def get_orientation_vectors(q):
 
 # --- MQTT-Datenparser ---
 
-def parse_uwb_data(payload_str):
+def parse_uwb_data(payload):
     global current_distances
-    try:
-        parts = payload_str.strip().split(';')
-        if len(parts) < 2: return
-        
-        with data_lock:
-            for device_data in parts[1:]:
-                if not device_data: continue
-                mac, dist_str = device_data.split(',')
-                if mac in KNOWN_MACS:
-                    current_distances[mac] = float(dist_str)
-                    
-    except Exception:
-        pass 
+    frame = codec.uwb_anchors(payload)
+    if frame is None: return
+
+    with data_lock:
+        for mac_index, distance in frame.ranges:
+            current_distances[KNOWN_MACS[mac_index]] = distance
 
-def parse_imu_data(payload_str):
+def parse_imu_data(payload):
+    """IMU-Payload (ein oder mehrere Samples, siehe payload_codec.py); angezeigt wird nur das neueste."""
     global current_quaternion
-    try:
-        parts = payload_str.strip().split(';')
-        if len(parts) != 3: return
-        q_parts = parts[2].split(',')
-        if len(q_parts) != 4: return
-        
-        qw = float(q_parts[0])
-        qx = float(q_parts[1])
-        qy = float(q_parts[2])
-        qz = float(q_parts[3])
-        
-        with data_lock:
-            norm = np.sqrt(qw**2 + qx**2 + qy**2 + qz**2)
-            if norm > 1e-6:
-                current_quaternion = [qw/norm, qx/norm, qy/norm, qz/norm]
-                
-    except Exception:
-        pass
+    frame = codec.imu_frame(payload)
+    if frame is None: return
+    qw, qx, qy, qz = frame[1][-1, :4].tolist()
+
+    with data_lock:
+        norm = np.sqrt(qw**2 + qx**2 + qy**2 + qz**2)
+        if norm > 1e-6:
+            current_quaternion = [qw/norm, qx/norm, qy/norm, qz/norm]
 
 # --- MQTT-Callbacks und Thread  ---
 
@@ -166,11 +146,10 @@ def on_connect(client, userdata, flags, rc):
 
 def on_message(client, userdata, msg):
     try:
-        payload_str = msg.payload.decode('utf-8')
         if msg.topic == UWB_TOPIC:
-            parse_uwb_data(payload_str)
+            parse_uwb_data(msg.payload)
         elif msg.topic == IMU_TOPIC:
-            parse_imu_data(payload_str)
+            parse_imu_data(msg.payload)
     except Exception:
         pass 
 
@@ -450,4 +429,6 @@ if __name__ == '__main__':
     timer.start(50) 
 
     win.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+    print(position_cache.format_stats())
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,216 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from merge_engine import anchor_column
+from segment_log import resolve_log, INDEX_FILE
+
+# --- Konfiguration ---
+IMU_RATE_HZ = 50.0
+UWB_RATE_HZ = 5.0                 # Erwartete Messrate pro Anker
+GAP_FACTOR = 1.5                  # Lücke: Abstand > GAP_FACTOR * erwarteter Abstand (wie sample_rate_imu_data.py)
+DELTA_HIST_RANGE_S = (0.0, 0.05)  # Histogramm der Zeitabstände (wie im Plot von sample_rate_imu_data.py)
+DELTA_HIST_BINS = 100
+
+
+def quality_index_path(output_file):
+    """Sidecar zum gemergten Artefakt: 'merged_imu_uwb_data.csv' -> 'merged_imu_uwb_data.quality.json'."""
+    return os.path.splitext(output_file)[0] + '.quality.json'
+
+def _empty_stream(rate_hz):
+    return {'rate_hz': rate_hz, 'gap_ns': GAP_FACTOR * 1e9 / rate_hz,
+            'count': 0, 'first_ns': None, 'last_ns': None, 'first_second': None, 'per_second': [], 'gaps': [],
+            'delta_min_ns': None, 'delta_max_ns': None, 'delta_sum_ns': 0,
+            'delta_hist': [0] * DELTA_HIST_BINS, 'delta_overflow': 0}
+
+def _add_to_stream(stream, ts):
+    """Zählt einen zeitlich sortierten Block eines Stroms (Sekundenzählung, Lücken, Zeitabstände)."""
+    if len(ts) == 0:
+        return
+    previous = [] if stream['last_ns'] is None else [stream['last_ns']]
+    with_prev = np.concatenate([np.array(previous, dtype=np.int64), ts])
+    deltas = np.diff(with_prev)
+    if stream['first_ns'] is None:
+        stream['first_ns'] = int(ts[0])
+    stream['last_ns'] = int(ts[-1])
+    stream['count'] += len(ts)
+
+    seconds = ts // 1_000_000_000
+    if stream['first_second'] is None:
+        stream['first_second'] = int(seconds[0])
+    counts = np.bincount(seconds - stream['first_second'])
+    per_second = np.zeros(max(len(counts), len(stream['per_second'])), dtype=np.int64)
+    per_second[:len(stream['per_second'])] = stream['per_second']
+    per_second[:len(counts)] += counts
+    stream['per_second'] = per_second.tolist()
+
+    if len(deltas):
+        gaps = np.flatnonzero(deltas > stream['gap_ns'])
+        stream['gaps'] += [[int(with_prev[i]), int(with_prev[i + 1])] for i in gaps]
+        known = [] if stream['delta_min_ns'] is None else [stream['delta_min_ns'], stream['delta_max_ns']]
+        stream['delta_min_ns'] = int(min([deltas.min()] + known))
+        stream['delta_max_ns'] = int(max([deltas.max()] + known))
+        stream['delta_sum_ns'] += int(deltas.sum())
+        hist, _ = np.histogram(deltas / 1e9, bins=DELTA_HIST_BINS, range=DELTA_HIST_RANGE_S)
+        stream['delta_hist'] = (np.asarray(stream['delta_hist']) + hist).tolist()
+        stream['delta_overflow'] += int((deltas / 1e9 >= DELTA_HIST_RANGE_S[1]).sum())
+
+
+def log_signature(path):
+    """
+    Stand eines Logs (Einzel-CSV oder Segment-Ordner, bei diesem der Index): Pfad, Größe und
+    Änderungszeit. Ändern sich diese, ist ein daraus gebauter Qualitätsindex veraltet. None, wenn es fehlt.
+    """
+    try:
+        path, segmented = resolve_log(path)
+    except FileNotFoundError:
+        return None
+    stat = os.stat(os.path.join(path, INDEX_FILE) if segmented else path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class QualityIndexBuilder:
+    """
+    Sammelt während des Merges je Datenstrom (IMU und jeder Anker) Empfangszahlen pro Sekunde,
+    Lücken und Zeitabstände, ohne die Rohdaten erneut zu lesen. Blöcke müssen je Strom in
+    zeitlicher Reihenfolge kommen (wie beim Streaming-Merge); finish() ergänzt die
+    Merge-Statistik (Toleranzverfehlungen, Kollisionen) und liefert den Index als dict.
+
+    sources: gelesene Logs je Strom, z.B. {'imu': 'imu_data_1.csv', 'uwb': [...]}, time_range: (t0, t1),
+    falls nur ein Zeitraum gemergt wird. Beides kommt in den Index, damit Leser einen veralteten
+    oder unvollständigen Index erkennen (load_quality_index). Der Stand der Logs wird schon hier,
+    vor dem Lesen, festgehalten: später angehängte Zeilen machen den Index ungültig.
+    """
+
+    def __init__(self, tolerance_ns=None, state=None, sources=None, time_range=None):
+        self.state = state or {'tolerance_ns': tolerance_ns, 'imu': _empty_stream(IMU_RATE_HZ),
+                               'anchors': {}}
+        self.sources = {kind: [log_signature(p) for p in ([paths] if isinstance(paths, str) else paths)]
+                        for kind, paths in (sources or {}).items()}
+        self.time_range = None if time_range is None else [int(t) for t in time_range]
+
+    def add_imu(self, imu_ts):
+        _add_to_stream(self.state['imu'], np.asarray(imu_ts, dtype=np.int64))
+
+    def add_uwb(self, uwb_ts, macs):
+        """uwb_ts: (bei Uhrenabgleich bereits korrigierte) Zeitstempel, macs: MAC-Adresse je Messung."""
+        codes, unique_macs = pd.factorize(pd.Series(macs))
+        uwb_ts = np.asarray(uwb_ts, dtype=np.int64)
+        order = np.lexsort((uwb_ts, codes))
+        bounds = np.searchsorted(codes[order], np.arange(len(unique_macs) + 1))
+        for code, mac in enumerate(unique_macs):
+            col = anchor_column(mac)
+            if col not in self.state['anchors']:
+                self.state['anchors'][col] = {'mac': mac, **_empty_stream(UWB_RATE_HZ)}
+            _add_to_stream(self.state['anchors'][col], uwb_ts[order[bounds[code]:bounds[code + 1]]])
+
+    def finish(self, stats, outputs=None):
+        """
+        Index als dict; stats ist die Zuordnungsstatistik des Merges (siehe merge_engine).
+        outputs: bereits geschriebene Merge-Ergebnisse, z.B. {'merged': 'merged_imu_uwb_data.csv'};
+        ihr Stand kommt wie der der Logs in 'sources', damit run_ekf.py den Index prüfen kann.
+        """
+        index = json.loads(json.dumps(self.state))
+        streams = [index['imu']] + list(index['anchors'].values())
+        starts = [s['first_ns'] for s in streams if s['first_ns'] is not None]
+        ends = [s['last_ns'] for s in streams if s['last_ns'] is not None]
+        index['start_ns'] = min(starts) if starts else None
+        index['end_ns'] = max(ends) if ends else None
+        index['sources'] = {**self.sources,
+                            **{kind: [log_signature(path)] for kind, path in (outputs or {}).items()}}
+        index['time_range'] = self.time_range
+        duration_s = (index['end_ns'] - index['start_ns']) / 1e9 if starts else 0.0
+        for col, anchor in index['anchors'].items():
+            counts = stats.get(col, {})
+            anchor['tolerance_misses'] = counts.get('dropped', 0)
+            anchor['collisions'] = counts.get('collisions', 0)
+            anchor['matched'] = counts.get('matched', 0)
+            expected = duration_s * anchor['rate_hz']
+            anchor['received_percentage'] = anchor['count'] / expected * 100 if expected > 0 else 0.0
+        return index
+
+
+def write_quality_index(index, path):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_file, path)
+    return path
+
+def load_quality_index(path, window=None, **logs):
+    """
+    Index laden; None, wenn (noch) keiner geschrieben wurde oder er nicht zu den Dateien passt, die der
+    Aufrufer sonst liest (Logs z.B. uwb='uwb_data_1.csv', Merge-Ergebnis merged=...): andere Datei,
+    seitdem geändert, oder (nur bei Logs) nur ein Zeitraum gemergt, der window = (start_ns, end_ns)
+    nicht abdeckt.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        index = json.load(f)
+    sources = index.get('sources') or {}
+    for kind, log in logs.items():
+        signature = log_signature(log)
+        if signature is None or sources.get(kind) != [signature]:
+            print(f"HINWEIS: Qualitätsindex '{path}' wurde nicht aus dem aktuellen Stand von '{log}' gebaut.")
+            return None
+    time_range = index.get('time_range')
+    if {'imu', 'uwb'} & set(logs) and time_range is not None and \
+            (window is None or window[0] < time_range[0] or window[1] > time_range[1]):
+        print(f"HINWEIS: Qualitätsindex '{path}' deckt nur {time_range[0]}..{time_range[1]} ns ab.")
+        return None
+    return index
+
+def window_count(stream, start_ns=None, end_ns=None):
+    """
+    Messungen eines Stroms im Zeitfenster [start_ns, end_ns] aus der Sekundenzählung.
+    Angeschnittene Randsekunden werden anteilig gezählt.
+    """
+    per_second = np.asarray(stream['per_second'], dtype=float)
+    if len(per_second) == 0:
+        return 0.0
+    second_start = (stream['first_second'] + np.arange(len(per_second))) * 1e9
+    lo = -np.inf if start_ns is None else start_ns
+    hi = np.inf if end_ns is None else end_ns
+    # Innerhalb einer Sekunde liegen die Messungen nur zwischen erster und letzter Messung des Stroms
+    occupied_lo = np.maximum(second_start, stream['first_ns'])
+    occupied_hi = np.minimum(second_start + 1e9, stream['last_ns'] + 1)
+    overlap = np.clip(np.minimum(occupied_hi, hi + 1) - np.maximum(occupied_lo, lo), 0, None)
+    share = np.divide(overlap, occupied_hi - occupied_lo, out=np.zeros_like(overlap),
+                      where=occupied_hi > occupied_lo)
+    return float((per_second * np.clip(share, 0, 1)).sum())
+
+def received_summary(index, start_ns=None, end_ns=None, expected_rate_hz=UWB_RATE_HZ):
+    """
+    Empfangsstatistik je Anker (Spalten wie sample_rate_uwb.py, Index mac_address, mit Zeile 'Total')
+    für das Zeitfenster [start_ns, end_ns], ohne Angabe über die ganze Aufnahme.
+    """
+    start_ns = index['start_ns'] if start_ns is None else start_ns
+    end_ns = index['end_ns'] if end_ns is None else end_ns
+    duration_s = (end_ns - start_ns) / 1e9
+    expected = duration_s * expected_rate_hz
+
+    anchors = index['anchors'].values()
+    summary_df = pd.DataFrame(
+        {'actual_measurements': [round(window_count(a, start_ns, end_ns)) for a in anchors]},
+        index=pd.Index([a['mac'] for a in anchors], name='mac_address'))
+    summary_df = summary_df[summary_df['actual_measurements'] > 0].sort_index()
+    summary_df['expected_measurements'] = expected
+    summary_df['missing_measurements'] = expected - summary_df['actual_measurements']
+    summary_df['received_percentage'] = summary_df['actual_measurements'] / expected * 100
+
+    total_actual = summary_df['actual_measurements'].sum()
+    total_expected = expected * len(summary_df)
+    total_row = pd.DataFrame({'actual_measurements': total_actual, 'expected_measurements': total_expected,
+                              'missing_measurements': total_expected - total_actual,
+                              'received_percentage': total_actual / total_expected * 100 if total_expected else 0.0},
+                             index=['Total'])
+    return pd.concat([summary_df, total_row])
+
+def format_quality(index):
+    lines = []
+    for col, anchor in index['anchors'].items():
+        lines.append(f"  -> Anker {col}: {anchor['received_percentage']:.1f} % empfangen, "
+                     f"{len(anchor['gaps'])} Lücken, {anchor['tolerance_misses']} außerhalb der Toleranz, "
+                     f"{anchor['collisions']} Kollisionen.")
+    return "\n".join(lines)
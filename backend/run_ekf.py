@@ -1,13 +1,37 @@
 import numpy as np
 import pandas as pd
 from scipy.spatial.transform import Rotation as R
-import os 
+from trilateration import project_ranges_2d
+from gdop_map import load_gdop_map
+from storage import read_table, write_table, remove_artifact, resolve_artifact
+from sensor_store import SensorStore
+from merge_engine import RangeTable, load_range_table
+from quality_index import load_quality_index, format_quality
 
 # --- 1. Konfigurationen & Konstanten ---
+STORAGE_FORMAT = 'csv'  # 'csv', 'parquet' oder 'feather' für ekf_results (siehe storage.py)
+IMU_COLUMNS = ['timestamp_ns', 'qw', 'qx', 'qy', 'qz', 'ax', 'ay', 'az']
+INPUT_COLUMNS = IMU_COLUMNS + ['dist_e05a1', 'dist_48e72', 'dist_83a8d']
+MERGE_LAYOUT = 'wide'  # 'long': merged_imu.csv + merged_ranges.csv (siehe merged_imu_uwb_data.py)
+SENSOR_STORE_DIR = None  # z.B. 'sensor_store': Eingang aus dem memory-mapped Store (siehe sensor_store.py)
+TIME_RANGE_NS = (None, None)  # Nur dieses Zeitfenster [Start, Ende) verarbeiten (nur mit Sensor-Store)
+QUALITY_INDEX_FILE = 'merged_imu_uwb_data.quality.json'  # vom Merge geschrieben (siehe quality_index.py)
+MIN_RECEIVED_PERCENT = 0.0  # Anker mit geringerer Empfangsrate laut Qualitätsindex nicht verwenden
+# Merge-Ergebnis, zu dem der Qualitätsindex passen muss (auch Quelle des Sensor-Stores)
+MERGED_FILE = 'merged_imu.csv' if MERGE_LAYOUT == 'long' else 'merged_imu_uwb_data.csv'
+range_table = None
 try:
-    df = pd.read_csv('merged_imu_uwb_data.csv')
-except FileNotFoundError:
-    print("FEHLER: 'merged_imu_uwb_data.csv' nicht gefunden.")
+    if SENSOR_STORE_DIR:
+        df = SensorStore(SENSOR_STORE_DIR).frame('merged', INPUT_COLUMNS, *TIME_RANGE_NS)
+    elif MERGE_LAYOUT == 'long':
+        df = read_table(MERGED_FILE, columns=IMU_COLUMNS)
+        range_table = load_range_table('merged_ranges.csv', len(df))
+    else:
+        df = read_table(MERGED_FILE, columns=INPUT_COLUMNS)
+except FileNotFoundError as e:
+    print(f"FEHLER: '{e.filename}' nicht gefunden.")
+    if SENSOR_STORE_DIR:
+        print("Sensor-Store nach dem Merge mit build_store() (python sensor_store.py) erstellen.")
     exit()
 
 ANCHOR_POSITIONS_3D = {
@@ -26,6 +50,36 @@ for col, pos3d in ANCHOR_POSITIONS_3D.items():
     ANCHOR_POSITIONS_2D[col] = pos3d[:2] 
     ANCHOR_HEIGHTS[col] = pos3d[2]      
 
+# UWB-Messungen als Langform (Zeile, Anker, Distanz), je Zeile in ANCHOR_COLS-Reihenfolge;
+# 3D -> 2D Projektion einmal vektorisiert für alle Messungen statt pro Zeile
+ANCHOR_COLS = ['dist_83a8d', 'dist_48e72', 'dist_e05a1']
+if range_table is None:
+    range_table = RangeTable.from_wide(df[ANCHOR_COLS].to_numpy(dtype=float), ANCHOR_COLS)
+range_table = range_table.select(ANCHOR_COLS)
+
+# Nur ein Index, der beim Schreiben genau dieses Merge-Ergebnisses entstand, darf Anker ausschließen
+try:
+    merged_path = resolve_artifact(MERGED_FILE)[0]
+except FileNotFoundError:
+    merged_path = MERGED_FILE
+quality_index = load_quality_index(QUALITY_INDEX_FILE, merged=merged_path)
+if quality_index is not None:
+    print(f"Datenqualität laut '{QUALITY_INDEX_FILE}':")
+    print(format_quality(quality_index))
+    excluded = [ANCHOR_COLS.index(col) for col in ANCHOR_COLS
+                if col in quality_index['anchors']
+                and quality_index['anchors'][col]['received_percentage'] < MIN_RECEIVED_PERCENT]
+    if excluded:
+        print(f"HINWEIS: Anker {[ANCHOR_COLS[a] for a in excluded]} unter {MIN_RECEIVED_PERCENT} % Empfang, "
+              f"werden nicht verwendet.")
+        keep = ~np.isin(range_table.anchor, excluded)
+        range_table = RangeTable(range_table.imu_row[keep], range_table.anchor[keep], range_table.ranges[keep],
+                                 ANCHOR_COLS, range_table.num_rows)
+ROW_PTR = range_table.row_pointers()
+EVENT_ANCHOR = range_table.anchor
+EVENT_DISTS_2D = project_ranges_2d(range_table.ranges,
+                                   np.array([ANCHOR_HEIGHTS[col] for col in ANCHOR_COLS])[EVENT_ANCHOR], TAG_HEIGHT)
+
 # --- 2. EKF Initialisierung ---
 x_est = np.array([2.070000, 0.700000, 0.0, 0.0])
 P_est = np.eye(4) * 1.0
@@ -35,14 +89,21 @@ sigma_acc = 0.1
 Q_scale = sigma_acc**2
 sigma_uwb = 0.5   
 R_uwb = sigma_uwb**2
+
+# GDOP der Ankergeometrie als Spalte 'gdop' mitschreiben (nur Diagnose: die Geometrie steckt
+# bereits in H, eine Skalierung von R_uwb mit der HDOP würde sie doppelt zählen)
+WRITE_GDOP = False
 # -----------------------------------------------------------------
 
-if os.path.exists(OUTPUT_FILENAME):
-    try:
-        os.remove(OUTPUT_FILENAME)
-        print(f"Alte Datei '{OUTPUT_FILENAME}' erfolgreich gelöscht.")
-    except OSError as e:
-        print(f"FEHLER beim Löschen der Datei '{OUTPUT_FILENAME}': {e}")
+gdop_map = None
+if WRITE_GDOP:
+    gdop_map = load_gdop_map(list(ANCHOR_POSITIONS_3D.values()), TAG_HEIGHT)
+
+try:
+    for path in remove_artifact(OUTPUT_FILENAME):
+        print(f"Alte Datei '{path}' erfolgreich gelöscht.")
+except OSError as e:
+    print(f"FEHLER beim Löschen der Datei '{OUTPUT_FILENAME}': {e}")
 # ----------------------------------------
 
 results = []
@@ -107,24 +168,15 @@ for i, row in df.iterrows():
     P_est = P_pred
 
     # --- Korrekturschritt (UWB) ---
-    uwb_data_available = False
-    for anchor_col in ['dist_83a8d', 'dist_48e72', 'dist_e05a1']:
-        if not np.isnan(row[anchor_col]):
-            uwb_data_available = True
-            break
-    
+    first_event, end_event = ROW_PTR[i], ROW_PTR[i + 1]
+    uwb_data_available = end_event > first_event
+
     if uwb_data_available:
-        for anchor_col in ['dist_83a8d', 'dist_48e72', 'dist_e05a1']:
-            dist_3d = row[anchor_col]
-            if np.isnan(dist_3d): continue
+        for k in range(first_event, end_event):
+            anchor_col = ANCHOR_COLS[EVENT_ANCHOR[k]]
+            dist_2d_meas = EVENT_DISTS_2D[k]
 
             anchor_pos_2d = ANCHOR_POSITIONS_2D[anchor_col]
-            anchor_h = ANCHOR_HEIGHTS[anchor_col]
-
-            height_diff = abs(anchor_h - TAG_HEIGHT)
-            dist_2d_meas = 0.01
-            if dist_3d > height_diff:
-                dist_2d_meas = np.sqrt(dist_3d**2 - height_diff**2)
 
             dx = x_est[0] - anchor_pos_2d[0] 
             dy = x_est[1] - anchor_pos_2d[1] 
@@ -147,5 +199,7 @@ for i, row in df.iterrows():
 
 # --- 4. Ergebnisse speichern ---
 df_results = pd.DataFrame(results)
-df_results.to_csv(OUTPUT_FILENAME, index=False) 
-print(f"Verarbeitung abgeschlossen. Ergebnisse in '{OUTPUT_FILENAME}' gespeichert.")
\ No newline at end of file
+if WRITE_GDOP:
+    df_results['gdop'] = gdop_map.lookup(df_results['pos_x'].values, df_results['pos_y'].values)
+output_path = write_table(df_results, OUTPUT_FILENAME, STORAGE_FORMAT)
+print(f"Verarbeitung abgeschlossen. Ergebnisse in '{output_path}' gespeichert.")
\ No newline at end of file
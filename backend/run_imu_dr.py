@@ -1,27 +1,36 @@
 import numpy as np
 import pandas as pd
 from scipy.spatial.transform import Rotation as R
-import os 
+from storage import read_table, write_table, remove_artifact
+from sensor_store import SensorStore
 
 # --- 1. Konfigurationen & Konstanten ---
-INPUT_FILENAME = 'merged_imu_uwb_data.csv'
+INPUT_FILENAME = 'merged_imu_uwb_data.csv'  # Bei MERGE_LAYOUT = 'long' in merged_imu_uwb_data.py: 'merged_imu.csv'
 OUTPUT_FILENAME = 'imu_dead_reckoning.csv' 
+STORAGE_FORMAT = 'csv'  # 'csv', 'parquet' oder 'feather' (siehe storage.py)
+INPUT_COLUMNS = ['timestamp_ns', 'qw', 'qx', 'qy', 'qz', 'ax', 'ay', 'az']
+SENSOR_STORE_DIR = None  # z.B. 'sensor_store': Eingang aus dem memory-mapped Store (siehe sensor_store.py)
+TIME_RANGE_NS = (None, None)  # Nur dieses Zeitfenster [Start, Ende) verarbeiten (nur mit Sensor-Store)
 
 try:
-    df = pd.read_csv(INPUT_FILENAME)
-except FileNotFoundError:
-    print(f"FEHLER: '{INPUT_FILENAME}' nicht gefunden.")
+    if SENSOR_STORE_DIR:
+        df = SensorStore(SENSOR_STORE_DIR).frame('imu', INPUT_COLUMNS, *TIME_RANGE_NS)
+    else:
+        df = read_table(INPUT_FILENAME, columns=INPUT_COLUMNS)
+except FileNotFoundError as e:
+    print(f"FEHLER: '{e.filename}' nicht gefunden.")
+    if SENSOR_STORE_DIR:
+        print("Sensor-Store mit build_store() (python sensor_store.py) erstellen.")
     exit()
 
 # --- 2. Initialisierung ---
 x_est = np.array([2.070000, 0.700000, 0.0, 0.0])
 
-if os.path.exists(OUTPUT_FILENAME):
-    try:
-        os.remove(OUTPUT_FILENAME)
-        print(f"Alte Datei '{OUTPUT_FILENAME}' erfolgreich gelöscht.")
-    except OSError as e:
-        print(f"FEHLER beim Löschen der Datei '{OUTPUT_FILENAME}': {e}")
+try:
+    for path in remove_artifact(OUTPUT_FILENAME):
+        print(f"Alte Datei '{path}' erfolgreich gelöscht.")
+except OSError as e:
+    print(f"FEHLER beim Löschen der Datei '{OUTPUT_FILENAME}': {e}")
 # ----------------------------------------
 
 results = []
@@ -62,7 +71,7 @@ for i, row in df.iterrows():
 
 # --- 4. Ergebnisse speichern ---
 df_results = pd.DataFrame(results)
-df_results.to_csv(OUTPUT_FILENAME, index=False)
+output_path = write_table(df_results, OUTPUT_FILENAME, STORAGE_FORMAT)
 
 print(f"Verarbeitung abgeschlossen. {len(df_results)} Zeitschritte verarbeitet.")
-print(f"Ergebnisse in '{OUTPUT_FILENAME}' gespeichert.")
\ No newline at end of file
+print(f"Ergebnisse in '{output_path}' gespeichert.")
\ No newline at end of file
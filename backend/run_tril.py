@@ -1,89 +1,124 @@
 import numpy as np
 import pandas as pd
-from scipy.optimize import least_squares
-import os 
+import time
+from trilateration import TrilaterationCache, trilaterate_epochs, trilaterate_events, trilaterate_epochs_parallel, \
+    multilaterate_batch, multilaterate_robust
+from gdop_map import load_gdop_map
+from distance_field import load_distance_field
+from storage import read_table, write_table, remove_artifact
+from sensor_store import SensorStore
+from merge_engine import load_range_table
 
 ANCHOR_POSITIONS_3D = {
     "dist_e05a1": np.array([2.8, 0, 1.31]),
     "dist_48e72": np.array([0.1, 0, 2.0]),
     "dist_83a8d": np.array([1.86, 4.1, 2.10])
 }
-TAG_HEIGHT = 0.015 
-OUTPUT_FILENAME = 'trilat_results.csv' 
+TAG_HEIGHT = 0.015
+INPUT_FILENAME = 'merged_imu_uwb_data.csv'
+OUTPUT_FILENAME = 'trilat_results.csv'
+START_POS = np.array([2.07, 0.70])
 
-try:
-    df = pd.read_csv('merged_imu_uwb_data.csv')
-except FileNotFoundError:
-    print("FEHLER: 'merged_imu_uwb_data.csv' nicht gefunden.")
-    print("Bitte stellen Sie sicher, dass die Datei im selben Ordner liegt.")
-    exit()
+# 'sequential': eine Epoche nach der anderen (Warmstart von last_pos)
+# 'parallel':   Chunks im Prozess-Pool, Startwert je Chunk aus geschlossener Lösung
+# '3d':         vektorisiert über alle Epochen, schätzt z ab MIN_ANCHORS_3D Ankern
+#              (Abgleich mit 'sequential' auf den Aufnahmen: bench_trilateration.py)
+# 'robust':     vektorisiert, verwirft verfälschte Anker (LMedS) ab ROBUST_MIN_ANCHORS Ankern
+TRIL_MODE = 'sequential'
+# Auf den Aufnahmen wiederholen sich nur 2-6 % der Distanz-Tupel: Cache und Distanzfeld kosten dort
+# mehr als sie sparen (bench_trilateration.py), daher standardmäßig aus
+USE_CACHE = False     # Wiederholte Distanz-Tupel nicht erneut lösen (nur sequentiell)
+USE_GRID_INIT = False # Globaler Startwert aus dem Distanzfeld, wenn last_pos nicht passt (nur sequentiell)
+CHUNK_SIZE = 5000    # Epochen pro Chunk im parallelen Modus
+NUM_WORKERS = None   # None = alle CPU-Kerne
+MIN_ANCHORS_3D = 4   # Ab so vielen Ankern wird die Tag-Höhe mitgeschätzt ('3d')
+ROBUST_MIN_ANCHORS = 4  # Ab so vielen Ankern Teilmengen-Konsens ('robust')
+WRITE_GDOP = False   # GDOP der Ankergeometrie an jeder Position als Spalte 'gdop'
+STORAGE_FORMAT = 'csv'  # 'csv', 'parquet' oder 'feather' für trilat_results (siehe storage.py)
+SENSOR_STORE_DIR = None  # z.B. 'sensor_store': Eingang aus dem memory-mapped Store (siehe sensor_store.py)
+TIME_RANGE_NS = (None, None)  # Nur dieses Zeitfenster [Start, Ende) verarbeiten (nur mit Sensor-Store)
+MERGE_LAYOUT = 'wide'  # 'long': merged_imu.csv + merged_ranges.csv (siehe merged_imu_uwb_data.py)
 
-def project_to_2d(dist_3d, anchor_h, tag_h):
-    """Projiziert 3D-Distanz auf 2D-Ebene basierend auf Höhendifferenz."""
-    h_diff = abs(anchor_h - tag_h)
-    if dist_3d < h_diff:
-        return 0.01 
-    return np.sqrt(dist_3d**2 - h_diff**2)
 
-def trilateration_residuals(pos_2d, anchor_positions_2d, distances_2d):
-    """Residuen-Funktion für Least-Squares Optimierung."""
-    residuals = []
-    for i, anchor_pos in enumerate(anchor_positions_2d):
-        dist_pred = np.linalg.norm(pos_2d - anchor_pos)
-        residuals.append(dist_pred - distances_2d[i])
-    return residuals
+def main():
+    anchor_cols = list(ANCHOR_POSITIONS_3D.keys())
+    range_table = None
+    try:
+        if SENSOR_STORE_DIR:
+            df = SensorStore(SENSOR_STORE_DIR).frame('merged', ['timestamp_ns'] + anchor_cols, *TIME_RANGE_NS)
+        elif MERGE_LAYOUT == 'long':
+            df = read_table('merged_imu.csv', columns=['timestamp_ns'])
+            range_table = load_range_table('merged_ranges.csv', len(df), anchor_cols)
+        else:
+            df = read_table(INPUT_FILENAME, columns=['timestamp_ns'] + anchor_cols)
+    except FileNotFoundError as e:
+        print(f"FEHLER: '{e.filename}' nicht gefunden.")
+        if SENSOR_STORE_DIR:
+            print("Sensor-Store nach dem Merge mit build_store() (python sensor_store.py) erstellen.")
+        else:
+            print("Bitte stellen Sie sicher, dass die Datei im selben Ordner liegt.")
+        exit()
 
-if os.path.exists(OUTPUT_FILENAME):
     try:
-        os.remove(OUTPUT_FILENAME)
-        print(f"Alte Datei '{OUTPUT_FILENAME}' erfolgreich gelöscht.")
+        for path in remove_artifact(OUTPUT_FILENAME):
+            print(f"Alte Datei '{path}' erfolgreich gelöscht.")
     except OSError as e:
         print(f"FEHLER beim Löschen der Datei '{OUTPUT_FILENAME}': {e}")
 
-trilat_results = []
-last_pos = np.array([2.07, 0.70]) 
-
-print("Starte Trilateration (fülle Lücken mit letzter Position)...")
+    anchors_3d = np.array([ANCHOR_POSITIONS_3D[col] for col in anchor_cols])
+    if range_table is None:
+        ranges = df[anchor_cols].to_numpy(dtype=float)
+    elif TRIL_MODE != 'sequential':
+        ranges = range_table.to_wide()  # Batch-Modi arbeiten auf der Matrixform
 
-for i, row in df.iterrows():
-    timestamp = row['timestamp_ns']
-    
-    active_anchors_2d = []
-    active_dists_2d = []
+    print(f"Starte Trilateration im Modus '{TRIL_MODE}' (fülle Lücken mit letzter Position)...")
+    t_start = time.perf_counter()
 
-    for col, anchor_pos_3d in ANCHOR_POSITIONS_3D.items():
-        dist_raw = row[col]
-        if not np.isnan(dist_raw):
-            dist_2d = project_to_2d(dist_raw, anchor_pos_3d[2], TAG_HEIGHT)
-            active_anchors_2d.append(anchor_pos_3d[:2])
-            active_dists_2d.append(dist_2d)
-    
-    if len(active_dists_2d) >= 1:
-        try:
-            res = least_squares(
-                trilateration_residuals, 
-                last_pos, 
-                args=(np.array(active_anchors_2d), np.array(active_dists_2d)),
-                method='lm'
-            )
-            
-            if res.success:
-                pos_est = res.x
-                last_pos = pos_est 
-                trilat_results.append({'timestamp_ns': timestamp, 'pos_x': pos_est[0], 'pos_y': pos_est[1]})
-            else:
-                # Optimierung fehlgeschlagen, letzte Position halten
-                trilat_results.append({'timestamp_ns': timestamp, 'pos_x': last_pos[0], 'pos_y': last_pos[1]})
-        
-        except ValueError:
-             # Fehler bei least_squares, letzte Position halten
-             trilat_results.append({'timestamp_ns': timestamp, 'pos_x': last_pos[0], 'pos_y': last_pos[1]})
-            
+    pos_z = None
+    if TRIL_MODE == '3d':
+        positions_3d = multilaterate_batch(ranges, anchors_3d, TAG_HEIGHT, START_POS,
+                                           min_anchors_3d=MIN_ANCHORS_3D)
+        positions, pos_z = positions_3d[:, :2], positions_3d[:, 2]
+    elif TRIL_MODE == 'robust':
+        positions_3d, inliers = multilaterate_robust(ranges, anchors_3d, TAG_HEIGHT, START_POS,
+                                                     min_anchors=ROBUST_MIN_ANCHORS)
+        positions = positions_3d[:, :2]
+        rejected = np.sum(~inliers & ~np.isnan(ranges), axis=0)
+        for col, count in zip(anchor_cols, rejected):
+            print(f"  -> Anker {col}: {count} Messungen als Ausreißer verworfen.")
+    elif TRIL_MODE == 'parallel':
+        positions = trilaterate_epochs_parallel(ranges, anchors_3d, TAG_HEIGHT, START_POS,
+                                                chunk_size=CHUNK_SIZE, max_workers=NUM_WORKERS)
     else:
-        # Fallback: Wenn 0 Ankerdaten, letzte Position halten
-        trilat_results.append({'timestamp_ns': timestamp, 'pos_x': last_pos[0], 'pos_y': last_pos[1]})
+        cache = TrilaterationCache() if USE_CACHE else None
+        initializer = load_distance_field(anchors_3d, TAG_HEIGHT).initial_guess if USE_GRID_INIT else None
+        if range_table is not None:
+            positions = trilaterate_events(range_table.imu_row, range_table.anchor, range_table.ranges, len(df),
+                                           anchors_3d, TAG_HEIGHT, START_POS, cache=cache,
+                                           anchor_ids=anchor_cols, initializer=initializer)
+        else:
+            positions = trilaterate_epochs(ranges, anchors_3d, TAG_HEIGHT, START_POS,
+                                           cache=cache, anchor_ids=anchor_cols, initializer=initializer)
+        if cache is not None:
+            print(cache.format_stats())
+
+    print(f"{len(df)} Epochen in {time.perf_counter() - t_start:.2f} s verarbeitet.")
+
+    # Speichern
+    df_trilat = pd.DataFrame({
+        'timestamp_ns': df['timestamp_ns'].values,
+        'pos_x': positions[:, 0],
+        'pos_y': positions[:, 1]
+    })
+    if pos_z is not None:
+        df_trilat['pos_z'] = pos_z
+    if WRITE_GDOP:
+        gdop_map = load_gdop_map(anchors_3d, TAG_HEIGHT)
+        df_trilat['gdop'] = gdop_map.lookup(positions[:, 0], positions[:, 1])
+        print(f"GDOP entlang der Trajektorie: median {np.median(df_trilat['gdop']):.2f}, "
+              f"max {df_trilat['gdop'].max():.2f}")
+    output_path = write_table(df_trilat, OUTPUT_FILENAME, STORAGE_FORMAT)
+    print(f"Trilateration abgeschlossen. Ergebnisse in '{output_path}' gespeichert.")
 
-# 5. Speichern
-df_trilat = pd.DataFrame(trilat_results)
-df_trilat.to_csv(OUTPUT_FILENAME, index=False) # HINZUGEFÜGT: Nutzt die Variable
-print(f"Trilateration abgeschlossen. Ergebnisse in '{OUTPUT_FILENAME}' gespeichert.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
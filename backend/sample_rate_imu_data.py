@@ -1,47 +1,89 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from quality_index import load_quality_index, DELTA_HIST_BINS, DELTA_HIST_RANGE_S
+from segment_log import read_log
 
 # --- Parameter ---
 EXPECTED_RATE_HZ = 50.0
 EXPECTED_DELTA_S = 1.0 / EXPECTED_RATE_HZ
-DROPPED_PACKET_THRESHOLD_S = EXPECTED_DELTA_S * 1.5 
+DROPPED_PACKET_THRESHOLD_S = EXPECTED_DELTA_S * 1.5
+# Vom Merge geschriebener Qualitätsindex; fehlt er (oder passen Log oder Schwelle nicht), wird das Log gescannt
+QUALITY_INDEX_FILE = 'merged_imu_uwb_data.quality.json'
+
+
+def stats_from_csv(file_path):
+    """Zeitabstände (s), Sekundenzählung und Eckdaten durch Scan der IMU-Rohdaten."""
+    df = read_log(file_path)
+    if df.empty or len(df) < 2:
+        return None
+    df = df.sort_values('timestamp_ns')
+    df['delta_ns'] = df['timestamp_ns'].diff()
+    df_deltas = df['delta_ns'].dropna() / 1_000_000_000 # In Sekunden
+    df['datetime'] = pd.to_datetime(df['timestamp_ns'], unit='ns')
+    df = df.set_index('datetime')
+    hist_counts, hist_edges = np.histogram(df_deltas, bins=DELTA_HIST_BINS, range=DELTA_HIST_RANGE_S)
+    return {
+        'delta_mean': df_deltas.mean(), 'delta_median': df_deltas.median(),
+        'delta_min': df_deltas.min(), 'delta_max': df_deltas.max(),
+        'dropped_packets': (df_deltas > DROPPED_PACKET_THRESHOLD_S).sum(),
+        't_start': df['timestamp_ns'].min(), 't_end': df['timestamp_ns'].max(), 'num_samples': len(df),
+        'samples_per_second': df['ax'].resample('1s').count(),
+        'hist_counts': hist_counts, 'hist_edges': hist_edges,
+    }
+
+def stats_from_index(imu):
+    """Dieselben Kennzahlen aus dem IMU-Eintrag des Qualitätsindex (Median aus dem Histogramm)."""
+    if imu['count'] < 2:
+        return None
+    hist_counts = np.asarray(imu['delta_hist'])
+    hist_edges = np.linspace(*DELTA_HIST_RANGE_S, DELTA_HIST_BINS + 1)
+    cumulative = np.cumsum(hist_counts)
+    median_bin = np.searchsorted(cumulative, (imu['count'] - 1) / 2)
+    delta_median = (hist_edges[median_bin] + hist_edges[median_bin + 1]) / 2 \
+        if median_bin < DELTA_HIST_BINS else DELTA_HIST_RANGE_S[1]
+    return {
+        'delta_mean': imu['delta_sum_ns'] / (imu['count'] - 1) / 1e9, 'delta_median': delta_median,
+        'delta_min': imu['delta_min_ns'] / 1e9, 'delta_max': imu['delta_max_ns'] / 1e9,
+        'dropped_packets': len(imu['gaps']),
+        't_start': imu['first_ns'], 't_end': imu['last_ns'], 'num_samples': imu['count'],
+        'samples_per_second': pd.Series(imu['per_second']),
+        'hist_counts': hist_counts, 'hist_edges': hist_edges,
+    }
+
 
 try:
     # --- 1. Daten laden ---
     file_path = 'imu_data_1.csv'
-    df = pd.read_csv(file_path)
-    
-    if df.empty or len(df) < 2:
+    # Nur verwenden, wenn der Index aus dem aktuellen Stand von file_path gebaut wurde
+    quality_index = load_quality_index(QUALITY_INDEX_FILE, imu=file_path)
+    if quality_index is not None and np.isclose(quality_index['imu']['gap_ns'], DROPPED_PACKET_THRESHOLD_S * 1e9):
+        print(f"Nutze Qualitätsindex '{QUALITY_INDEX_FILE}' (kein Scan von '{file_path}', Median aus Histogramm).")
+        stats = stats_from_index(quality_index['imu'])
+    else:
+        stats = stats_from_csv(file_path)
+
+    if stats is None:
         print(f"Fehler: Datei '{file_path}' ist leer oder enthält nicht genügend Daten.")
     else:
         print(f"--- Analyse der Vollständigkeit für '{file_path}' ---")
         print(f"Erwartete Samplerate: {EXPECTED_RATE_HZ} Hz (oder {EXPECTED_DELTA_S:.4f} s pro Sample)\n")
-        df = df.sort_values('timestamp_ns')
-        df['delta_ns'] = df['timestamp_ns'].diff()
-        df_deltas = df['delta_ns'].dropna() / 1_000_000_000 # In Sekunden
-        
-        dropped_packets = (df_deltas > DROPPED_PACKET_THRESHOLD_S).sum()
-        
+
         print("--- Check 1: Analyse der Zeitabstände (Delta-t) ---")
-        print(f"Mittlerer Zeitabstand: {df_deltas.mean():.6f} s")
-        print(f"Median Zeitabstand:  {df_deltas.median():.6f} s")
-        print(f"Min. Zeitabstand:    {df_deltas.min():.6f} s")
-        print(f"Max. Zeitabstand:    {df_deltas.max():.6f} s")
-        print(f"Anzahl vermuteter 'Dropped Packets' (Abstand > {DROPPED_PACKET_THRESHOLD_S:.4f}s): {dropped_packets}")
-        t_start = df['timestamp_ns'].min()
-        t_end = df['timestamp_ns'].max()
-        num_samples = len(df)
-        duration_s = (t_end - t_start) / 1_000_000_000
+        print(f"Mittlerer Zeitabstand: {stats['delta_mean']:.6f} s")
+        print(f"Median Zeitabstand:  {stats['delta_median']:.6f} s")
+        print(f"Min. Zeitabstand:    {stats['delta_min']:.6f} s")
+        print(f"Max. Zeitabstand:    {stats['delta_max']:.6f} s")
+        print(f"Anzahl vermuteter 'Dropped Packets' (Abstand > {DROPPED_PACKET_THRESHOLD_S:.4f}s): {stats['dropped_packets']}")
+        num_samples = stats['num_samples']
+        duration_s = (stats['t_end'] - stats['t_start']) / 1_000_000_000
         overall_avg_rate = (num_samples - 1) / duration_s
-        
+
         print("\n--- Check 2: Gesamt-Durchschnittsrate ---")
         print(f"Gesamte Dauer:      {duration_s:.2f} s")
         print(f"Anzahl aller Samples: {num_samples}")
         print(f"Durchschnittsrate:  {overall_avg_rate:.2f} Hz")
-        df['datetime'] = pd.to_datetime(df['timestamp_ns'], unit='ns')
-        df = df.set_index('datetime')
-        samples_per_second = df['ax'].resample('1S').count()
+        samples_per_second = stats['samples_per_second']
         if len(samples_per_second) > 2:
             middle_seconds = samples_per_second[1:-1]
         else:
@@ -52,26 +94,27 @@ try:
             print(f"Median Samples pro Sekunde:   {middle_seconds.median():.0f}")
             print(f"Min. Samples pro Sekunde:     {middle_seconds.min():.0f}")
             print(f"Max. Samples pro Sekunde:     {middle_seconds.max():.0f}")
-            
+
             deviating_seconds = middle_seconds[middle_seconds != EXPECTED_RATE_HZ].count()
             total_middle_seconds = len(middle_seconds)
             completeness_perc = (1 - (deviating_seconds / total_middle_seconds)) * 100
-            
+
             print(f"Sekunden mit Abweichungen: {deviating_seconds} von {total_middle_seconds} (vollen) Sekunden")
             print(f"Vollständigkeit (volle Sekunden): {completeness_perc:.2f}%")
         else:
             print("Daten umfassen weniger als 3 Sekunden, 'volle Sekunden'-Analyse übersprungen.")
 
         plt.figure(figsize=(10, 6))
-        plt.hist(df_deltas, bins=100, range=(0, 0.05), label='Tatsächliche Zeitabstände')
-        plt.axvline(EXPECTED_DELTA_S, color='r', linestyle='--', 
+        hist_edges = stats['hist_edges']
+        plt.hist(hist_edges[:-1], bins=hist_edges, weights=stats['hist_counts'], label='Tatsächliche Zeitabstände')
+        plt.axvline(EXPECTED_DELTA_S, color='r', linestyle='--',
                     label=f'Erwartet ({EXPECTED_DELTA_S:.4f}s / {EXPECTED_RATE_HZ} Hz)')
         plt.title('Histogramm der Zeitabstände zwischen Samples (Delta-t)')
         plt.xlabel('Zeitabstand (s)')
         plt.ylabel('Anzahl der Samples')
         plt.legend()
         plt.grid(True)
-        
+
         hist_path = 'sample_rate_histogram.png'
         plt.savefig(hist_path)
         print(f"\nHistogramm der Zeitabstände gespeichert: {hist_path}")
@@ -79,4 +122,4 @@ try:
 except FileNotFoundError:
     print(f"Fehler: Die Datei '{file_path}' wurde nicht gefunden.")
 except Exception as e:
-    print(f"Ein Fehler ist aufgetreten: {e}")
\ No newline at end of file
+    print(f"Ein Fehler ist aufgetreten: {e}")
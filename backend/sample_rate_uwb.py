@@ -1,26 +1,74 @@
 import pandas as pd
+from quality_index import load_quality_index, received_summary
+from segment_log import read_log
 
 # --- Konfiguration ---
 gt_file = 'mqtt_ground_truth.csv'
 uwb_file = 'uwb_data_1.csv'
 output_csv = 'uwb_data_1_summary.csv'
+# Vom Merge geschriebener Qualitätsindex; fehlt er oder passt er nicht zu uwb_file, wird uwb_file wie bisher gescannt
+quality_index_file = 'merged_imu_uwb_data.quality.json'
 
 # Erwartete Messrate pro Anker
 EXPECTED_RATE_HZ = 5
 # ---------------------
 
+
+def summarize_raw(uwb_df, start_time_ns, end_time_ns, duration_s):
+    """Empfangsstatistik je Anker durch Scan der UWB-Rohdaten (None, wenn das Zeitfenster leer ist)."""
+    # --- UWB-Daten auf das Zeitfenster filtern ---
+    uwb_filtered_df = uwb_df[
+        (uwb_df['timestamp_ns'] >= start_time_ns) &
+        (uwb_df['timestamp_ns'] <= end_time_ns)
+    ].copy()
+    if uwb_filtered_df.empty:
+        return None
+
+    # --- Anzahl Messungen pro Anker (mac_address) berechnen ---
+    measurements_per_anchor = uwb_filtered_df.groupby('mac_address').size().to_frame(name='actual_measurements')
+    num_anchors = len(measurements_per_anchor)
+
+    # --- Erwartete Messungen und Fehlquellen berechnen ---
+    expected_measurements_per_anchor = duration_s * EXPECTED_RATE_HZ
+    total_expected_measurements = expected_measurements_per_anchor * num_anchors
+    total_actual_measurements = measurements_per_anchor['actual_measurements'].sum()
+
+    summary_df = measurements_per_anchor
+    summary_df['expected_measurements'] = expected_measurements_per_anchor
+    summary_df['missing_measurements'] = summary_df['expected_measurements'] - summary_df['actual_measurements']
+    summary_df['received_percentage'] = (summary_df['actual_measurements'] / summary_df['expected_measurements']) * 100
+
+    # --- Gesamt-Zeile hinzufügen ---
+    total_row_data = {
+        'actual_measurements': total_actual_measurements,
+        'expected_measurements': total_expected_measurements,
+        'missing_measurements': total_expected_measurements - total_actual_measurements,
+        'received_percentage': (total_actual_measurements / total_expected_measurements) * 100
+    }
+    total_row_df = pd.DataFrame(total_row_data, index=['Total'])
+    return pd.concat([summary_df, total_row_df])
+
+
 print(f"Starte Analyse für {uwb_file}...")
 
 try:
     # --- 1. Daten laden ---
-    gt_df = pd.read_csv(gt_file)
-    uwb_df = pd.read_csv(uwb_file)
+    gt_df = pd.read_csv(gt_file, usecols=['timestamp_ns'])
+    # Nur verwenden, wenn der Index aus dem aktuellen Stand von uwb_file gebaut wurde und das Zeitfenster abdeckt
+    quality_index = load_quality_index(quality_index_file, (gt_df['timestamp_ns'].min(), gt_df['timestamp_ns'].max()),
+                                       uwb=uwb_file)
+    if quality_index is not None:
+        print(f"Nutze Qualitätsindex '{quality_index_file}' (Sekundenzählung, kein Scan von {uwb_file}).")
+        uwb_df = None
+    else:
+        # Segmentiertes Log: nur die Blöcke im Zeitfenster der Ground Truth lesen
+        uwb_df = read_log(uwb_file, gt_df['timestamp_ns'].min(), gt_df['timestamp_ns'].max())
 
     # --- 2. Datentyp-Konvertierung  ---
     if not pd.api.types.is_integer_dtype(gt_df['timestamp_ns']):
         gt_df['timestamp_ns'] = gt_df['timestamp_ns'].astype('int64')
         
-    if not pd.api.types.is_integer_dtype(uwb_df['timestamp_ns']):
+    if uwb_df is not None and not pd.api.types.is_integer_dtype(uwb_df['timestamp_ns']):
         uwb_df['timestamp_ns'] = uwb_df['timestamp_ns'].astype('int64')
 
     # --- 3. Anfangs- und Endzeit des Experiments bestimmen ---
@@ -32,49 +80,22 @@ try:
 
     print(f"Experiment-Dauer (s): {duration_s:.2f}")
 
-    # --- 4. UWB-Daten auf das Zeitfenster filtern ---
-    uwb_filtered_df = uwb_df[
-        (uwb_df['timestamp_ns'] >= start_time_ns) &
-        (uwb_df['timestamp_ns'] <= end_time_ns)
-    ].copy()
-    
-    if uwb_filtered_df.empty:
-        print("FEHLER: Keine UWB-Daten im ermittelten Zeitfenster gefunden.")
+    # --- 4. Messungen pro Anker (mac_address) im Zeitfenster ---
+    if quality_index is not None:
+        summary_df = received_summary(quality_index, start_time_ns, end_time_ns, EXPECTED_RATE_HZ)
+        summary_df = summary_df if len(summary_df) > 1 else None
     else:
-        # --- 5. Anzahl Messungen pro Anker (mac_address) berechnen ---
-        measurements_per_anchor = uwb_filtered_df.groupby('mac_address').size().to_frame(name='actual_measurements')
-        
-        unique_anchors = measurements_per_anchor.index.values
-        num_anchors = len(unique_anchors)
-        
-        # --- 6. Erwartete Messungen und Fehlquellen berechnen ---
-        expected_measurements_per_anchor = duration_s * EXPECTED_RATE_HZ
-        total_expected_measurements = expected_measurements_per_anchor * num_anchors
-        total_actual_measurements = measurements_per_anchor['actual_measurements'].sum()
+        summary_df = summarize_raw(uwb_df, start_time_ns, end_time_ns, duration_s)
 
-        # --- 7. Summary-DataFrame erstellen ---
-        summary_df = measurements_per_anchor
-        
-        summary_df['expected_measurements'] = expected_measurements_per_anchor
-        summary_df['missing_measurements'] = summary_df['expected_measurements'] - summary_df['actual_measurements']
-        summary_df['received_percentage'] = (summary_df['actual_measurements'] / summary_df['expected_measurements']) * 100
-        
-        # --- 8. Gesamt-Zeile hinzufügen ---
-        total_row_data = {
-            'actual_measurements': total_actual_measurements,
-            'expected_measurements': total_expected_measurements,
-            'missing_measurements': total_expected_measurements - total_actual_measurements,
-            'received_percentage': (total_actual_measurements / total_expected_measurements) * 100
-        }
-        total_row_df = pd.DataFrame(total_row_data, index=['Total'])
-        summary_df = pd.concat([summary_df, total_row_df])
-        
-        # --- 9. Formatierung ---
+    if summary_df is None:
+        print("FEHLER: Keine UWB-Daten im ermittelten Zeitfenster gefunden.")
+    else:
+        # --- 5. Formatierung ---
         summary_df['expected_measurements'] = summary_df['expected_measurements'].round(0).astype(int)
         summary_df['missing_measurements'] = summary_df['missing_measurements'].round(0).astype(int)
         summary_df['received_percentage'] = summary_df['received_percentage'].round(2)
         
-        # --- 10. Als CSV speichern ---
+        # --- 6. Als CSV speichern ---
         summary_df.to_csv(output_csv, index_label='mac_address')
         
         print(f"\n--- Zusammenfassung der UWB-Messungen (Szenario 1) ---")
@@ -0,0 +1,409 @@
+import csv
+import errno
+import glob
+import gzip
+import io
+import os
+import re
+import time
+import zlib
+import numpy as np
+import pandas as pd
+
+# --- Konfiguration ---
+# Ein Log ist ein Ordner (z.B. 'imu_data_1/') mit CSV-Segmenten, jedes mit Header und einzeln lesbar,
+# und einem Index: je geschriebenem Block Segment, Byte-Offset, Länge, Zeilen und Zeitbereich.
+# Anstelle von 'imu_data_1.csv' wird automatisch der Ordner 'imu_data_1/' gelesen (siehe resolve_log).
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024   # Neues Segment ab dieser Größe ...
+SEGMENT_MAX_S = 3600.0                 # ... oder nach dieser Zeit
+# Komprimierung neuer Segmente: None oder 'gzip' (zlib, Stufe COMPRESSION_LEVEL, 1 = am schnellsten).
+# Jeder Block wird als eigenes gzip-Member angehängt: das aktive Segment ist jederzeit eine gültige
+# .csv.gz-Datei (pd.read_csv liest sie direkt), und der Index zeigt weiter auf einzeln lesbare Blöcke.
+COMPRESSION = None
+COMPRESSION_LEVEL = 1
+COMPRESSION_SUFFIX = {None: '', 'gzip': '.gz'}
+SEGMENT_NAME = 'segment_{:06d}.csv'
+SEGMENT_PATTERN = re.compile(r'segment_(\d{6})\.csv(\.gz)?$')
+INDEX_FILE = 'index.csv'
+INDEX_HEADERS = ['segment', 'offset', 'length', 'rows', 't_min', 't_max']
+RECOVERY_TAIL_BYTES = 64 * 1024          # So viel vom Dateiende prüft recover_csv auf unvollständige Zeilen
+
+
+def log_dir(path):
+    """'imu_data_1.csv' -> 'imu_data_1' (Ordner des segmentierten Logs), Ordner bleiben unverändert."""
+    base, ext = os.path.splitext(path)
+    return base if ext == '.csv' else path
+
+def segment_path(directory, segment, compression=None):
+    return os.path.join(directory, SEGMENT_NAME.format(segment) + COMPRESSION_SUFFIX[compression])
+
+def log_segments(directory):
+    """Alle Segmente eines Logs (komprimiert oder nicht) in Schreibreihenfolge."""
+    return sorted(p for p in glob.glob(os.path.join(directory, 'segment_*.csv*')) if SEGMENT_PATTERN.search(p))
+
+def segment_number(path):
+    return int(SEGMENT_PATTERN.search(path).group(1))
+
+def decompress(path, data, lengths=None):
+    """
+    Bytes aus dem Segment path im Klartext. data sind ganze Blöcke mit den Längen lengths (aus dem Index);
+    jedes gzip-Member wird einzeln entpackt, statt wie gzip.decompress den Rest immer wieder zu kopieren.
+    """
+    if not path.endswith('.gz'):
+        return data
+    if lengths is None:
+        return gzip.decompress(data)
+    view = memoryview(data)
+    ends = np.cumsum(lengths).tolist()
+    return b''.join(zlib.decompress(view[end - length:end], 31) for end, length in zip(ends, lengths))
+
+def resolve_log(path):
+    """
+    Sucht zum Log-Namen die Einzel-CSV und den Segment-Ordner und gibt (Pfad, segmentiert) des
+    zuletzt geschriebenen zurück, damit eine alte Einzeldatei ein neues Log nicht überdeckt.
+    """
+    candidates = []
+    directory = log_dir(path)
+    index_path = os.path.join(directory, INDEX_FILE)
+    if os.path.exists(index_path):
+        candidates.append((os.path.getmtime(index_path), directory, True))
+    if os.path.isfile(path):
+        candidates.append((os.path.getmtime(path), path, False))
+    if not candidates:
+        raise FileNotFoundError(errno.ENOENT, "Log nicht gefunden", path)
+    _, path, segmented = max(candidates)
+    return path, segmented
+
+def is_segmented(path):
+    """True, wenn zum Log-Namen ein Segment-Ordner gehört und er neuer als eine gleichnamige Einzel-CSV ist."""
+    try:
+        return resolve_log(path)[1]
+    except FileNotFoundError:
+        return False
+
+def log_files(path):
+    """CSV-Dateien eines Logs in Zeitreihenfolge (Segmente oder die Einzeldatei), z.B. für stream_merge."""
+    path, segmented = resolve_log(path)
+    return log_segments(path) if segmented else [path]
+
+
+class SyncPolicy:
+    """
+    Wann geschriebene Daten per fsync auf den Datenträger gebracht werden: sobald every_rows Zeilen
+    oder interval_s Sekunden seit dem letzten fsync zusammenkommen (0 = nach jedem Schreibvorgang).
+    Beide None: nie; nach flush() liegen die Daten dann nur im Page-Cache und überstehen einen
+    Absturz des Prozesses, aber keinen Stromausfall.
+    """
+
+    def __init__(self, every_rows=None, interval_s=None):
+        self.every_rows = every_rows
+        self.interval_s = interval_s
+        self.pending = 0
+        self.syncs = 0
+        self.last_sync = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.every_rows is not None or self.interval_s is not None
+
+    def after_write(self, rows, *files):
+        """Nach einem Schreibvorgang (oder periodisch mit rows=0): fsync der Dateien, wenn fällig."""
+        self.pending += rows
+        if self.pending and ((self.every_rows is not None and self.pending >= self.every_rows) or
+                             (self.interval_s is not None and time.monotonic() - self.last_sync >= self.interval_s)):
+            self.sync(*files)
+
+    def sync_pending(self, *files):
+        """Vor dem Schließen einer Datei: noch nicht gesicherte Zeilen per fsync sichern (wenn aktiv)."""
+        if self.enabled and self.pending:
+            self.sync(*files)
+
+    def sync(self, *files):
+        """fsync in der übergebenen Reihenfolge (Daten vor Index)."""
+        for f in files:
+            os.fsync(f.fileno())
+        self.pending = 0
+        self.syncs += 1
+        self.last_sync = time.monotonic()
+
+
+def recover_csv(path):
+    """
+    Schneidet einen unvollständigen letzten Datensatz ab, z.B. nach einem Absturz mitten im Schreiben:
+    alles nach dem letzten Zeilenende, bei Nullbytes (Stromausfall) ab dem ersten. Rückgabe: entfernte Bytes.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        base = max(0, size - RECOVERY_TAIL_BYTES)
+        f.seek(base)
+        tail = f.read()
+        nul = tail.find(b'\0')
+        if nul >= 0:
+            tail = tail[:nul]
+        keep = base + tail.rfind(b'\n') + 1 if b'\n' in tail else base
+        if keep < size:
+            f.truncate(keep)
+    return size - keep
+
+def _header_length(path):
+    """Länge des Headers am Anfang eines Segments in Bytes, 0 wenn er unvollständig ist."""
+    with open(path, 'rb') as f:
+        data = f.read(64 * 1024)
+    if path.endswith('.gz'):
+        inflate = zlib.decompressobj(31)
+        try:
+            header = inflate.decompress(data)
+        except zlib.error:
+            return 0
+        return len(data) - len(inflate.unused_data) if inflate.eof and header.endswith(b'\n') else 0
+    return data.find(b'\n') + 1
+
+def _block_complete(path, data, length):
+    """True, wenn data ein vollständig geschriebener Block ist (keine fehlenden Bytes, keine Nullbytes)."""
+    if len(data) != length:
+        return False
+    if path.endswith('.gz'):
+        try:
+            data = zlib.decompress(data, 31)
+        except zlib.error:
+            return False
+    return data.endswith(b'\n') and b'\0' not in data
+
+def recover_log(directory):
+    """
+    Bringt ein Segment-Log nach einem Absturz in einen konsistenten Zustand: unvollständige und
+    unlesbare Index-Einträge am Ende werden entfernt (rückwärts bis zum ersten vollständigen Block),
+    danach jedes Segment hinter seinem letzten indizierten Block abgeschnitten. Segmente ohne
+    vollständigen Header werden gelöscht. Rückgabe: (entfernte Index-Einträge, entfernte Bytes).
+    """
+    index_path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return 0, 0
+    files = {segment_number(p): p for p in log_segments(directory)}
+    with open(index_path, 'rb') as f:
+        data = f.read()
+    # Zeilen bis zur ersten unvollständigen oder nicht lesbaren, mit Byte-Position ihres Endes
+    entries, ends = [], []
+    header_end = pos = data.find(b'\n') + 1
+    while pos > 0:
+        end = data.find(b'\n', pos) + 1
+        if end == 0:
+            break
+        try:
+            entry = [int(v) for v in data[pos:end].split(b',')]
+        except ValueError:
+            break
+        if len(entry) != len(INDEX_HEADERS):
+            break
+        entries.append(entry)
+        ends.append(end)
+        pos = end
+    dropped = len(data[ends[-1] if ends else header_end:].splitlines()) + len(entries)
+    while entries:
+        segment, offset, length = entries[-1][:3]
+        if segment in files:
+            with open(files[segment], 'rb') as f:
+                f.seek(offset)
+                if _block_complete(files[segment], f.read(length), length):
+                    break
+        entries.pop()
+        ends.pop()
+    dropped -= len(entries)
+    keep = ends[-1] if ends else header_end
+    if keep < len(data):
+        with open(index_path, 'r+b') as f:
+            f.truncate(keep)
+    removed = len(data) - keep
+    last_block = {}
+    for segment, offset, length, *_ in entries:
+        last_block[segment] = offset + length
+    for segment, path in files.items():
+        size = os.path.getsize(path)
+        end = last_block.get(segment) or _header_length(path)
+        if end == 0:
+            os.remove(path)
+        elif end < size:
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        removed += size - end
+    return dropped, removed
+
+
+class SegmentedLog:
+    """
+    Append-only Log aus rotierenden CSV-Segmenten mit Zeitindex. append() schreibt einen Block
+    von Zeilen (erste Spalte timestamp_ns) und trägt ihn danach in den Index ein; ein Eintrag
+    zeigt also immer auf vollständig geschriebene Daten. Beim Öffnen werden Reste eines Absturzes
+    entfernt (recover_log) und ein neues Segment begonnen, die übrigen Daten bleiben unverändert.
+    Mit compression='gzip' ist jeder Block ein eigenes gzip-Member, Offset und Länge im Index
+    beziehen sich dann auf die komprimierten Bytes und max_bytes auf die Dateigröße.
+    sync (SyncPolicy) bestimmt, wann Segment und Index per fsync gesichert werden.
+    """
+
+    def __init__(self, directory, headers, max_bytes=SEGMENT_MAX_BYTES, max_age_s=SEGMENT_MAX_S,
+                 compression=COMPRESSION, level=COMPRESSION_LEVEL, sync=None):
+        if compression not in COMPRESSION_SUFFIX:
+            raise ValueError(f"Unbekannte Komprimierung: {compression}")
+        self.directory = directory
+        self.headers = headers
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.compression = compression
+        self.level = level
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.sync = sync or SyncPolicy()
+        os.makedirs(directory, exist_ok=True)
+        self.recovered_blocks, self.recovered_bytes = recover_log(directory)
+        index_path = os.path.join(directory, INDEX_FILE)
+        new_index = not os.path.exists(index_path) or os.path.getsize(index_path) == 0
+        self.index_file = open(index_path, 'a', newline='')
+        self.index_writer = csv.writer(self.index_file)
+        if new_index:
+            self.index_writer.writerow(INDEX_HEADERS)
+            self.index_file.flush()
+        segments = log_segments(directory)
+        self.segment = segment_number(segments[-1]) if segments else 0
+        self.file = None
+        self.rotations = 0
+        self._open_segment()
+
+    def _open_segment(self):
+        self.segment += 1
+        self.file = open(segment_path(self.directory, self.segment, self.compression), 'xb')
+        self.file.write(self._format(self.headers))
+        self.file.flush()
+        self.opened = time.monotonic()
+        if self.sync.enabled:
+            # Neue Datei: auch der Verzeichniseintrag muss auf den Datenträger
+            self.sync.sync(self.file)
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _format(self, *rows):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        data = buf.getvalue().encode()
+        self.bytes_in += len(data)
+        if self.compression == 'gzip':
+            data = gzip.compress(data, self.level, mtime=0)
+        self.bytes_out += len(data)
+        return data
+
+    def append(self, rows):
+        if not rows:
+            return
+        if self.file.tell() >= self.max_bytes or time.monotonic() - self.opened >= self.max_age_s:
+            self.rotate()
+        data = self._format(*rows)
+        timestamps = [int(row[0]) for row in rows]
+        offset = self.file.tell()
+        self.file.write(data)
+        self.file.flush()
+        self.index_writer.writerow([self.segment, offset, len(data), len(rows), min(timestamps), max(timestamps)])
+        self.index_file.flush()
+        self.sync.after_write(len(rows), self.file, self.index_file)
+
+    def sync_if_due(self):
+        """Für den periodischen Aufruf: fsync, wenn interval_s seit dem letzten abgelaufen ist."""
+        self.sync.after_write(0, self.file, self.index_file)
+
+    def rotate(self):
+        self.sync.sync_pending(self.file, self.index_file)
+        self.file.close()
+        self._open_segment()
+        self.rotations += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.sync.sync_pending(self.file, self.index_file)
+            self.file.close()
+            self.index_file.close()
+
+
+def load_index(directory):
+    """Index als Spalten-Arrays (int64); Blöcke in Schreibreihenfolge."""
+    index = pd.read_csv(os.path.join(directory, INDEX_FILE), dtype=np.int64)
+    return {name: index[name].to_numpy() for name in INDEX_HEADERS}
+
+def find_blocks(index, t0=None, t1=None):
+    """
+    Bereich [lo, hi) der Blöcke, die Zeilen mit t0 <= timestamp_ns <= t1 enthalten können, per
+    Binärsuche (O(log n)). Über die laufenden Maxima/Minima stimmt das Ergebnis auch dann, wenn
+    sich die Zeitbereiche benachbarter Blöcke leicht überlappen (Nachrichten außer der Reihe).
+    """
+    lo, hi = 0, len(index['t_min'])
+    if t0 is not None:
+        lo = np.searchsorted(np.maximum.accumulate(index['t_max']), t0, side='left')
+    if t1 is not None:
+        hi = np.searchsorted(np.minimum.accumulate(index['t_min'][::-1])[::-1], t1, side='right')
+    return int(lo), int(max(lo, hi))
+
+def read_blocks(directory, index, lo, hi, dtype=None):
+    """Blöcke [lo, hi) eines Segment-Logs (Index aus load_index) als DataFrame, ggf. entpackt."""
+    files = {segment_number(p): p for p in log_segments(directory)}
+    parts = []
+    header = None
+    # Aufeinanderfolgende Blöcke eines Segments in einem Lesevorgang; der Header eines Segments
+    # reicht bis zum Offset seines ersten Blocks
+    segments = index['segment'][lo:hi]
+    starts = np.flatnonzero(np.diff(segments, prepend=-1)) + lo
+    ends = np.append(starts[1:], hi) - 1
+    for first, last in zip(starts.tolist(), ends.tolist()):
+        segment_file = files[index['segment'][first]]
+        header_end = index['offset'][np.searchsorted(index['segment'], index['segment'][first])]
+        start = index['offset'][first]
+        end = index['offset'][last] + index['length'][last]
+        with open(segment_file, 'rb') as f:
+            header = decompress(segment_file, f.read(header_end))
+            f.seek(start)
+            lengths = index['length'][first:last + 1].tolist()
+            parts.append(decompress(segment_file, f.read(end - start), lengths))
+    if header is None:
+        return pd.read_csv(min(files.items())[1], nrows=0)
+    return pd.read_csv(io.BytesIO(header + b''.join(parts)), dtype=dtype)
+
+def read_log(path, t0=None, t1=None):
+    """
+    Liest ein Log (Einzel-CSV oder Segment-Ordner, siehe resolve_log) als DataFrame, optional nur
+    die Zeilen mit t0 <= timestamp_ns <= t1. Bei Segmenten werden über den Index nur die Byte-Bereiche
+    der betroffenen Blöcke gelesen (und ggf. entpackt), bei einer Einzel-CSV die ganze Datei.
+    """
+    path, segmented = resolve_log(path)
+    if not segmented:
+        df = pd.read_csv(path)
+    else:
+        index = load_index(path)
+        df = read_blocks(path, index, *find_blocks(index, t0, t1))
+    if t0 is not None or t1 is not None:
+        ts = df['timestamp_ns'].to_numpy()
+        mask = np.ones(len(df), dtype=bool)
+        if t0 is not None:
+            mask &= ts >= t0
+        if t1 is not None:
+            mask &= ts <= t1
+        df = df[mask].reset_index(drop=True)
+    return df
+
+def read_log_chunks(path, chunk_rows, usecols=None):
+    """
+    Liest ein Log (siehe resolve_log) blockweise als DataFrames mit etwa chunk_rows Zeilen, z.B. für
+    stream_merge und build_store. Bei Segmenten nur die im Index eingetragenen, also vollständig
+    geschriebenen Blöcke: ein halb geschriebener (gzip-)Block im aktiven Segment wird nicht gelesen.
+    """
+    path, segmented = resolve_log(path)
+    if not segmented:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=usecols)
+        return
+    index = load_index(path)
+    ends = np.cumsum(index['rows'])
+    lo = 0
+    while lo < len(ends):
+        done = ends[lo - 1] if lo else 0
+        hi = max(lo + 1, int(np.searchsorted(ends, done + chunk_rows, side='right')))
+        df = read_blocks(path, index, lo, hi)
+        yield df if usecols is None else df[usecols]
+        lo = hi
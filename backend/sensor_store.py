@@ -0,0 +1,184 @@
+import errno
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from storage import read_table
+from segment_log import read_log, read_log_chunks
+
+# --- Konfiguration ---
+STORE_DIR = 'sensor_store'
+IMU_FILE = 'imu_data_1.csv'
+UWB_FILE = 'uwb_data_1.csv'
+MERGED_FILE = 'merged_imu_uwb_data.csv'
+CHUNK_ROWS = 100_000
+
+# Schema wie IMU_HEADERS / UWB_HEADERS in mqtt_sub.py; die MAC wird im UWB-Store
+# als Index in die Ankerliste der Metadaten abgelegt
+IMU_DTYPE = np.dtype([('timestamp_ns', '<i8'),
+                      ('qw', '<f4'), ('qx', '<f4'), ('qy', '<f4'), ('qz', '<f4'),
+                      ('ax', '<f4'), ('ay', '<f4'), ('az', '<f4')])
+UWB_DTYPE = np.dtype([('timestamp_ns', '<i8'), ('anchor', '<u2'), ('distance', '<f4')])
+
+
+def merged_dtype(anchor_cols):
+    """IMU-Felder plus eine float32-Distanzspalte pro Anker (NaN = keine Messung)."""
+    return np.dtype(IMU_DTYPE.descr + [(col, '<f4') for col in anchor_cols])
+
+
+class SensorStore:
+    """
+    Rohdaten als memory-mapped Structured Arrays (eine .bin-Datei pro Tabelle plus meta.json).
+
+    Die Tabellen 'imu', 'uwb' und 'merged' sind nach timestamp_ns sortiert; time_slice()
+    liefert per Binärsuche eine View, es wird also weder geparst noch kopiert.
+    """
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self._tables = {}
+
+    @property
+    def anchors(self):
+        """MAC-Adressen in der Reihenfolge der Anker-Indizes im UWB-Store."""
+        return self.meta['anchors']
+
+    def table(self, name):
+        """
+        Memmap der Tabelle (nur lesend), beim ersten Zugriff geöffnet. FileNotFoundError, wenn der Store
+        die Tabelle nicht enthält ('merged' fehlt, wenn build_store() vor dem Merge lief).
+        """
+        if name not in self._tables:
+            if name not in self.meta['tables']:
+                raise FileNotFoundError(errno.ENOENT, f"Tabelle '{name}' fehlt im Sensor-Store, nach dem Merge "
+                                        f"build_store() ausführen", os.path.join(self.path, f'{name}.bin'))
+            info = self.meta['tables'][name]
+            dtype = np.dtype([tuple(field) for field in info['dtype']])
+            if info['rows'] == 0:
+                self._tables[name] = np.empty(0, dtype=dtype)
+            else:
+                self._tables[name] = np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=dtype,
+                                               mode='r', shape=(info['rows'],))
+        return self._tables[name]
+
+    def time_slice(self, name, t_start=None, t_end=None):
+        """Zeilen mit t_start <= timestamp_ns < t_end als View (None = offen)."""
+        data = self.table(name)
+        ts = data['timestamp_ns']
+        lo = 0 if t_start is None else np.searchsorted(ts, t_start, side='left')
+        hi = len(data) if t_end is None else np.searchsorted(ts, t_end, side='left')
+        return data[lo:hi]
+
+    def frame(self, name, columns=None, t_start=None, t_end=None):
+        """
+        Zeitausschnitt als DataFrame, dessen Spalten Views auf die Memmap sind (float32 bleibt float32,
+        nach float64 wandeln die Verbraucher nur dort, wo sie rechnen, z.B. to_numpy(dtype=float)).
+        """
+        data = self.time_slice(name, t_start, t_end)
+        columns = list(data.dtype.names) if columns is None else columns
+        return pd.DataFrame({col: data[col] for col in columns}, copy=False)
+
+
+class _TableWriter:
+    """Hängt Structured-Array-Blöcke an eine .bin-Datei an und prüft die Zeitordnung."""
+
+    def __init__(self, path, name, dtype):
+        self.name = name
+        self.dtype = dtype
+        self.rows = 0
+        self.last_ts = None
+        self.file = open(os.path.join(path, f'{name}.bin'), 'wb')
+
+    def append(self, block):
+        if len(block) == 0:
+            return
+        ts = block['timestamp_ns']
+        if np.any(np.diff(ts) < 0) or (self.last_ts is not None and ts[0] < self.last_ts):
+            raise ValueError(f"Tabelle '{self.name}': timestamp_ns muss aufsteigend sortiert sein.")
+        self.last_ts = ts[-1]
+        self.file.write(np.ascontiguousarray(block, dtype=self.dtype).tobytes())
+        self.rows += len(block)
+
+    def close(self):
+        self.file.close()
+        return {'rows': self.rows, 'dtype': [list(field) for field in self.dtype.descr]}
+
+
+def _to_records(df, dtype, columns=None):
+    """DataFrame -> Structured Array; columns bildet Feldnamen auf DataFrame-Spalten ab."""
+    out = np.empty(len(df), dtype=dtype)
+    for field in dtype.names:
+        out[field] = df[(columns or {}).get(field, field)].to_numpy()
+    return out
+
+def build_store(path=STORE_DIR, imu_file=IMU_FILE, uwb_file=UWB_FILE, merged_file=MERGED_FILE,
+                chunk_rows=CHUNK_ROWS):
+    """
+    Wandelt die CSV-Logs (Einzeldateien oder Segment-Ordner, siehe segment_log.py, und, falls
+    vorhanden, das gemergte Artefakt) blockweise in einen SensorStore um. Gibt den geöffneten Store zurück.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta = {'anchors': [], 'anchor_cols': [], 'tables': {}}
+
+    imu = _TableWriter(path, 'imu', IMU_DTYPE)
+    for chunk in read_log_chunks(imu_file, chunk_rows):
+        imu.append(_to_records(chunk, IMU_DTYPE))
+    meta['tables']['imu'] = imu.close()
+
+    uwb = _TableWriter(path, 'uwb', UWB_DTYPE)
+    anchor_index = {}
+    for chunk in read_log_chunks(uwb_file, chunk_rows):
+        for mac in chunk['mac_address'].unique():
+            anchor_index.setdefault(mac, len(anchor_index))
+        chunk['anchor'] = chunk['mac_address'].map(anchor_index)
+        uwb.append(_to_records(chunk, UWB_DTYPE))
+    meta['tables']['uwb'] = uwb.close()
+    meta['anchors'] = list(anchor_index)
+
+    if merged_file is not None:
+        try:
+            df = read_table(merged_file)
+        except FileNotFoundError:
+            df = None
+        if df is not None:
+            anchor_cols = [col for col in df.columns if col.startswith('dist_')]
+            dtype = merged_dtype(anchor_cols)
+            merged = _TableWriter(path, 'merged', dtype)
+            for start in range(0, len(df), chunk_rows):
+                merged.append(_to_records(df.iloc[start:start + chunk_rows], dtype))
+            meta['tables']['merged'] = merged.close()
+            meta['anchor_cols'] = anchor_cols
+
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return SensorStore(path)
+
+
+if __name__ == "__main__":
+    t_start = time.perf_counter()
+    store = build_store()
+    print(f"Sensor-Store '{STORE_DIR}' in {time.perf_counter() - t_start:.2f} s erstellt.")
+    for name, info in store.meta['tables'].items():
+        size = os.path.getsize(os.path.join(STORE_DIR, f'{name}.bin'))
+        print(f"  -> {name}: {info['rows']} Zeilen, {size / 1024:.0f} KiB")
+
+    # Zugriff auf ein Zeitfenster (mittlere 10 %) im Vergleich zum Parsen der CSV
+    imu = store.table('imu')
+    if len(imu):
+        t0, t1 = imu['timestamp_ns'][0], imu['timestamp_ns'][-1]
+        lo, hi = t0 + (t1 - t0) * 45 // 100, t0 + (t1 - t0) * 55 // 100
+
+        t_start = time.perf_counter()
+        window = store.time_slice('imu', lo, hi)
+        acc = window['ax']
+        t_store = time.perf_counter() - t_start
+
+        t_start = time.perf_counter()
+        df = read_log(IMU_FILE, lo, hi - 1)
+        t_csv = time.perf_counter() - t_start
+
+        print(f"Zeitfenster ({len(window)} Zeilen): Store {t_store * 1e6:.0f} µs "
+              f"(View, teilt Speicher: {np.shares_memory(acc, imu)}), CSV {t_csv * 1e3:.1f} ms")
@@ -0,0 +1,79 @@
+import errno
+import os
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (nur für Parquet/Feather benötigt)
+    HAVE_ARROW = True
+except ImportError:
+    HAVE_ARROW = False
+
+# --- Konfiguration ---
+# 'csv' bleibt Standard; 'parquet' und 'feather' brauchen pyarrow (pip install pyarrow)
+STORAGE_FORMAT = 'csv'
+FORMAT_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+PARQUET_COMPRESSION = 'zstd'
+
+
+def artifact_path(name, fmt):
+    """Pfad eines Artefakts im gewünschten Format: 'ekf_results.csv' -> 'ekf_results.parquet'."""
+    base, _ = os.path.splitext(name)
+    return base + FORMAT_EXTENSIONS[fmt]
+
+def resolve_artifact(name):
+    """
+    Sucht das Artefakt in allen Formaten und gibt (Pfad, Format) der neuesten Datei zurück,
+    damit ein frisch geschriebenes Parquet nicht von einer alten CSV überdeckt wird.
+    """
+    candidates = []
+    for fmt in FORMAT_EXTENSIONS:
+        path = artifact_path(name, fmt)
+        if os.path.exists(path) and (fmt == 'csv' or HAVE_ARROW):
+            candidates.append((os.path.getmtime(path), path, fmt))
+    if not candidates:
+        raise FileNotFoundError(errno.ENOENT, "Artefakt nicht gefunden", name)
+    _, path, fmt = max(candidates)
+    return path, fmt
+
+def read_table(name, columns=None):
+    """
+    Lädt ein Pipeline-Artefakt (CSV, Parquet oder Feather, automatisch erkannt).
+    columns: nur diese Spalten lesen (bei Parquet/Feather wird der Rest gar nicht angefasst).
+    """
+    path, fmt = resolve_artifact(name)
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if fmt == 'feather':
+        return pd.read_feather(path, columns=columns)
+    df = pd.read_csv(path, usecols=columns)
+    return df[columns] if columns is not None else df
+
+def write_table(df, name, fmt=STORAGE_FORMAT):
+    """
+    Speichert ein Artefakt im gewünschten Format und gibt den geschriebenen Pfad zurück.
+    Ohne pyarrow wird mit Hinweis auf CSV ausgewichen.
+    """
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unbekanntes Format '{fmt}', erlaubt: {list(FORMAT_EXTENSIONS)}")
+    if fmt != 'csv' and not HAVE_ARROW:
+        print(f"HINWEIS: pyarrow nicht installiert, '{name}' wird als CSV gespeichert.")
+        fmt = 'csv'
+
+    path = artifact_path(name, fmt)
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False, compression=PARQUET_COMPRESSION)
+    elif fmt == 'feather':
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+def remove_artifact(name):
+    """Löscht ein Artefakt in allen Formaten; gibt die gelöschten Pfade zurück."""
+    removed = []
+    for fmt in FORMAT_EXTENSIONS:
+        path = artifact_path(name, fmt)
+        if os.path.exists(path):
+            os.remove(path)
+            removed.append(path)
+    return removed
@@ -8,6 +8,7 @@ from pyqtgraph.Qt import QtWidgets, QtCore, QtGui
 import csv
 import os
 import time 
+from payload_codec import PayloadCodec
 
 # --- MQTT Konfiguration ---
 MQTT_BROKER = ""
@@ -49,99 +50,47 @@ imu_qz_data = deque(maxlen=MAX_DATA_POINTS)
 imu_ax_data = deque(maxlen=MAX_DATA_POINTS)
 imu_ay_data = deque(maxlen=MAX_DATA_POINTS)
 imu_az_data = deque(maxlen=MAX_DATA_POINTS)
+# Reihenfolge wie payload_codec.IMU_COLUMNS
+imu_value_buffers = [imu_qw_data, imu_qx_data, imu_qy_data, imu_qz_data, imu_ax_data, imu_ay_data, imu_az_data]
 
 uwb_timestamps = deque(maxlen=MAX_DATA_POINTS)
 uwb_dist_data = [deque(maxlen=MAX_DATA_POINTS) for _ in KNOWN_MACS]
 
 data_lock = threading.Lock()
+codec = PayloadCodec(MAC_LABELS)
 
 # --- MQTT Daten-Handler ---
 
-def parse_imu_data(payload_str):
+def parse_imu_data(payload):
     """
-    Parst den IMU-Payload basierend auf dem C-Code-Format:
-    "%llu;%f,%f,%f;%f,%f,%f,%f"
-    (timestamp; ax,ay,az; qw,qx,qy,qz)
+    Parst einen IMU-Payload (bytes) mit einem oder mehreren Samples, Text "%llu;%f,%f,%f;%f,%f,%f,%f"
+    (timestamp; ax,ay,az; qw,qx,qy,qz) pro Zeile oder binär (siehe payload_codec.py), und hängt
+    alle Samples auf einmal an die Puffer an.
     """
-    try:
-        parts = payload_str.strip().split(';')
-        if len(parts) != 3: 
-            print(f"IMU Format-Fehler: Erwarte 3 Teile, bekam {len(parts)}")
-            return
-
-        timestamp_ns = int(parts[0])
-        group1_values = parts[1].split(',') # Sollte (ax, ay, az) sein
-        group2_values = parts[2].split(',') # Sollte (qw, qx, qy, qz) sein
-        
-        # *** NEUER Sicherheitscheck ***
-        # Gruppe 1 muss 3 Werte haben, Gruppe 2 muss 4 Werte haben
-        if len(group1_values) != 3 or len(group2_values) != 4:
-            print(f"IMU Längen-Fehler: Grp1={len(group1_values)} (erw. 3), Grp2={len(group2_values)} (erw. 4)")
-            return
-
-        # *** WERTE KORREKT ZUORDNEN ***
-        
-        # Gruppe 1: ax, ay, az
-        imu_ax = float(group1_values[0])
-        imu_ay = float(group1_values[1])
-        imu_az = float(group1_values[2])
-        
-        # Gruppe 2: qw, qx, qy, qz
-        imu_qw = float(group2_values[0])
-        imu_qx = float(group2_values[1])
-        imu_qy = float(group2_values[2])
-        imu_qz = float(group2_values[3])
-        
-        with data_lock:
-            # Daten in der korrekten Reihenfolge an die Puffer anhängen
-            imu_timestamps.append(timestamp_ns)
-            imu_qw_data.append(imu_qw)
-            imu_qx_data.append(imu_qx)
-            imu_qy_data.append(imu_qy)
-            imu_qz_data.append(imu_qz)
-            imu_ax_data.append(imu_ax)
-            imu_ay_data.append(imu_ay)
-            imu_az_data.append(imu_az)
-            
-    except Exception as e:
-        print(f"IMU Parse-Fehler: {e} -- Payload: {payload_str}")
-
-
-def parse_uwb_data(payload_str):
-    """Parst UWB: 'timestamp;mac,dist;mac,dist;...'"""
-    try:
-        parts = payload_str.strip().split(';')
-        if len(parts) < 2: return
-
-        timestamp_ns = int(parts[0])
-        
-        macs_in_this_frame = set()
-
-        for device_data in parts[1:]:
-            if not device_data: continue
-            mac, dist_str = device_data.split(',')
-            
-            if mac in KNOWN_MACS:
-                mac_index = KNOWN_MACS[mac]
-                distance = float(dist_str)
-                
-                with data_lock:
-                    uwb_dist_data[mac_index].append(distance)
-                
-                macs_in_this_frame.add(mac_index)
-
-        with data_lock:
-            uwb_timestamps.append(timestamp_ns)
-            for i in range(len(KNOWN_MACS)):
-                if i not in macs_in_this_frame:
-                    if len(uwb_dist_data[i]) > 0:
-                        last_val = uwb_dist_data[i][-1] # Nimm den letzten bekannten Wert
-                        uwb_dist_data[i].append(last_val)
-                    else:
-                        uwb_dist_data[i].append(0) # Startwert, falls noch nie gesehen
-
-    except Exception as e:
-        print(f"UWB Parse-Fehler: {e} -- Payload: {payload_str}")
+    frame = codec.imu_frame(payload)
+    if frame is None:
+        print(f"IMU Parse-Fehler -- Payload: {payload[:100]!r}")
+        return
+    timestamps, values = frame
+    with data_lock:
+        imu_timestamps.extend(timestamps.tolist())
+        for buffer, column in zip(imu_value_buffers, values.T):
+            buffer.extend(column.tolist())
+
+
+def parse_uwb_data(payload):
+    """Parst UWB (Text 'timestamp;mac,dist;mac,dist;...' oder binär); fehlende Anker behalten ihren letzten Wert."""
+    frame = codec.uwb_anchors(payload)
+    if frame is None:
+        print(f"UWB Parse-Fehler -- Payload: {payload[:100]!r}")
+        return
+    with data_lock:
+        uwb_timestamps.append(frame.timestamp_ns)
+        for mac_index, distance in frame.ranges:
+            uwb_dist_data[mac_index].append(distance)
+        for i in set(range(len(KNOWN_MACS))).difference(mac_index for mac_index, _ in frame.ranges):
+            # Nimm den letzten bekannten Wert, 0 als Startwert, falls noch nie gesehen
+            uwb_dist_data[i].append(uwb_dist_data[i][-1] if uwb_dist_data[i] else 0)
 
 # --- MQTT Callback-Funktionen ---
 def on_connect(client, userdata, flags, rc):
@@ -153,12 +102,10 @@ def on_connect(client, userdata, flags, rc):
 
 def on_message(client, userdata, msg):
     try:
-        payload_str = msg.payload.decode('utf-8')
-        
         if msg.topic == IMU_TOPIC:
-            parse_imu_data(payload_str)
+            parse_imu_data(msg.payload)
         elif msg.topic == UWB_TOPIC:
-            parse_uwb_data(payload_str)
+            parse_uwb_data(msg.payload)
             
     except Exception as e:
         print(f"on_message Fehler: {e}")
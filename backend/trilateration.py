@@ -0,0 +1,640 @@
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+import os
+import numpy as np
+from scipy.optimize import least_squares
+
+# --- Gemeinsame Trilaterations-Funktionen für run_tril.py und position_plotter.py ---
+
+# Auflösung der Firmware: Distanzen werden mit zwei Nachkommastellen gesendet
+RANGE_RESOLUTION_M = 0.01
+CACHE_MAX_SIZE = 4096
+# Erst ab drei Ankern ist die Lösung unabhängig vom Startwert (last_pos)
+CACHE_MIN_ANCHORS = 3
+
+# Schneller Pfad (analytische Jacobi-Matrix) für die Live-Anzeige
+FAST_MAX_ITER = 100    # Obergrenze; ohne Konvergenz bis dahin übernimmt least_squares
+FAST_STEP_TOL = 1e-6   # Konvergiert, wenn der Schritt kleiner als 1 µm ist
+
+# Paralleler Modus: Epochen pro Chunk und Suchfenster für den Chunk-Startwert
+CHUNK_SIZE = 5000
+SEED_LOOKBACK = 500
+
+# Batch-Multilateration (3D): Iterationen für alle Epochen gemeinsam
+BATCH_MAX_ITER = 30
+MIN_ANCHORS_3D = 4    # Ab so vielen Ankern wird die Tag-Höhe mitgeschätzt
+
+# Robuste Multilateration (LMedS über minimale Anker-Teilmengen)
+ROBUST_MIN_ANCHORS = 4        # Erst ab 4 Ankern gibt es Redundanz gegen einen Ausreißer
+ROBUST_SUBSET_SIZE = 3        # Minimale Teilmenge für 2D (z = Tag-Höhe fest)
+ROBUST_MAX_SUBSETS = 200      # Darüber zufällige Teilmengen (RANSAC-artig)
+ROBUST_INLIER_SCALE = 2.5     # Inlier-Schwelle in robusten Standardabweichungen
+ROBUST_MIN_SIGMA = 0.05       # Untergrenze für die robuste Std. (m)
+ROBUST_BLOCK_SIZE = 2_000_000 # Max. Elemente (Epochen x Teilmengen x Anker) pro Block
+ROBUST_SEED = 0
+
+
+def project_to_2d(dist_3d, anchor_h, tag_h):
+    """Projiziert 3D-Distanz auf 2D-Ebene basierend auf Höhendifferenz."""
+    h_diff = abs(anchor_h - tag_h)
+    if dist_3d < h_diff:
+        return 0.01 # Physikalischer Fehler
+    return np.sqrt(dist_3d**2 - h_diff**2)
+
+def trilateration_residuals(pos_2d, anchor_positions_2d, distances_2d):
+    """Residuen-Funktion für Least-Squares Optimierung."""
+    residuals = []
+    for i, anchor_pos in enumerate(anchor_positions_2d):
+        dist_pred = np.linalg.norm(pos_2d - anchor_pos)
+        residuals.append(dist_pred - distances_2d[i])
+    return residuals
+
+def solve_least_squares(anchor_positions_2d, distances_2d, x0):
+    """
+    Löst die 2D-Trilateration mit Levenberg-Marquardt.
+    Gibt die Position zurück oder None, falls die Optimierung fehlschlägt.
+    """
+    try:
+        res = least_squares(
+            trilateration_residuals,
+            x0,
+            args=(np.asarray(anchor_positions_2d), np.asarray(distances_2d)),
+            method='lm'
+        )
+    except ValueError:
+        return None
+    if not res.success:
+        return None
+    return res.x
+
+def trilateration_residuals_vec(pos_2d, anchor_positions_2d, distances_2d):
+    """Vektorisierte Residuen: vorhergesagte minus gemessene Distanz."""
+    diff = pos_2d - anchor_positions_2d
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff)) - distances_2d
+
+def solve_analytic(anchor_positions_2d, distances_2d, x0,
+                   max_iter=FAST_MAX_ITER, step_tol=FAST_STEP_TOL):
+    """
+    Levenberg-Marquardt mit analytischer Jacobi-Matrix, iteriert bis der Schritt kleiner
+    als step_tol ist.
+
+    Das 2x2-Normalgleichungssystem wird geschlossen gelöst, sodass pro Iteration
+    nur wenige NumPy-Operationen anfallen. Warmstart über x0 (z.B. last_pos).
+    Die Dämpfung folgt dem Verhältnis von tatsächlicher zu vorhergesagter Kostensenkung
+    (Nielsen); ein fester Faktor 10 pendelt in gekrümmten Tälern (Tag nahe einem Anker) lange hin und her.
+    Ist nach max_iter Iterationen keine Konvergenz erreicht, wird mit solve_least_squares
+    gelöst, damit nie eine halbfertige Lösung zurückkommt.
+    Gibt die Position zurück oder None bei nicht-endlichem Ergebnis.
+    """
+    anchors = np.asarray(anchor_positions_2d, dtype=float)
+    dists = np.asarray(distances_2d, dtype=float)
+    x = np.array(x0, dtype=float)
+
+    diff = x - anchors
+    dist_pred = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    r = dist_pred - dists
+    cost = r @ r
+    lam = 1e-3
+    nu = 2.0
+    converged = False
+
+    for _ in range(max_iter):
+        J = diff / np.maximum(dist_pred, 1e-9)[:, None]
+        a = J[:, 0] @ J[:, 0]
+        b = J[:, 0] @ J[:, 1]
+        d = J[:, 1] @ J[:, 1]
+        g0 = J[:, 0] @ r
+        g1 = J[:, 1] @ r
+
+        # Marquardt-Dämpfung auf der Diagonalen, kleiner Offset für 1 Anker
+        a_l = a + lam * (a + 1e-12)
+        d_l = d + lam * (d + 1e-12)
+        det = a_l * d_l - b * b
+        if det <= 0.0:
+            lam *= nu
+            nu *= 2.0
+            continue
+        step = np.array([(-d_l * g0 + b * g1) / det, (b * g0 - a_l * g1) / det])
+        # Vorhergesagte Senkung von cost = r @ r im linearisierten Modell
+        predicted = -(2.0 * (g0 * step[0] + g1 * step[1])
+                      + a * step[0]**2 + 2.0 * b * step[0] * step[1] + d * step[1]**2)
+
+        x_new = x + step
+        diff_new = x_new - anchors
+        dist_new = np.sqrt(np.einsum('ij,ij->i', diff_new, diff_new))
+        r_new = dist_new - dists
+        cost_new = r_new @ r_new
+
+        step_sq = step @ step
+        if cost_new < cost:
+            rho = (cost - cost_new) / predicted if predicted > 0.0 else 1.0
+            x, diff, dist_pred, r, cost = x_new, diff_new, dist_new, r_new, cost_new
+            lam = max(lam * max(1.0 / 3.0, 1.0 - (2.0 * rho - 1.0)**3), 1e-12)
+            nu = 2.0
+            converged = step_sq < step_tol * step_tol
+        else:
+            # Auch der ungedämpfte Schritt (~ step * (1 + lam)) ist kleiner als die Toleranz: Minimum
+            converged = step_sq * (1.0 + lam)**2 < step_tol * step_tol
+            lam *= nu
+            nu *= 2.0
+        if converged:
+            break
+
+    if not converged:
+        return solve_least_squares(anchors, dists, x0)
+    if not np.all(np.isfinite(x)):
+        return None
+    return x
+
+
+# --- LRU-Cache für wiederholte Distanz-Tupel ---
+
+class TrilaterationCache:
+    """
+    Begrenzter LRU-Speicher für Trilaterationsergebnisse.
+
+    Schlüssel ist die aktive Ankermenge zusammen mit den auf RANGE_RESOLUTION_M
+    quantisierten Roh-Distanzen. In Stopp-Phasen wiederholt sich dasselbe
+    Tupel ständig, sodass der Solver nur einmal laufen muss.
+    """
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, resolution=RANGE_RESOLUTION_M,
+                 min_anchors=CACHE_MIN_ANCHORS):
+        self.max_size = max_size
+        self.resolution = resolution
+        self.min_anchors = min_anchors
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def make_key(self, anchor_ids, distances):
+        """Baut den Schlüssel (anker_id, quantisierte Distanz), sortiert nach Anker."""
+        return tuple(sorted(
+            (anchor_id, int(round(dist / self.resolution)))
+            for anchor_id, dist in zip(anchor_ids, distances)
+        ))
+
+    def solve(self, anchor_ids, raw_distances, anchor_positions_2d, distances_2d, x0,
+              solver=solve_least_squares):
+        """
+        Liefert das gecachte Ergebnis oder ruft den Solver auf und speichert es.
+        Bei weniger als min_anchors Ankern hängt die Lösung vom Startwert ab,
+        daher wird der Cache dann umgangen. x0 darf eine Funktion ohne Argumente sein
+        (z.B. ein teurer Startwert aus dem Distanzfeld), sie wird nur aufgerufen, wenn gelöst wird.
+        """
+        if len(anchor_ids) < self.min_anchors:
+            self.bypassed += 1
+            return solver(anchor_positions_2d, distances_2d, x0() if callable(x0) else x0)
+
+        key = self.make_key(anchor_ids, raw_distances)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        self.misses += 1
+        pos = solver(anchor_positions_2d, distances_2d, x0() if callable(x0) else x0)
+        self._entries[key] = pos
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return pos
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def stats(self):
+        """Gibt Treffer-Statistiken als Dictionary zurück."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Cache: {s['hits']} Treffer, {s['misses']} Fehlschläge, "
+                f"{s['bypassed']} umgangen (< {self.min_anchors} Anker), "
+                f"Trefferquote {s['hit_rate'] * 100:.1f}%, "
+                f"Belegung {s['size']}/{s['max_size']}")
+
+
+# --- Epochenweise Verarbeitung (sequentiell und parallel in Chunks) ---
+
+def closed_form_2d(anchor_positions_2d, distances_2d):
+    """
+    Geschlossene lineare Lösung (Differenz der Kreisgleichungen zum ersten Anker).
+    Benötigt mindestens drei Anker, sonst None.
+    """
+    anchors = np.asarray(anchor_positions_2d, dtype=float)
+    dists = np.asarray(distances_2d, dtype=float)
+    if len(anchors) < 3:
+        return None
+    A = 2.0 * (anchors[1:] - anchors[0])
+    b = (np.sum(anchors[1:]**2, axis=1) - np.sum(anchors[0]**2)
+         - dists[1:]**2 + dists[0]**2)
+    pos, *_ = np.linalg.lstsq(A, b, rcond=None)
+    if not np.all(np.isfinite(pos)):
+        return None
+    return pos
+
+def project_ranges_2d(ranges, anchor_heights, tag_height):
+    """Projiziert eine (N, n_anker)-Matrix von 3D-Distanzen wie project_to_2d auf 2D."""
+    h_diff = np.abs(np.asarray(anchor_heights, dtype=float) - tag_height)
+    with np.errstate(invalid='ignore'):
+        dists_2d = np.sqrt(np.maximum(ranges**2 - h_diff**2, 0.0))
+        dists_2d = np.where(ranges < h_diff, 0.01, dists_2d)
+    return np.where(np.isnan(ranges), np.nan, dists_2d)
+
+def trilaterate_epochs(ranges, anchor_positions_3d, tag_height, x0,
+                       solver=solve_least_squares, cache=None, anchor_ids=None, initializer=None):
+    """
+    Sequentielle Trilateration über alle Epochen mit Warmstart von der letzten Position.
+
+    ranges: (N, n_anker) Roh-Distanzen, NaN wenn der Anker fehlt.
+    initializer: optional f(roh_distanzen, last_pos) -> Startwert, z.B.
+    DistanceField.initial_guess für einen globalen Neustart nach Sprüngen.
+    Gibt ein (N, 2)-Array zurück. Epochen ohne Lösung halten die letzte Position;
+    vor der ersten Lösung steht dort x0.
+    """
+    positions, _ = _trilaterate_sequence(ranges, anchor_positions_3d, tag_height, x0,
+                                         solver, cache, anchor_ids, initializer)
+    return positions
+
+def trilaterate_events(imu_row, anchor, ranges, num_epochs, anchor_positions_3d, tag_height, x0,
+                       solver=solve_least_squares, cache=None, anchor_ids=None, initializer=None):
+    """
+    Wie trilaterate_epochs, aber auf der Langform (imu_row, anker_index, distanz),
+    sortiert nach (imu_row, anker_index). Besucht nur Epochen mit Messungen und hält
+    dazwischen die letzte Position, ohne eine (N, n_anker)-Matrix aufzubauen.
+    """
+    anchors_3d = np.asarray(anchor_positions_3d, dtype=float)
+    anchors_2d = anchors_3d[:, :2]
+    dists_2d = project_ranges_2d(ranges, anchors_3d[anchor, 2], tag_height)
+    if anchor_ids is None:
+        anchor_ids = list(range(len(anchors_3d)))
+
+    positions = np.empty((num_epochs, 2))
+    last_pos = np.array(x0, dtype=float)
+    bounds = np.flatnonzero(np.diff(imu_row)) + 1
+    starts = np.concatenate([[0], bounds]) if len(imu_row) else np.empty(0, dtype=int)
+    ends = np.concatenate([bounds, [len(imu_row)]]) if len(imu_row) else np.empty(0, dtype=int)
+    row_ranges = np.full(len(anchors_3d), np.nan)
+    next_row = 0
+
+    for start, end in zip(starts, ends):
+        i = imu_row[start]
+        positions[next_row:i] = last_pos
+        idx = anchor[start:end]
+        x_start = last_pos
+        if initializer is not None:
+            row_ranges[:] = np.nan
+            row_ranges[idx] = ranges[start:end]
+            x_start = partial(initializer, row_ranges, last_pos)
+        if cache is not None:
+            # Startwert (z.B. Distanzfeld) nur bei einem Cache-Fehlschlag berechnen
+            pos_est = cache.solve([anchor_ids[a] for a in idx], ranges[start:end], anchors_2d[idx],
+                                  dists_2d[start:end], x_start, solver=solver)
+        else:
+            pos_est = solver(anchors_2d[idx], dists_2d[start:end], x_start if initializer is None else x_start())
+        if pos_est is not None:
+            last_pos = pos_est
+        positions[i] = last_pos
+        next_row = i + 1
+
+    positions[next_row:] = last_pos
+    return positions
+
+def _trilaterate_sequence(ranges, anchor_positions_3d, tag_height, x0,
+                          solver=solve_least_squares, cache=None, anchor_ids=None, initializer=None):
+    """Wie trilaterate_epochs, liefert zusätzlich den Index der ersten gelösten Epoche."""
+    anchors_3d = np.asarray(anchor_positions_3d, dtype=float)
+    anchors_2d = anchors_3d[:, :2]
+    dists_2d = project_ranges_2d(ranges, anchors_3d[:, 2], tag_height)
+    valid = ~np.isnan(ranges)
+    if anchor_ids is None:
+        anchor_ids = list(range(len(anchors_3d)))
+
+    positions = np.empty((len(ranges), 2))
+    last_pos = np.array(x0, dtype=float)
+    first_solved = -1
+
+    for i in range(len(ranges)):
+        mask = valid[i]
+        if mask.any():
+            if cache is not None:
+                # Startwert (z.B. Distanzfeld) nur bei einem Cache-Fehlschlag berechnen
+                x_start = last_pos if initializer is None else partial(initializer, ranges[i], last_pos)
+                ids = [a for a, m in zip(anchor_ids, mask) if m]
+                pos_est = cache.solve(ids, ranges[i, mask], anchors_2d[mask], dists_2d[i, mask], x_start,
+                                      solver=solver)
+            else:
+                x_start = last_pos if initializer is None else initializer(ranges[i], last_pos)
+                pos_est = solver(anchors_2d[mask], dists_2d[i, mask], x_start)
+            if pos_est is not None:
+                last_pos = pos_est
+                if first_solved < 0:
+                    first_solved = i
+        positions[i] = last_pos
+
+    return positions, first_solved
+
+def _chunk_seed(ranges, anchor_positions_3d, tag_height, start, fallback):
+    """
+    Startwert für einen Chunk: geschlossene Lösung der letzten Epoche mit
+    mindestens drei Ankern vor der Chunk-Grenze (höchstens SEED_LOOKBACK zurück).
+    """
+    anchors_3d = np.asarray(anchor_positions_3d, dtype=float)
+    lo = max(0, start - SEED_LOOKBACK)
+    window = ranges[lo:start]
+    counts = np.sum(~np.isnan(window), axis=1)
+    candidates = np.flatnonzero(counts >= 3)
+    if len(candidates) == 0:
+        return np.array(fallback, dtype=float)
+    row = window[candidates[-1]]
+    mask = ~np.isnan(row)
+    dists_2d = project_ranges_2d(row[mask][None, :], anchors_3d[mask, 2], tag_height)[0]
+    pos = closed_form_2d(anchors_3d[mask, :2], dists_2d)
+    return pos if pos is not None else np.array(fallback, dtype=float)
+
+def _solve_chunk(args):
+    """Worker-Funktion für den Prozess-Pool (muss auf Modulebene liegen)."""
+    ranges, anchor_positions_3d, tag_height, seed = args
+    return _trilaterate_sequence(ranges, anchor_positions_3d, tag_height, seed)
+
+def trilaterate_epochs_parallel(ranges, anchor_positions_3d, tag_height, x0,
+                                chunk_size=CHUNK_SIZE, max_workers=None):
+    """
+    Teilt die Epochen in Chunks und löst sie parallel in einem Prozess-Pool.
+
+    Jeder Chunk startet von einer geschlossenen Schätzung an seiner Grenze statt
+    von der (noch unbekannten) letzten Position des Vorgänger-Chunks. Beim
+    Zusammensetzen übernehmen Epochen vor der ersten Lösung eines Chunks die
+    letzte Position des Vorgängers, wie im sequentiellen Modus.
+    """
+    n = len(ranges)
+    starts = list(range(0, n, chunk_size))
+    jobs = []
+    for start in starts:
+        seed = x0 if start == 0 else _chunk_seed(ranges, anchor_positions_3d, tag_height, start, x0)
+        jobs.append((ranges[start:start + chunk_size], anchor_positions_3d, tag_height, seed))
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers <= 1 or len(jobs) == 1:
+        chunk_results = [_solve_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            chunk_results = list(pool.map(_solve_chunk, jobs))
+
+    positions = np.empty((n, 2))
+    last_pos = np.array(x0, dtype=float)
+    for start, (chunk_pos, first_solved) in zip(starts, chunk_results):
+        end = start + len(chunk_pos)
+        positions[start:end] = chunk_pos
+        # Vorlauf ohne Lösung hält die letzte Position des vorherigen Chunks
+        held = len(chunk_pos) if first_solved < 0 else first_solved
+        positions[start:start + held] = last_pos
+        last_pos = positions[end - 1]
+    return positions
+
+
+# --- Vektorisierte 3D-Multilateration über alle Epochen ---
+
+def _batch_lm(ranges, anchor_positions_3d, x_init, free_z, max_iter=BATCH_MAX_ITER):
+    """
+    Levenberg-Marquardt für alle Epochen gleichzeitig, direkt auf den 3D-Distanzen.
+
+    ranges:  (N, n_anker) mit NaN für fehlende Anker
+    anchor_positions_3d: (n_anker, 3) oder pro Epoche (N, n_anker, 3)
+    x_init:  (N, 3) Startwerte
+    free_z:  (N,) bool; False hält z auf dem Startwert fest (2D-Lösung ohne Projektion)
+    """
+    anchors = np.asarray(anchor_positions_3d, dtype=float)
+    if anchors.ndim == 2:
+        anchors = anchors[None, :, :]
+    valid = ~np.isnan(ranges)
+    dists = np.where(valid, ranges, 0.0)
+    x = np.array(x_init, dtype=float)
+    lam = np.full(len(x), 1e-3)
+    z_mask = np.where(free_z, 1.0, 0.0)[:, None]
+    eye = np.eye(3)
+
+    def evaluate(pos):
+        diff = pos[:, None, :] - anchors
+        dist_pred = np.sqrt(np.einsum('nmk,nmk->nm', diff, diff))
+        r = np.where(valid, dist_pred - dists, 0.0)
+        return diff, dist_pred, r, np.einsum('nm,nm->n', r, r)
+
+    diff, dist_pred, r, cost = evaluate(x)
+    # Konvergiert erst nach einem kleinen Schritt; abgelehnte Schritte werden mit stärkerer
+    # Dämpfung wiederholt, konvergierte Epochen nicht mehr verändert
+    converged = np.zeros(len(x), dtype=bool)
+    for _ in range(max_iter):
+        J = diff / np.maximum(dist_pred, 1e-9)[..., None] * valid[..., None]
+        J[..., 2] *= z_mask
+        JtJ = np.einsum('nmi,nmj->nij', J, J)
+        g = np.einsum('nmi,nm->ni', J, r)
+        damping = lam[:, None] * (np.diagonal(JtJ, axis1=1, axis2=2) + 1e-9)
+        A = JtJ + damping[:, :, None] * eye
+        step = -np.linalg.solve(A, g[..., None])[..., 0]
+
+        x_new = x + step
+        diff_new, dist_new, r_new, cost_new = evaluate(x_new)
+        accept = (cost_new < cost) & ~converged
+        x = np.where(accept[:, None], x_new, x)
+        diff = np.where(accept[:, None, None], diff_new, diff)
+        dist_pred = np.where(accept[:, None], dist_new, dist_pred)
+        r = np.where(accept[:, None], r_new, r)
+        cost = np.where(accept, cost_new, cost)
+        # Abgelehnt, aber schon der ungedämpfte Schritt (~ step * (1 + lam)) ist kleiner als die
+        # Toleranz: Minimum erreicht (exakte Lösung, keine Anker)
+        step_sq = np.einsum('ni,ni->n', step, step)
+        converged |= (step_sq * np.where(accept, 1.0, (1.0 + lam)**2)) < FAST_STEP_TOL**2
+        lam = np.where(accept, np.maximum(lam * 0.1, 1e-12), np.where(converged, lam, lam * 10.0))
+        if converged.all():
+            break
+    return x
+
+def _closed_form_batch(ranges, anchor_positions_3d, tag_height):
+    """
+    Geschlossene 2D-Lösung für alle Epochen mit mindestens drei Ankern (Startwerte).
+
+    Differenz der Kreisgleichungen zum ersten gemessenen Anker, gelöst über die
+    2x2-Normalgleichungen. Anker können global (n_anker, 3) oder pro Epoche
+    (N, n_anker, 3) angegeben werden. Nicht lösbare Epochen liefern NaN.
+    """
+    anchors = np.asarray(anchor_positions_3d, dtype=float)
+    if anchors.ndim == 2:
+        anchors = np.broadcast_to(anchors, (len(ranges),) + anchors.shape)
+    valid = ~np.isnan(ranges)
+    dists_2d = np.sqrt(np.maximum(np.where(valid, ranges, 0.0)**2 - (anchors[..., 2] - tag_height)**2, 0.0))
+    xy = anchors[..., :2]
+
+    ref = np.argmax(valid, axis=1)
+    rows = np.arange(len(ranges))
+    xy_ref = xy[rows, ref]
+    d_ref = dists_2d[rows, ref]
+
+    A = 2.0 * (xy - xy_ref[:, None, :]) * valid[..., None]
+    b = (np.sum(xy**2, axis=2) - np.sum(xy_ref**2, axis=1)[:, None]
+         - dists_2d**2 + d_ref[:, None]**2) * valid
+    AtA = np.einsum('nmi,nmj->nij', A, A)
+    Atb = np.einsum('nmi,nm->ni', A, b)
+    det = AtA[:, 0, 0] * AtA[:, 1, 1] - AtA[:, 0, 1]**2
+    ok = (valid.sum(axis=1) >= 3) & (np.abs(det) > 1e-9)
+    safe_det = np.where(ok, det, 1.0)
+    pos = np.column_stack([
+        (AtA[:, 1, 1] * Atb[:, 0] - AtA[:, 0, 1] * Atb[:, 1]) / safe_det,
+        (AtA[:, 0, 0] * Atb[:, 1] - AtA[:, 0, 1] * Atb[:, 0]) / safe_det,
+    ])
+    pos[~ok] = np.nan
+    return pos
+
+def multilaterate_batch(ranges, anchor_positions_3d, tag_height, x0,
+                        min_anchors_3d=MIN_ANCHORS_3D, max_iter=BATCH_MAX_ITER):
+    """
+    Vektorisierte Multilateration für alle Epochen ohne Zeilenschleife.
+
+    Epochen mit mindestens min_anchors_3d Ankern schätzen x, y und z. Bei weniger
+    Ankern bleibt z = tag_height fest, gelöst wird trotzdem direkt auf den
+    3D-Distanzen, sodass die 0.01-m-Klemme von project_to_2d entfällt.
+    Epochen mit 2 Ankern starten in einem zweiten Durchlauf der Reihe nach von der
+    Lösung der vorigen gelösten Epoche; Epochen mit 0-1 Ankern halten die letzte
+    Position wie trilaterate_epochs. Gibt (N, 3) zurück.
+    """
+    ranges = np.asarray(ranges, dtype=float)
+    n = len(ranges)
+    counts = np.sum(~np.isnan(ranges), axis=1)
+    start = np.array([x0[0], x0[1], tag_height], dtype=float)
+    positions = np.full((n, 3), np.nan)
+
+    # 1. Bestimmte Epochen (>= 3 Anker) unabhängig voneinander lösen
+    determined = counts >= 3
+    if determined.any():
+        x_init = np.tile(start, (int(determined.sum()), 1))
+        guess = _closed_form_batch(ranges[determined], anchor_positions_3d, tag_height)
+        has_guess = ~np.isnan(guess[:, 0])
+        x_init[has_guess, :2] = guess[has_guess]
+        free_z = counts[determined] >= min_anchors_3d
+        positions[determined] = _batch_lm(ranges[determined], anchor_positions_3d, x_init, free_z, max_iter)
+
+    # 2. Epochen mit zwei Ankern der Reihe nach vom Ergebnis der vorigen gelösten Epoche aus lösen,
+    #    wie im sequentiellen Modus. Folgen solcher Epochen hängen voneinander ab; gebündelt wird
+    #    daher die k-te Epoche aller Folgen (k = Abstand zur letzten bestimmten Epoche).
+    #    Ein einzelner Anker legt die Position nicht fest (least_squares lehnt ihn ab), sie wird gehalten.
+    measured = np.flatnonzero(counts >= 2)
+    is_partial = ~determined[measured]
+    k = np.arange(len(measured))
+    depth = k - np.maximum.accumulate(np.where(is_partial, -1, k))
+    for d in range(1, int(depth[is_partial].max()) + 1 if is_partial.any() else 1):
+        wave = np.flatnonzero(is_partial & (depth == d))
+        rows = measured[wave]
+        x_init = np.where((wave > 0)[:, None], positions[measured[np.maximum(wave - 1, 0)]], start)
+        x_init[:, 2] = tag_height
+        positions[rows] = _batch_lm(ranges[rows], anchor_positions_3d, x_init,
+                                    np.zeros(len(rows), dtype=bool), max_iter)
+
+    # 3. Epochen ohne Anker halten die letzte Position
+    return _forward_fill(positions, start)
+
+def multilaterate_robust(ranges, anchor_positions_3d, tag_height, x0,
+                         min_anchors=ROBUST_MIN_ANCHORS, subset_size=ROBUST_SUBSET_SIZE,
+                         max_subsets=ROBUST_MAX_SUBSETS, inlier_scale=ROBUST_INLIER_SCALE,
+                         max_iter=BATCH_MAX_ITER):
+    """
+    Robuste 2D-Multilateration (z = tag_height) gegen einzelne verfälschte Anker (NLOS).
+
+    Für Epochen mit mindestens min_anchors Ankern werden alle minimalen Teilmengen
+    (bzw. höchstens max_subsets zufällige) in einem Batch geschlossen gelöst. Pro Epoche gewinnt
+    die Teilmenge mit dem kleinsten (Median-)Quantil der quadrierten Residuen (LMedS); danach
+    wird mit allen Inliern neu ausgeglichen. Übrige Epochen wie multilaterate_batch.
+    Bei genau vier Ankern passt jede Dreier-Teilmenge exakt, ein Ausreißer wird dort
+    nur bei günstiger Geometrie eindeutig erkannt; ab fünf Ankern zuverlässig.
+    Gibt (positionen (N, 3), inlier_maske (N, n_anker)) zurück.
+    """
+    ranges = np.asarray(ranges, dtype=float)
+    anchors = np.asarray(anchor_positions_3d, dtype=float)
+    n_anchors = len(anchors)
+    valid = ~np.isnan(ranges)
+    counts = valid.sum(axis=1)
+
+    # Basis: alle Epochen ohne Robustifizierung, z fest
+    positions = multilaterate_batch(ranges, anchors, tag_height, x0,
+                                    min_anchors_3d=n_anchors + 1, max_iter=max_iter)
+    inliers = valid.copy()
+
+    robust_rows = np.flatnonzero(counts >= min_anchors)
+    if len(robust_rows) == 0 or n_anchors < min_anchors:
+        return positions, inliers
+
+    subsets = np.array(list(combinations(range(n_anchors), subset_size)))
+    if len(subsets) > max_subsets:
+        rng = np.random.default_rng(ROBUST_SEED)
+        subsets = subsets[rng.choice(len(subsets), max_subsets, replace=False)]
+    subset_mask = np.zeros((len(subsets), n_anchors), dtype=bool)
+    np.put_along_axis(subset_mask, subsets, True, axis=1)
+
+    block = max(1, ROBUST_BLOCK_SIZE // (len(subsets) * n_anchors))
+    start = np.array([x0[0], x0[1], tag_height], dtype=float)
+
+    for b in range(0, len(robust_rows), block):
+        rows = robust_rows[b:b + block]
+        R = ranges[rows]                                   # (K, M)
+        K, S = len(rows), len(subsets)
+
+        # 1. Hypothese je Teilmenge: geschlossene Lösung, alle Teilmengen in einem Batch
+        usable = np.all(valid[rows][:, subsets], axis=2)                      # (K, S)
+        k_idx, s_idx = np.nonzero(usable)
+        sub_anchor_idx = subsets[s_idx]                                       # (B, 3)
+        guess = _closed_form_batch(R[k_idx[:, None], sub_anchor_idx], anchors[sub_anchor_idx], tag_height)
+        sub_pos = np.full((K, S, 3), np.nan)
+        sub_pos[k_idx, s_idx, :2] = guess
+        sub_pos[..., 2] = tag_height
+        usable[k_idx, s_idx] = ~np.isnan(guess[:, 0])
+
+        # 2. LMedS: h-kleinstes quadriertes Residuum über alle gemessenen Anker,
+        #    h = (n + p + 1) // 2 nach Rousseeuw (bei n = 4 ist das der Ausgelassene)
+        dist_pred = np.linalg.norm(sub_pos[:, :, None, :] - anchors[None, None], axis=3)  # (K, S, M)
+        sq_res = np.where(valid[rows][:, None, :], (dist_pred - R[:, None, :])**2, np.inf)
+        n_meas = counts[rows]
+        h = (n_meas + subset_size + 1) // 2
+        med = np.take_along_axis(np.sort(sq_res, axis=2), (h - 1)[:, None, None], axis=2)[..., 0]
+        med = np.where(usable, med, np.inf)
+        best = np.argmin(med, axis=1)
+        best_pos = sub_pos[np.arange(K), best]
+        best_med = med[np.arange(K), best]
+
+        # 3. Inlier bestimmen (robuste Std. nach Rousseeuw) und neu ausgleichen
+        sigma = 1.4826 * (1 + 5 / np.maximum(n_meas - subset_size, 1)) * np.sqrt(best_med)
+        sigma = np.maximum(sigma, ROBUST_MIN_SIGMA)
+        best_res = np.abs(np.linalg.norm(best_pos[:, None, :] - anchors[None], axis=2) - R)
+        inl = valid[rows] & (best_res <= inlier_scale * sigma[:, None])
+        enough = inl.sum(axis=1) >= subset_size
+        inl[~enough] = subset_mask[best[~enough]] & valid[rows][~enough]
+
+        refit_ranges = np.where(inl, R, np.nan)
+        positions[rows] = _batch_lm(refit_ranges, anchors, best_pos,
+                                    np.zeros(K, dtype=bool), max_iter)
+        inliers[rows] = inl
+
+    return positions, inliers
+
+def _forward_fill(positions, start):
+    """Füllt NaN-Zeilen mit der letzten gültigen Zeile (davor mit start)."""
+    filled = positions.copy()
+    ok = ~np.isnan(filled[:, 0])
+    idx = np.where(ok, np.arange(len(filled)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    filled[idx >= 0] = filled[idx[idx >= 0]]
+    filled[idx < 0] = start
+    return filled